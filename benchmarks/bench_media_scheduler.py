@@ -0,0 +1,159 @@
+"""
+Benchmark del planificador de descargas de medios: latencia de imágenes pequeñas mientras se descargan videos
+grandes por un enlace compartido de ancho de banda limitado.
+
+Se levanta el servidor simulado (benchmarks/mock_upstream.py) con --link-mbps y cada medio llega como un webhook de
+una conversación distinta, procesado en proceso con `process_webhook_event` (deduplicación, secuenciador de
+conversaciones, carriles por estrategia y descarga). Se comparan dos variantes del planificador: "unbounded" (sin
+límites, equivalente a descargar todo apenas llega a su estrategia) y "scheduler" (límites de Config). En ambas se
+inician los videos a la vez y luego llega una imagen cada --image-interval-ms; la latencia de cada medio es la del
+evento completo.
+
+Uso:
+    python benchmarks/bench_media_scheduler.py --videos 6 --video-size 20971520 --images 40 --link-mbps 200
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from load_test import free_port, wait_until_ready  # noqa: E402
+from mock_upstream import fake_media_sha256  # noqa: E402
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def media_event(media_type: str, media_id: str, mime_type: str):
+    from models import IncomingMessage
+
+    wa_id = f"1849{uuid.uuid4().int % 10 ** 7:07d}"
+    return IncomingMessage.model_validate({
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "123",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "18490000000", "phone_number_id": "123"},
+                    "contacts": [{"profile": {"name": "Cliente"}, "wa_id": wa_id}],
+                    "messages": [{
+                        "from": wa_id, "id": f"wamid.{uuid.uuid4().hex}", "timestamp": str(int(time.time())),
+                        "type": media_type,
+                        media_type: {"mime_type": mime_type, "sha256": fake_media_sha256(media_id), "id": media_id},
+                    }],
+                },
+            }],
+        }],
+    })
+
+
+async def run(variant: str, args: argparse.Namespace) -> dict:
+    import routes
+    from media_scheduler import DownloadScheduler
+    from media_store import media_store
+
+    if variant == "unbounded":
+        routes.download_scheduler = DownloadScheduler(small_limit=10_000, large_limit=10_000, max_inflight_bytes=2 ** 62)
+    else:
+        routes.download_scheduler = DownloadScheduler()
+
+    async def deliver(media_type: str, size: int, mime_type: str) -> float:
+        media_id = f"{size}.{uuid.uuid4().hex}"
+        start = time.perf_counter()
+        await routes.process_webhook_event(media_event(media_type, media_id, mime_type))
+        # process_webhook_event no retorna la ruta del medio: se confirma la descarga en el índice de medios.
+        if await media_store.lookup(media_id, fake_media_sha256(media_id)) is None:
+            raise RuntimeError(f"No se descargó {media_id}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    videos = [asyncio.create_task(deliver("video", args.video_size, "video/mp4")) for _ in range(args.videos)]
+    images = []
+    for _ in range(args.images):
+        await asyncio.sleep(args.image_interval_ms / 1000)
+        images.append(asyncio.create_task(deliver("image", args.image_size, "image/jpeg")))
+    image_latencies = await asyncio.gather(*images)
+    await asyncio.gather(*videos)
+    return {
+        "variant": variant,
+        "image_p50": statistics.median(image_latencies),
+        "image_p95": percentile(image_latencies, 0.95),
+        "image_max": max(image_latencies),
+        "total": time.perf_counter() - start,
+    }
+
+
+async def main_async(args: argparse.Namespace):
+    from conversation_sequencer import conversation_sequencer
+    from http_client import http_client_manager
+    from routes import strategy_dispatcher
+    from subscriptions import subscription_registry
+
+    await http_client_manager.start()
+    await subscription_registry.load()
+    try:
+        for variant in ("unbounded", "scheduler"):
+            result = await run(variant, args)
+            print(f"{result['variant']:>10}: imágenes p50 {result['image_p50'] * 1000:7.1f} ms  "
+                  f"p95 {result['image_p95'] * 1000:7.1f} ms  máx {result['image_max'] * 1000:7.1f} ms  "
+                  f"total {result['total']:5.2f} s")
+    finally:
+        await conversation_sequencer.stop()
+        await strategy_dispatcher.stop()
+        await http_client_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=6)
+    parser.add_argument("--video-size", type=int, default=20 * 1024 * 1024)
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--image-size", type=int, default=200 * 1024)
+    parser.add_argument("--image-interval-ms", type=float, default=100)
+    parser.add_argument("--link-mbps", type=float, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_media_scheduler_")
+    port = free_port()
+    upstream_url = f"http://127.0.0.1:{port}"
+    upstream = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "mock_upstream.py"), "--port", str(port),
+        "--latency-ms", "5", "--link-mbps", str(args.link_mbps),
+    ])
+    os.environ.update({
+        "GRAPH_API_BASE_URL": upstream_url,
+        "HTTP_HOST_TIMEOUTS": "",
+        "MEDIA_DIR": os.path.join(workdir, "media"),
+        "MEDIA_INDEX_PATH": os.path.join(workdir, "media", "index.db"),
+        "LOG_FILE": os.path.join(workdir, "app.log"),
+        "SUBSCRIPTIONS_DB_PATH": os.path.join(workdir, "subscriptions.db"),
+        "DEDUP_DB_PATH": os.path.join(workdir, "dedup.db"),
+        # Solo se mide la descarga; el post-procesamiento va en su propio pool de procesos.
+        "MEDIA_POSTPROCESS_ENABLED": "false",
+        "LOG_PAYLOAD_SAMPLE_RATE": "0",
+    })
+    try:
+        wait_until_ready(upstream_url + "/_stats", upstream)
+        asyncio.run(main_async(args))
+    finally:
+        upstream.terminate()
+        upstream.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark del middleware de tiempos: log_middleware sobre BaseHTTPMiddleware (anterior) contra TimingMiddleware
+(ASGI puro). Ambas variantes atienden la misma aplicación en proceso a través de httpx.ASGITransport, sin red, de
+modo que la diferencia de solicitudes por segundo corresponde al costo del middleware.
+
+Uso:
+    python benchmarks/bench_middleware.py --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware import TimingMiddleware, log_middleware  # noqa: E402
+
+
+def build_app(variant: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/outbox/{outbox_id}")
+    async def get_item(outbox_id: int):
+        return {"id": outbox_id, "status": "sent"}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for index in range(10):
+                yield b'{"index": %d}\n' % index
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    if variant == "base":
+        app.add_middleware(BaseHTTPMiddleware, dispatch=log_middleware)
+    else:
+        app.add_middleware(TimingMiddleware)
+    return app
+
+
+async def run(variant: str, path: str, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=build_app(variant))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get(path)  # calentamiento
+        remaining = iter(range(total))
+
+        async def worker():
+            for _ in remaining:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    # Ambas variantes emiten la misma línea de log; se desactiva para medir solo el middleware.
+    logging.disable(logging.CRITICAL)
+
+    for path in ("/outbox/1", "/stream"):
+        base = asyncio.run(run("base", path, args.requests, args.concurrency))
+        asgi = asyncio.run(run("asgi", path, args.requests, args.concurrency))
+        print(f"{path}")
+        print(f"  BaseHTTPMiddleware: {base:9.0f} req/s")
+        print(f"  TimingMiddleware:   {asgi:9.0f} req/s")
+        print(f"  mejora:             {(asgi / base - 1) * 100:8.1f} %")
+
+
+if __name__ == "__main__":
+    main()
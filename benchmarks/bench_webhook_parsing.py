@@ -0,0 +1,87 @@
+"""
+Benchmark del parseo del webhook: camino anterior (dict -> modelo -> model_dump dos veces) contra el camino rápido
+(model_validate_json sobre los bytes originales, reutilizados para el log y la notificación).
+
+Uso:
+    python benchmarks/bench_webhook_parsing.py --entries 50 --messages 20 --iterations 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import IncomingMessage  # noqa: E402
+
+
+def build_payload(entries: int, messages: int) -> bytes:
+    """
+    Genera un webhook con `entries` entradas y `messages` mensajes (texto e imagen alternados) por entrada.
+    """
+    def message(index: int) -> dict:
+        base = {"from": "18490000000", "id": f"wamid.{index}", "timestamp": 1713500000 + index}
+        if index % 2:
+            return {**base, "type": "image", "image": {"mime_type": "image/jpeg", "sha256": "a" * 64, "id": str(index)}}
+        return {**base, "type": "text", "text": {"body": "Hola, este es un mensaje de prueba número %d" % index}}
+
+    return json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": str(entry),
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "18490000000", "phone_number_id": "123"},
+                    "contacts": [{"profile": {"name": "Cliente"}, "wa_id": "18490000000"}],
+                    "messages": [message(entry * messages + index) for index in range(messages)],
+                },
+            }],
+        } for entry in range(entries)],
+    }).encode()
+
+
+def previous_path(body: bytes):
+    # FastAPI decodifica a dict y valida; luego el modelo se vuelca para el log y otra vez para la notificación.
+    event = IncomingMessage.model_validate(json.loads(body))
+    log_line = f"Evento recibido: {event.model_dump()}"
+    notification = json.dumps(event.model_dump()).encode()
+    return log_line, notification
+
+
+def fast_path(body: bytes):
+    event = IncomingMessage.model_validate_json(body)
+    log_line = f"Evento recibido: {body.decode('utf-8', errors='replace')}"
+    notification = body
+    return event, log_line, notification
+
+
+def measure(func, body: bytes, iterations: int) -> float:
+    func(body)  # calentamiento
+    start = time.process_time()
+    for _ in range(iterations):
+        func(body)
+    return (time.process_time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    body = build_payload(args.entries, args.messages)
+    previous = measure(previous_path, body, args.iterations)
+    fast = measure(fast_path, body, args.iterations)
+
+    print(f"payload: {len(body) / 1024:.1f} KiB, {args.entries * args.messages} mensajes")
+    print(f"camino anterior: {previous * 1000:8.3f} ms CPU por evento")
+    print(f"camino rápido:   {fast * 1000:8.3f} ms CPU por evento")
+    print(f"reducción:       {(1 - fast / previous) * 100:7.1f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Prueba de carga de la API contra un servidor simulado de Graph API, Mailjet y Twitter (benchmarks/mock_upstream.py).
+
+El script levanta el servidor simulado y la API (uvicorn main:app) con bases de datos y directorio de medios
+temporales, envía solicitudes a /webhook, /send-message y /send-template-message con la concurrencia indicada y reporta,
+por escenario, el throughput, los percentiles de latencia p50/p95/p99, los códigos de estado, las llamadas recibidas
+por el servidor simulado y el pico de memoria residente (RSS) del proceso de la API. Para /webhook, cuya respuesta no
+espera el procesamiento (WEBHOOK_ACK_FIRST), también reporta cuánto tardó en terminar todo el trabajo del webhook
+(cola de admisión, secuenciador de conversaciones y estrategias, incluidas las descargas de medios).
+
+Uso:
+    python benchmarks/load_test.py --requests 2000 --concurrency 50
+    python benchmarks/load_test.py --scenario webhook --messages 10 --media-ratio 0.5 --media-size 1048576
+    python benchmarks/load_test.py --latency-ms 200 --throttle-rate 0.05 --api-env WHATSAPP_RATE_LIMIT=500
+    python benchmarks/load_test.py --target http://127.0.0.1:5000 --api-pid 1234   # API ya en ejecución
+
+Con --json se guarda el resultado para compararlo con una ejecución posterior.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_upstream import add_arguments as add_upstream_arguments, fake_media_sha256  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("webhook", "send-message", "send-template-message")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def peak_rss_mb(pid: Optional[int]) -> Optional[float]:
+    # VmHWM es el pico de memoria residente del proceso (Linux).
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def build_webhook(messages: int, media_ratio: float, media_size: int) -> bytes:
+    """
+    Genera un webhook con `messages` mensajes de ids únicos (para no ser descartados por la deduplicación); una
+    fracción `media_ratio` son imágenes con el SHA-256 correcto del medio que sirve el servidor simulado.
+    """
+    items = []
+    for _ in range(messages):
+        base = {"from": "18490000000", "id": f"wamid.{uuid.uuid4().hex}", "timestamp": str(int(time.time()))}
+        if random.random() < media_ratio:
+            media_id = f"{media_size}.{uuid.uuid4().hex}"
+            items.append({**base, "type": "image", "image": {
+                "mime_type": "image/jpeg", "sha256": fake_media_sha256(media_id), "id": media_id,
+            }})
+        else:
+            items.append({**base, "type": "text", "text": {"body": "Mensaje de prueba de carga"}})
+    return json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "123",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "18490000000", "phone_number_id": "123"},
+                    "contacts": [{"profile": {"name": "Cliente"}, "wa_id": "18490000000"}],
+                    "messages": items,
+                },
+            }],
+        }],
+    }).encode()
+
+
+def build_request(scenario: str, args: argparse.Namespace) -> dict:
+    if scenario == "webhook":
+        return {"content": build_webhook(args.messages, args.media_ratio, args.media_size),
+                "headers": {"Content-Type": "application/json"}}
+    if scenario == "send-message":
+        return {"json": {"recipient_number": "18490000000", "message": "Mensaje de prueba de carga"}}
+    return {"json": {
+        "to": "18490000000",
+        "template": {
+            "name": "hello_world",
+            "language": {"code": "es"},
+            "components": [{"type": "body", "parameters": [{"type": "text", "text": "Cliente"}]}],
+        },
+    }}
+
+
+# Gauges que deben llegar a 0 para considerar procesado todo el trabajo del webhook: la admisión en el pool, los
+# elementos pendientes en el secuenciador de conversaciones y las colas y elementos en curso de cada estrategia.
+DRAIN_GAUGES = (
+    "Webhook_cola_profundidad",
+    "Webhook_workers_utilizacion",
+    "Conversaciones_tareas_pendientes",
+    "Estrategia_cola_profundidad",
+    "Estrategia_en_curso",
+)
+
+
+async def metric_totals(client: httpx.AsyncClient, names) -> Dict[str, Optional[float]]:
+    # Suma todas las series de cada métrica (una por estrategia, o por proceso con varios workers).
+    response = await client.get("/metrics")
+    totals: Dict[str, Optional[float]] = {name: None for name in names}
+    for line in response.text.splitlines():
+        name = line.split("{", 1)[0].split(" ", 1)[0]
+        if name in totals:
+            totals[name] = (totals[name] or 0.0) + float(line.rsplit(" ", 1)[1])
+    return totals
+
+
+async def wait_for_webhook_drain(client: httpx.AsyncClient, timeout: float) -> Optional[float]:
+    # Espera a que la cola del webhook, el secuenciador y las estrategias queden sin trabajo (incluidas las descargas
+    # de medios). Con varios workers de gunicorn los gauges calculados se copian cada METRICS_REFRESH_INTERVAL, lo
+    # que agrega hasta ese tiempo a la medición.
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        totals = await metric_totals(client, DRAIN_GAUGES)
+        if totals["Webhook_cola_profundidad"] is None:
+            return None
+        if not any(totals.values()):
+            return time.perf_counter() - start
+        await asyncio.sleep(0.1)
+    return None
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: str, args: argparse.Namespace) -> Dict:
+    path = "/" + scenario
+    # Los cuerpos se generan antes de medir para no cargar al generador durante la prueba.
+    requests = [build_request(scenario, args) for _ in range(args.requests)]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    pending = iter(requests)
+
+    async def worker():
+        for request in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, **request)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    result = {
+        "scenario": scenario,
+        "requests": len(latencies),
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "status_codes": dict(statuses),
+    }
+    if scenario == "webhook":
+        drain = await wait_for_webhook_drain(client, args.drain_timeout)
+        result["drain_seconds"] = round(drain, 3) if drain is not None else None
+    return result
+
+
+def print_result(result: Dict):
+    print(f"\n== {result['scenario']} ({result['requests']} solicitudes, concurrencia {result['concurrency']})")
+    print(f"  throughput:   {result['throughput_rps']:10.1f} req/s")
+    print(f"  latencia p50: {result['p50_ms']:10.2f} ms")
+    print(f"  latencia p95: {result['p95_ms']:10.2f} ms")
+    print(f"  latencia p99: {result['p99_ms']:10.2f} ms")
+    print(f"  latencia max: {result['max_ms']:10.2f} ms")
+    print(f"  estados:      {result['status_codes']}")
+    if "drain_seconds" in result:
+        print(f"  trabajo del webhook terminado: {result['drain_seconds']} s después de la última respuesta")
+    print(f"  upstream:     {result.get('upstream_calls', {})}")
+
+
+def wait_until_ready(url: str, process: Optional[subprocess.Popen], timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"El proceso para {url} terminó con código {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} no respondió en {timeout} s")
+
+
+def start_processes(args: argparse.Namespace, workdir: str):
+    upstream_port, api_port = free_port(), free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    upstream = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "mock_upstream.py"), "--port", str(upstream_port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate),
+        "--media-latency-ms", str(args.media_latency_ms), "--link-mbps", str(args.link_mbps),
+        *(["--retry-after", str(args.retry_after)] if args.retry_after is not None else []),
+    ])
+    env = {
+        **os.environ,
+        "GRAPH_API_BASE_URL": upstream_url,
+        "MAILJET_API_URL": upstream_url + "/",
+        "HTTP_HOST_TIMEOUTS": "",
+        "MEDIA_DIR": os.path.join(workdir, "media"),
+        "MEDIA_INDEX_PATH": os.path.join(workdir, "media", "index.db"),
+        "OUTBOX_PATH": os.path.join(workdir, "outbox.db"),
+        "SUBSCRIPTIONS_DB_PATH": os.path.join(workdir, "subscriptions.db"),
+        "DEDUP_DB_PATH": os.path.join(workdir, "dedup.db"),
+        "LOG_FILE": os.path.join(workdir, "app.log"),
+        "WEBHOOK_SUBSCRIBERS": "",
+    }
+    for item in args.api_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(api_port), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL if args.quiet_api else None,
+    )
+    wait_until_ready(upstream_url + "/_stats", upstream)
+    wait_until_ready(f"http://127.0.0.1:{api_port}/metrics", api)
+    return upstream, api, upstream_url, f"http://127.0.0.1:{api_port}"
+
+
+async def run(args: argparse.Namespace, target: str, upstream_url: Optional[str], api_pid: Optional[int]) -> List[Dict]:
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = []
+    async with httpx.AsyncClient(base_url=target, limits=limits, timeout=args.timeout) as client, \
+            httpx.AsyncClient(base_url=upstream_url or target) as upstream:
+        for scenario in scenarios:
+            if upstream_url:
+                await upstream.delete("/_stats")
+            result = await run_scenario(client, scenario, args)
+            if upstream_url:
+                result["upstream_calls"] = (await upstream.get("/_stats")).json()
+            result["peak_rss_mb"] = peak_rss_mb(api_pid)
+            print_result(result)
+            if result["peak_rss_mb"] is not None:
+                print(f"  pico RSS API: {result['peak_rss_mb']:10.1f} MiB")
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=("all",) + SCENARIOS, default="all")
+    parser.add_argument("--requests", type=int, default=1000, help="Solicitudes por escenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout de cada solicitud a la API")
+    parser.add_argument("--messages", type=int, default=1, help="Mensajes por webhook")
+    parser.add_argument("--media-ratio", type=float, default=0.0, help="Fracción de mensajes del webhook con imagen")
+    parser.add_argument("--media-size", type=int, default=256 * 1024, help="Tamaño en bytes de cada medio simulado")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="Espera máxima a que se vacíe la cola del webhook")
+    parser.add_argument("--api-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Variable de entorno adicional para la API (se puede repetir)")
+    parser.add_argument("--target", help="URL de una API ya en ejecución; no se levantan procesos")
+    parser.add_argument("--api-pid", type=int, help="PID de la API indicada en --target, para medir su RSS")
+    parser.add_argument("--upstream-url", help="URL del servidor simulado usado por --target, para contar sus llamadas")
+    parser.add_argument("--quiet-api", action="store_true", help="Oculta los logs de la API durante la prueba")
+    parser.add_argument("--json", help="Ruta donde guardar los resultados en JSON")
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+        try:
+            if args.target:
+                target, upstream_url, api_pid = args.target, args.upstream_url, args.api_pid
+            else:
+                upstream, api, upstream_url, target = start_processes(args, workdir)
+                processes = [api, upstream]
+                api_pid = api.pid
+            results = asyncio.run(run(args, target, upstream_url, api_pid))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=30)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"arguments": vars(args), "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
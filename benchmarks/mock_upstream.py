@@ -0,0 +1,208 @@
+"""
+Servidor local que simula Graph API (mensajes, URLs y descarga de medios), Mailjet y Twitter para pruebas de carga.
+
+Cada endpoint agrega una latencia configurable y puede responder errores 500 o throttling 429 con una probabilidad
+dada. Con --link-mbps las descargas de medios comparten un enlace de ancho de banda limitado, como ocurre al
+descargar varios videos a la vez. Los medios se generan de forma determinista a partir del media_id, cuyo formato es "<bytes>.<token>": así el
+generador de carga puede calcular el SHA-256 esperado sin descargarlo y elegir el tamaño de cada medio.
+
+Uso:
+    python benchmarks/mock_upstream.py --port 8081 --latency-ms 80 --jitter-ms 40 --error-rate 0.01 --throttle-rate 0.02
+
+Luego se apunta la API al servidor simulado:
+    GRAPH_API_BASE_URL=http://127.0.0.1:8081 MAILJET_API_URL=http://127.0.0.1:8081/ uvicorn main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MEDIA_CHUNK_SIZE = 64 * 1024
+DEFAULT_MEDIA_SIZE = 256 * 1024
+
+
+@dataclass
+class UpstreamSettings:
+    latency_ms: float = 50.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: Optional[float] = None
+    media_latency_ms: float = 0.0
+    link_mbps: float = 0.0
+
+
+def media_size(media_id: str) -> int:
+    size, _, _ = media_id.partition(".")
+    return int(size) if size.isdigit() else DEFAULT_MEDIA_SIZE
+
+
+def fake_media_chunks(media_id: str) -> Iterator[bytes]:
+    """
+    Genera el contenido del medio `media_id` por bloques. El contenido depende solo del media_id.
+    """
+    pattern = hashlib.sha256(media_id.encode()).digest()
+    chunk = pattern * (MEDIA_CHUNK_SIZE // len(pattern))
+    remaining = media_size(media_id)
+    while remaining > 0:
+        yield chunk[:remaining]
+        remaining -= len(chunk)
+
+
+def fake_media_sha256(media_id: str) -> str:
+    digest = hashlib.sha256()
+    for chunk in fake_media_chunks(media_id):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def create_app(settings: UpstreamSettings) -> FastAPI:
+    app = FastAPI()
+    calls: Counter = Counter()
+    # Momento en que el enlace simulado queda libre; los bloques de todas las descargas lo comparten en orden.
+    link = {"free_at": 0.0}
+
+    async def paced_media_chunks(media_id: str):
+        for chunk in fake_media_chunks(media_id):
+            if settings.link_mbps > 0:
+                loop = asyncio.get_running_loop()
+                link["free_at"] = max(loop.time(), link["free_at"]) + len(chunk) * 8 / (settings.link_mbps * 1_000_000)
+                await asyncio.sleep(link["free_at"] - loop.time())
+            yield chunk
+
+    async def simulate(operation: str) -> Optional[JSONResponse]:
+        # Latencia, error o throttling simulados; retorna la respuesta de error a usar, si corresponde.
+        calls[operation] += 1
+        delay = settings.latency_ms + random.uniform(-settings.jitter_ms, settings.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        roll = random.random()
+        if roll < settings.throttle_rate:
+            calls[f"{operation}:429"] += 1
+            headers = {"Retry-After": str(settings.retry_after)} if settings.retry_after is not None else None
+            return JSONResponse(
+                status_code=429, headers=headers,
+                content={"error": {"message": "(#130429) Rate limit hit", "type": "OAuthException", "code": 130429}},
+            )
+        if roll < settings.throttle_rate + settings.error_rate:
+            calls[f"{operation}:500"] += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "Simulated failure", "code": 1}})
+        return None
+
+    @app.post("/{version}/{phone_number_id}/messages")
+    async def send_message(version: str, phone_number_id: str, request: Request):
+        await request.body()
+        error = await simulate("graph.send_message")
+        if error:
+            return error
+        return {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": "18490000000", "wa_id": "18490000000"}],
+            "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}],
+        }
+
+    # Debe registrarse antes que "/{version}/{media_id}", que también coincide con "/media/<id>".
+    @app.get("/media/{media_id}", name="download_media")
+    async def download_media(media_id: str):
+        calls["media.download"] += 1
+        if settings.media_latency_ms:
+            await asyncio.sleep(settings.media_latency_ms / 1000)
+        return StreamingResponse(
+            paced_media_chunks(media_id), media_type="image/jpeg",
+            headers={"Content-Length": str(media_size(media_id))},
+        )
+
+    @app.get("/{version}/{media_id}")
+    async def get_media_url(version: str, media_id: str, request: Request):
+        error = await simulate("graph.get_media_url")
+        if error:
+            return error
+        return {
+            "messaging_product": "whatsapp",
+            "url": str(request.url_for("download_media", media_id=media_id)),
+            "mime_type": "image/jpeg",
+            "sha256": fake_media_sha256(media_id),
+            "file_size": media_size(media_id),
+            "id": media_id,
+        }
+
+    @app.post("/v3.1/send")
+    async def mailjet_send(request: Request):
+        body = await request.json()
+        error = await simulate("mailjet.send")
+        if error:
+            return error
+        return {"Messages": [
+            {"Status": "success", "CustomID": message.get("CustomID", ""), "To": [
+                {"Email": recipient.get("Email"), "MessageUUID": str(uuid.uuid4()), "MessageID": random.getrandbits(52)}
+                for recipient in message.get("To", [])
+            ]}
+            for message in body.get("Messages", [])
+        ]}
+
+    @app.post("/2/tweets")
+    async def create_tweet(request: Request):
+        body = await request.json()
+        error = await simulate("twitter.create_tweet")
+        if error:
+            return error
+        return {"data": {"id": str(random.getrandbits(63)), "text": body.get("text", "")}}
+
+    @app.post("/2/dm_conversations/with/{participant_id}/messages")
+    async def send_dm(participant_id: str, request: Request):
+        await request.body()
+        error = await simulate("twitter.send_dm")
+        if error:
+            return error
+        return {"data": {"dm_conversation_id": f"1-{participant_id}", "dm_event_id": str(random.getrandbits(63))}}
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(calls)
+
+    @app.delete("/_stats")
+    async def reset_stats():
+        calls.clear()
+        return {}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latencia media de cada llamada a la API")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Variación máxima (+/-) de la latencia")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de llamadas que responden 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fracción de llamadas que responden 429")
+    parser.add_argument("--retry-after", type=float, default=None, help="Valor del encabezado Retry-After en los 429")
+    parser.add_argument("--media-latency-ms", type=float, default=0.0, help="Latencia antes de servir un medio")
+    parser.add_argument("--link-mbps", type=float, default=0.0,
+                        help="Ancho de banda (Mbit/s) del enlace compartido por todas las descargas de medios; 0 = sin límite")
+
+
+def settings_from_args(args: argparse.Namespace) -> UpstreamSettings:
+    return UpstreamSettings(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, retry_after=args.retry_after, media_latency_ms=args.media_latency_ms,
+        link_mbps=args.link_mbps,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(settings_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import asyncio
+import itertools
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Union
+
+_DONE = object()
+
+
+def iter_ndjson_lines(body: bytes) -> Iterator[bytes]:
+    """
+    Recorre un cuerpo NDJSON línea por línea sin decodificarlo completo, omitiendo las líneas vacías.
+    """
+    start = 0
+    while start < len(body):
+        end = body.find(b"\n", start)
+        if end == -1:
+            end = len(body)
+        line = body[start:end].strip()
+        if line:
+            yield line
+        start = end + 1
+
+
+def parse_bulk_body(body: bytes, content_type: str, key: str) -> Iterable[Union[bytes, Any]]:
+    """
+    Obtiene los elementos de un cuerpo de envío masivo.
+
+    Se aceptan tres formatos: NDJSON (un objeto por línea, `application/x-ndjson`), un arreglo JSON, o un objeto JSON
+    con los elementos bajo `key`. En NDJSON cada línea se entrega sin decodificar para validarla individualmente, de
+    modo que una línea inválida solo produce un error en su propio resultado.
+
+    Args:
+        body (bytes): El cuerpo de la solicitud.
+        content_type (str): El encabezado Content-Type de la solicitud.
+        key (str): Clave que contiene la lista de elementos cuando el cuerpo es un objeto JSON.
+
+    Returns:
+        Iterable: Líneas NDJSON (bytes) u objetos ya decodificados.
+
+    Raises:
+        ValueError: Si el cuerpo JSON no es válido o no contiene una lista.
+    """
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return iter_ndjson_lines(body)
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get(key)
+    if not isinstance(data, list):
+        raise ValueError(f"Se esperaba una lista de elementos o un objeto con la clave '{key}'")
+    return data
+
+
+async def bounded_map(items: Iterable[Any], func: Callable[[int, Any], Awaitable[Any]], concurrency: int) -> AsyncIterator[Any]:
+    """
+    Ejecuta `func(index, item)` para cada elemento con a lo sumo `concurrency` ejecuciones simultáneas, entregando
+    los resultados a medida que terminan (no en el orden de entrada).
+
+    Los elementos se consumen de forma perezosa: solo se crea una tarea nueva cuando hay un lugar libre, por lo que
+    la memoria depende del límite de concurrencia y no de la cantidad de elementos. Si el consumidor deja de leer
+    (por ejemplo, porque el cliente se desconectó), las tareas pendientes se cancelan.
+
+    Args:
+        items (Iterable[Any]): Los elementos a procesar.
+        func (Callable): Corrutina que recibe el índice y el elemento y retorna su resultado. No debe lanzar excepciones.
+        concurrency (int): Máximo de ejecuciones simultáneas.
+
+    Yields:
+        Any: El resultado de cada elemento.
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def run(index: int, item: Any):
+        try:
+            results.put_nowait(await func(index, item))
+        finally:
+            semaphore.release()
+
+    async def produce():
+        try:
+            for index, item in enumerate(items):
+                await semaphore.acquire()
+                task = asyncio.create_task(run(index, item))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            # Espera a que todas las ejecuciones liberen su lugar.
+            for _ in range(concurrency):
+                await semaphore.acquire()
+        finally:
+            results.put_nowait(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            result = await results.get()
+            if result is _DONE:
+                break
+            yield result
+    finally:
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+def iter_chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Agrupa los elementos en listas de a lo sumo `size` elementos, consumiéndolos de forma perezosa.
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def flatten(results: AsyncIterator[Iterable[Any]]) -> AsyncIterator[Any]:
+    """
+    Entrega uno a uno los elementos de cada lista producida por `results` (por ejemplo, los resultados de un lote).
+    """
+    async for chunk in results:
+        for result in chunk:
+            yield result
+
+
+async def stream_ndjson(results: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+    """
+    Serializa cada resultado como una línea NDJSON a medida que está disponible.
+    """
+    async for result in results:
+        yield (json.dumps(result, ensure_ascii=False) + "\n").encode()
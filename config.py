@@ -18,6 +18,84 @@ class Config:
         VERSION (str): Versión de la API de WhatsApp a utilizar, con un valor predeterminado de 'v18.0'.
         MAILJET_KEY (str): Token de acceso del usuario para la autenticación con la API de Mailjet
         MAILJET_SECRET (str): Cadena string secreta generada en el dashboard de Mailjet con el fin de poderse autenticar
+        GRAPH_API_BASE_URL (str): URL base de Graph API; se puede apuntar a un servidor simulado en pruebas de carga.
+        MAILJET_API_URL (str): URL base de la API de Mailjet; se puede apuntar a un servidor simulado en pruebas de carga.
+        TWITTER_API_BASE_URL (str): URL base de la API de Twitter; se puede apuntar a un servidor simulado en pruebas de carga.
+        TWITTER_WORKERS (int): Hilos del executor dedicado a las llamadas (síncronas) de tweepy.
+        TWITTER_RATE_LIMIT_MAX_WAIT (float): Segundos máximos que una llamada espera a que se reinicie el límite de Twitter.
+        TWITTER_RATE_LIMIT_RETRIES (int): Reintentos de una llamada rechazada por Twitter con 429.
+        TWITTER_RATE_LIMIT_DEFAULT_RESET (float): Segundos de espera tras un 429 que no indica x-rate-limit-reset.
+        HTTP_MAX_CONNECTIONS (int): Máximo de conexiones simultáneas del cliente HTTP compartido.
+        HTTP_MAX_KEEPALIVE_CONNECTIONS (int): Máximo de conexiones ociosas que se mantienen abiertas (keep-alive).
+        HTTP_KEEPALIVE_EXPIRY (float): Segundos que una conexión ociosa permanece abierta antes de cerrarse.
+        HTTP2 (bool): Habilita HTTP/2 en el cliente compartido (requiere el paquete h2).
+        HTTP_TIMEOUT (float): Timeout por defecto, en segundos, para las solicitudes salientes.
+        HTTP_CONNECT_TIMEOUT (float): Timeout, en segundos, para establecer una conexión nueva.
+        HTTP_HOST_TIMEOUTS (str): Timeouts por host con el formato "host=segundos,host=segundos".
+        MEDIA_STREAM_DOWNLOADS (bool): Descarga los medios por bloques hacia un archivo temporal en lugar de cargarlos completos en memoria.
+        MEDIA_CHUNK_SIZE (int): Tamaño en bytes de cada bloque leído durante la descarga en streaming.
+        MEDIA_MAX_BYTES (int): Tamaño máximo permitido para un medio descargado; los medios más grandes se descartan.
+        MEDIA_DIR (str): Directorio base donde se almacenan los medios.
+        MEDIA_CONTENT_ADDRESSED (bool): Guarda los medios por su hash SHA-256 y evita descargar de nuevo contenido ya almacenado.
+        MEDIA_INDEX_PATH (str): Ruta de la base de datos SQLite con el índice media_id -> sha256 -> ruta.
+        MEDIA_SMALL_DOWNLOADS (int): Máximo de descargas simultáneas de medios pequeños (imágenes, notas de voz).
+        MEDIA_LARGE_DOWNLOADS (int): Máximo de descargas simultáneas de medios grandes (videos, documentos pesados).
+        MEDIA_LARGE_THRESHOLD (int): Tamaño esperado, en bytes, a partir del cual una descarga se considera grande.
+        MEDIA_INFLIGHT_BYTES (int): Máximo de bytes esperados sumando todas las descargas en curso.
+        MEDIA_POSTPROCESS_ENABLED (bool): Genera miniaturas y metadatos de los medios guardados en un pool de procesos.
+        MEDIA_POSTPROCESS_WORKERS (int): Procesos del pool de post-procesamiento (por cada worker de la API).
+        MEDIA_POSTPROCESS_QUEUE_SIZE (int): Capacidad de la cola de post-procesamiento; al llenarse, los medios nuevos se omiten.
+        API_WORKERS (int): Procesos que atienden la API; lo define gunicorn.conf.py. Los límites en memoria por proceso se reparten entre ellos.
+        WEBHOOK_ACK_FIRST (bool): Responde 200 al webhook apenas el evento es encolado y lo procesa en segundo plano.
+        WEBHOOK_WORKERS (int): Cantidad de workers asíncronos que consumen la cola del webhook y admiten cada evento en el secuenciador de conversaciones.
+        WEBHOOK_QUEUE_SIZE (int): Capacidad máxima de la cola del webhook; al llenarse se responde 503.
+        WEBHOOK_DRAIN_TIMEOUT (float): Segundos que se espera a vaciar la cola al apagar la aplicación.
+        STRATEGY_CONCURRENCY (str): Elementos procesados en paralelo por estrategia del webhook, con el formato "estrategia=N,estrategia=N".
+        STRATEGY_DEFAULT_CONCURRENCY (int): Concurrencia de las estrategias que no aparecen en STRATEGY_CONCURRENCY.
+        STRATEGY_QUEUE_SIZE (int): Capacidad de la cola de cada estrategia; al llenarse, el webhook espera a que haya espacio.
+        CONVERSATION_MAX_PENDING (int): Máximo de elementos del webhook pendientes por tipo de elemento (texto, video, estado, ...) entre todas las conversaciones; al alcanzarse, el webhook espera.
+        OUTBOX_ENABLED (bool): Persiste los mensajes salientes en el outbox y responde "accepted" en lugar de enviarlos en línea.
+        OUTBOX_PATH (str): Ruta de la base de datos SQLite del outbox.
+        OUTBOX_CONCURRENCY (int): Máximo de envíos simultáneos a Graph API desde el outbox.
+        OUTBOX_BATCH_SIZE (int): Máximo de mensajes por transacción de escritura.
+        OUTBOX_BATCH_WINDOW (float): Segundos que se acumulan escrituras antes de confirmarlas en una sola transacción.
+        OUTBOX_MAX_ATTEMPTS (int): Intentos de envío antes de marcar un mensaje como fallido.
+        OUTBOX_RETRY_BASE_DELAY (float): Retraso base, en segundos, del backoff exponencial entre reintentos.
+        OUTBOX_POLL_INTERVAL (float): Segundos entre sondeos del outbox cuando no hay mensajes listos.
+        OUTBOX_CLAIM_TIMEOUT (float): Segundos sin renovar tras los cuales un mensaje reclamado vuelve a enviarse; el worker que lo envía renueva su reclamo.
+        WHATSAPP_RATE_LIMIT (float): Mensajes por segundo permitidos por PHONE_NUMBER_ID (tasa máxima del limitador).
+        WHATSAPP_RATE_LIMIT_BURST (float): Tokens máximos acumulables, es decir, la ráfaga permitida.
+        WHATSAPP_RATE_LIMIT_MIN (float): Tasa mínima a la que puede bajar el limitador tras respuestas de throttling.
+        WHATSAPP_RATE_LIMIT_MAX_WAIT (float): Segundos que una solicitud puede esperar un token antes de fallar con 429.
+        WHATSAPP_RATE_LIMIT_RETRIES (int): Reintentos de un envío que Meta rechazó por throttling.
+        BULK_SEND_CONCURRENCY (int): Máximo de envíos simultáneos en los endpoints de envío masivo.
+        MAILJET_BATCH_SIZE (int): Máximo de correos por solicitud a Mailjet en /send-email/batch (la API v3.1 acepta 50).
+        MAILJET_BATCH_CONCURRENCY (int): Máximo de solicitudes simultáneas a Mailjet en /send-email/batch.
+        SUBSCRIBER_TIMEOUT (float): Timeout, en segundos, de cada notificación a un suscriptor.
+        SUBSCRIBER_MAX_RETRIES (int): Reintentos de una notificación fallida a un suscriptor.
+        SUBSCRIBER_RETRY_BASE_DELAY (float): Retraso base, en segundos, del backoff con jitter entre reintentos.
+        SUBSCRIBER_BREAKER_THRESHOLD (int): Fallos consecutivos que abren el circuito de un suscriptor.
+        SUBSCRIBER_BREAKER_RESET (float): Segundos que el circuito permanece abierto antes de probar de nuevo.
+        SUBSCRIPTIONS_API_KEY (str): Clave que deben enviar en X-API-Key las solicitudes de registro de suscriptores; sin ella los endpoints quedan deshabilitados.
+        SUBSCRIBER_ALLOW_PRIVATE_URLS (bool): Permite registrar y notificar suscriptores en direcciones privadas, de loopback o link-local (solo para desarrollo).
+        SUBSCRIPTIONS_DB_PATH (str): Ruta de la base de datos SQLite con el registro de suscriptores.
+        SUBSCRIPTIONS_REFRESH_INTERVAL (float): Segundos entre verificaciones de cambios hechos por otros workers en el registro.
+        WEBHOOK_SUBSCRIBERS (str): URLs de suscriptores iniciales, separadas por comas; reciben todos los eventos.
+        DEDUP_ENABLED (bool): Descarta los mensajes y estados del webhook que ya fueron procesados.
+        DEDUP_TTL (float): Segundos durante los cuales un id procesado se considera duplicado.
+        DEDUP_MAX_ENTRIES (int): Máximo de ids recordados en el LRU en memoria.
+        DEDUP_PERSISTENT (bool): Agrega una capa en SQLite compartida entre workers; siempre activa con más de un worker.
+        DEDUP_DB_PATH (str): Ruta de la base de datos SQLite de deduplicación.
+        MEDIA_URL_CACHE_TTL (float): Segundos durante los cuales se reutiliza la URL de descarga obtenida para un media_id.
+        MEDIA_URL_CACHE_MAX_ENTRIES (int): Máximo de URLs de medios guardadas en la caché.
+        LOG_ASYNC (bool): Envía los logs a una cola que un hilo aparte escribe en consola y disco, sin bloquear el event loop.
+        LOG_QUEUE_SIZE (int): Máximo de registros pendientes en la cola de logs; si se llena, los nuevos se descartan.
+        LOG_FORMAT (str): Formato de salida de los logs: "text" o "json".
+        LOG_FILE (str): Ruta del archivo de log; vacío para escribir solo en stdout. Con más de un worker no se usa (solo stdout).
+        LOG_MAX_BYTES (int): Tamaño a partir del cual se rota el archivo de log.
+        LOG_BACKUP_COUNT (int): Cantidad de archivos de log rotados que se conservan.
+        LOG_PAYLOAD_SAMPLE_RATE (float): Fracción (0 a 1) de los cuerpos completos de webhooks que se registran en el log.
+        METRICS_REFRESH_INTERVAL (float): Segundos entre actualizaciones de los gauges calculados en modo multiproceso.
     """
     
     BUSINESS_ID = os.getenv('BUSINESS_ID', 'default_value')
@@ -28,8 +106,88 @@ class Config:
     VERSION = os.getenv('VERSION', 'v18.0')
     MAILJET_KEY = os.getenv('MAILJET_KEY', 'default_value')
     MAILJET_SECRET = os.getenv('MAILJET_SECRET', 'default_value')
+    GRAPH_API_BASE_URL = os.getenv('GRAPH_API_BASE_URL', 'https://graph.facebook.com').rstrip('/')
+    MAILJET_API_URL = os.getenv('MAILJET_API_URL', 'https://api.mailjet.com/')
+    TWITTER_API_BASE_URL = os.getenv('TWITTER_API_BASE_URL', 'https://api.twitter.com')
+    TWITTER_WORKERS = int(os.getenv('TWITTER_WORKERS', '4'))
+    TWITTER_RATE_LIMIT_MAX_WAIT = float(os.getenv('TWITTER_RATE_LIMIT_MAX_WAIT', '30'))
+    TWITTER_RATE_LIMIT_RETRIES = int(os.getenv('TWITTER_RATE_LIMIT_RETRIES', '1'))
+    TWITTER_RATE_LIMIT_DEFAULT_RESET = float(os.getenv('TWITTER_RATE_LIMIT_DEFAULT_RESET', '60'))
     TWITTER_CONSUMER_KEY = os.getenv('TWITTER_CONSUMER_KEY', 'default_value')
     TWITTER_CONSUMER_SECRET = os.getenv('TWITTER_CONSUMER_SECRET', 'default_value')
     TWITTER_ACCESS_TOKEN = os.getenv('TWITTER_ACCESS_TOKEN', 'default_value')
     TWITTER_TOKEN_SECRET = os.getenv('TWITTER_TOKEN_SECRET', 'default_value')
     TWITTER_BEARER_TOKEN = os.getenv('TWITTER_BEARER_TOKEN', 'default_value')
+    HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+    HTTP2 = os.getenv('HTTP2', 'false').lower() == 'true'
+    HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '10'))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+    HTTP_HOST_TIMEOUTS = os.getenv('HTTP_HOST_TIMEOUTS', 'graph.facebook.com=15,lookaside.fbsbx.com=60')
+    MEDIA_STREAM_DOWNLOADS = os.getenv('MEDIA_STREAM_DOWNLOADS', 'true').lower() == 'true'
+    MEDIA_CHUNK_SIZE = int(os.getenv('MEDIA_CHUNK_SIZE', str(64 * 1024)))
+    MEDIA_MAX_BYTES = int(os.getenv('MEDIA_MAX_BYTES', str(100 * 1024 * 1024)))
+    MEDIA_DIR = os.getenv('MEDIA_DIR', './media')
+    MEDIA_CONTENT_ADDRESSED = os.getenv('MEDIA_CONTENT_ADDRESSED', 'true').lower() == 'true'
+    MEDIA_INDEX_PATH = os.getenv('MEDIA_INDEX_PATH', './media/index.db')
+    MEDIA_SMALL_DOWNLOADS = int(os.getenv('MEDIA_SMALL_DOWNLOADS', '16'))
+    MEDIA_LARGE_DOWNLOADS = int(os.getenv('MEDIA_LARGE_DOWNLOADS', '2'))
+    MEDIA_LARGE_THRESHOLD = int(os.getenv('MEDIA_LARGE_THRESHOLD', str(5 * 1024 * 1024)))
+    MEDIA_INFLIGHT_BYTES = int(os.getenv('MEDIA_INFLIGHT_BYTES', str(64 * 1024 * 1024)))
+    MEDIA_POSTPROCESS_ENABLED = os.getenv('MEDIA_POSTPROCESS_ENABLED', 'true').lower() == 'true'
+    MEDIA_POSTPROCESS_WORKERS = int(os.getenv('MEDIA_POSTPROCESS_WORKERS', '2'))
+    MEDIA_POSTPROCESS_QUEUE_SIZE = int(os.getenv('MEDIA_POSTPROCESS_QUEUE_SIZE', '100'))
+    API_WORKERS = max(1, int(os.getenv('API_WORKERS', '1')))
+    WEBHOOK_ACK_FIRST = os.getenv('WEBHOOK_ACK_FIRST', 'true').lower() == 'true'
+    WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '8'))
+    WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+    WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', '10'))
+    STRATEGY_CONCURRENCY = os.getenv('STRATEGY_CONCURRENCY', 'text=32,status=32,image=8,audio=8,document=4,video=2')
+    STRATEGY_DEFAULT_CONCURRENCY = int(os.getenv('STRATEGY_DEFAULT_CONCURRENCY', '4'))
+    STRATEGY_QUEUE_SIZE = int(os.getenv('STRATEGY_QUEUE_SIZE', '500'))
+    CONVERSATION_MAX_PENDING = int(os.getenv('CONVERSATION_MAX_PENDING', '10000'))
+    OUTBOX_ENABLED = os.getenv('OUTBOX_ENABLED', 'false').lower() == 'true'
+    OUTBOX_PATH = os.getenv('OUTBOX_PATH', './data/outbox.db')
+    OUTBOX_CONCURRENCY = int(os.getenv('OUTBOX_CONCURRENCY', '10'))
+    OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '200'))
+    OUTBOX_BATCH_WINDOW = float(os.getenv('OUTBOX_BATCH_WINDOW', '0.005'))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+    OUTBOX_RETRY_BASE_DELAY = float(os.getenv('OUTBOX_RETRY_BASE_DELAY', '2'))
+    OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '1'))
+    OUTBOX_CLAIM_TIMEOUT = float(os.getenv('OUTBOX_CLAIM_TIMEOUT', '120'))
+    WHATSAPP_RATE_LIMIT = float(os.getenv('WHATSAPP_RATE_LIMIT', '80'))
+    WHATSAPP_RATE_LIMIT_BURST = float(os.getenv('WHATSAPP_RATE_LIMIT_BURST', os.getenv('WHATSAPP_RATE_LIMIT', '80')))
+    WHATSAPP_RATE_LIMIT_MIN = float(os.getenv('WHATSAPP_RATE_LIMIT_MIN', '1'))
+    WHATSAPP_RATE_LIMIT_MAX_WAIT = float(os.getenv('WHATSAPP_RATE_LIMIT_MAX_WAIT', '5'))
+    WHATSAPP_RATE_LIMIT_RETRIES = int(os.getenv('WHATSAPP_RATE_LIMIT_RETRIES', '2'))
+    BULK_SEND_CONCURRENCY = int(os.getenv('BULK_SEND_CONCURRENCY', '50'))
+    MAILJET_BATCH_SIZE = int(os.getenv('MAILJET_BATCH_SIZE', '50'))
+    MAILJET_BATCH_CONCURRENCY = int(os.getenv('MAILJET_BATCH_CONCURRENCY', '4'))
+    SUBSCRIBER_TIMEOUT = float(os.getenv('SUBSCRIBER_TIMEOUT', '5'))
+    SUBSCRIBER_MAX_RETRIES = int(os.getenv('SUBSCRIBER_MAX_RETRIES', '2'))
+    SUBSCRIBER_RETRY_BASE_DELAY = float(os.getenv('SUBSCRIBER_RETRY_BASE_DELAY', '0.5'))
+    SUBSCRIBER_BREAKER_THRESHOLD = int(os.getenv('SUBSCRIBER_BREAKER_THRESHOLD', '5'))
+    SUBSCRIBER_BREAKER_RESET = float(os.getenv('SUBSCRIBER_BREAKER_RESET', '30'))
+    SUBSCRIPTIONS_API_KEY = os.getenv('SUBSCRIPTIONS_API_KEY', '')
+    SUBSCRIBER_ALLOW_PRIVATE_URLS = os.getenv('SUBSCRIBER_ALLOW_PRIVATE_URLS', 'false').lower() == 'true'
+    SUBSCRIPTIONS_DB_PATH = os.getenv('SUBSCRIPTIONS_DB_PATH', './data/subscriptions.db')
+    SUBSCRIPTIONS_REFRESH_INTERVAL = float(os.getenv('SUBSCRIPTIONS_REFRESH_INTERVAL', '5'))
+    WEBHOOK_SUBSCRIBERS = os.getenv('WEBHOOK_SUBSCRIBERS', '')
+    DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() == 'true'
+    DEDUP_TTL = float(os.getenv('DEDUP_TTL', str(24 * 60 * 60)))
+    DEDUP_MAX_ENTRIES = int(os.getenv('DEDUP_MAX_ENTRIES', '100000'))
+    # Con varios workers, un reenvío puede llegar a otro proceso: solo la capa compartida lo detecta.
+    DEDUP_PERSISTENT = os.getenv('DEDUP_PERSISTENT', 'false').lower() == 'true' or API_WORKERS > 1
+    DEDUP_DB_PATH = os.getenv('DEDUP_DB_PATH', './data/dedup.db')
+    # Las URLs de descarga de Graph API expiran a los 5 minutos; se reutilizan por un tiempo menor.
+    MEDIA_URL_CACHE_TTL = float(os.getenv('MEDIA_URL_CACHE_TTL', '240'))
+    MEDIA_URL_CACHE_MAX_ENTRIES = int(os.getenv('MEDIA_URL_CACHE_MAX_ENTRIES', '10000'))
+    LOG_ASYNC = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+    LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '1.0'))
+    METRICS_REFRESH_INTERVAL = float(os.getenv('METRICS_REFRESH_INTERVAL', '5'))
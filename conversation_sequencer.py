@@ -0,0 +1,91 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus, set_gauge_function
+from logger import logger
+
+
+class KeyedSequencer:
+    """
+    Ejecuta tareas en orden por clave (por ejemplo, el wa_id de una conversación) y en paralelo entre claves.
+
+    Cada tarea se encadena a la tarea pendiente anterior de su misma clave: empieza cuando aquella termina (con
+    éxito, error o cancelación). `_tails` guarda solo la última tarea pendiente de cada clave y se limpia al
+    terminar, así que su tamaño es la cantidad de conversaciones con trabajo pendiente y no se crea un lock ni un
+    worker por conversación. A diferencia de repartir las claves en un número fijo de colas, una tarea lenta (por
+    ejemplo, la descarga de un video) solo retrasa a las tareas posteriores de su propia conversación.
+
+    El máximo de tareas pendientes se aplica por carril (el tipo de elemento: "text", "video", "status", ...), no
+    entre todos: una ráfaga de videos que espera su estrategia solo agota los cupos de su carril y los textos y
+    estados de otras conversaciones se siguen encolando.
+
+    El orden se garantiza dentro de un proceso: con varios workers de gunicorn, dos webhooks de la misma
+    conversación atendidos por workers distintos no se ordenan entre sí.
+
+    Métodos:
+        - submit: Encadena una tarea a la última pendiente de su clave, con un cupo de su carril, y retorna la tarea creada.
+        - stop: Espera las tareas pendientes (con un timeout) y cancela las restantes.
+    """
+
+    def __init__(self, max_pending: int = Config.CONVERSATION_MAX_PENDING):
+        self.max_pending = max_pending
+        self._tails: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._gauges_registered = False
+
+    async def submit(self, key: str, func: Callable[..., Awaitable[Any]], *args: Any, lane: str = "default") -> asyncio.Task:
+        """
+        Encadena `func(*args)` a la última tarea pendiente de `key`. Si ya hay `max_pending` tareas pendientes en
+        el carril `lane`, espera a que alguna de ellas termine (backpressure).
+
+        Returns:
+            asyncio.Task: Se resuelve con el resultado de `func`, o con su excepción.
+        """
+        if not self._gauges_registered:
+            self._register_gauges()
+        slots = self._slots.get(lane)
+        if slots is None:
+            slots = self._slots[lane] = asyncio.Semaphore(self.max_pending)
+        await slots.acquire()
+        task = asyncio.create_task(self._run(self._tails.get(key), time.perf_counter(), func, args))
+        self._tails[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._finish(key, slots, done))
+        return task
+
+    def _register_gauges(self):
+        set_gauge_function(CustomMetricsPrometheus.Conversaciones_tareas_pendientes, lambda: len(self._tasks))
+        set_gauge_function(CustomMetricsPrometheus.Conversaciones_activas, lambda: len(self._tails))
+        self._gauges_registered = True
+
+    def _finish(self, key: str, slots: asyncio.Semaphore, task: asyncio.Task):
+        self._tasks.discard(task)
+        slots.release()
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    @staticmethod
+    async def _run(previous: Optional[asyncio.Task], enqueued_at: float, func: Callable[..., Awaitable[Any]], args) -> Any:
+        if previous is not None:
+            # asyncio.wait no propaga el error ni la cancelación de la tarea anterior.
+            await asyncio.wait([previous])
+        CustomMetricsPrometheus.Conversaciones_cola_espera_segundos.observe(time.perf_counter() - enqueued_at)
+        return await func(*args)
+
+    async def stop(self, timeout: float = Config.WEBHOOK_DRAIN_TIMEOUT):
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if pending:
+            logger.warning(f"Se detiene el secuenciador de conversaciones con {len(pending)} tareas pendientes")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info("Secuenciador de conversaciones detenido")
+
+
+# Instancia compartida por toda la aplicación.
+conversation_sequencer = KeyedSequencer()
@@ -1,5 +1,13 @@
+import asyncio
+import os
+from typing import Callable, List, Tuple
+
 import prometheus_client
 
+# Con varios workers (gunicorn.conf.py) cada proceso escribe sus métricas en PROMETHEUS_MULTIPROC_DIR y /metrics las
+# agrega. Los gauges de cada clase indican con `multiprocess_mode` cómo combinar los valores de los procesos.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
 class CustomMetricsPrometheus:
 
     Cantidad_mensajes_whatsapp_enviados = prometheus_client.Counter(
@@ -40,4 +48,308 @@ class CustomMetricsPrometheus:
     Tweets_recibidos_whatsapp = prometheus_client.Counter(
         "Tweets_recibidos_whatsapp",
         "Cantidad de mensajes que han retornado o dado origen a algún tipo de ERROR"
-    )
\ No newline at end of file
+    )
+
+    Conexiones_pool_http = prometheus_client.Gauge(
+        "Conexiones_pool_http",
+        "Estado del pool de conexiones del cliente HTTP compartido (active, idle, waiting)",
+        ["estado"],
+        multiprocess_mode="livesum"
+    )
+
+    Medios_deduplicados = prometheus_client.Counter(
+        "Medios_deduplicados",
+        "Cantidad de medios recibidos cuyo contenido ya estaba almacenado, por lo que no se volvieron a descargar"
+    )
+
+    Webhook_cola_profundidad = prometheus_client.Gauge(
+        "Webhook_cola_profundidad",
+        "Cantidad de eventos del webhook esperando admisión en la cola del pool (en modo ack-first el pool solo "
+        "deduplica y encadena los elementos en el secuenciador; el backlog de procesamiento está en "
+        "Conversaciones_tareas_pendientes y Estrategia_cola_profundidad)",
+        multiprocess_mode="livesum"
+    )
+
+    Webhook_cola_espera_segundos = prometheus_client.Histogram(
+        "Webhook_cola_espera_segundos",
+        "Tiempo que un evento del webhook espera en la cola del pool antes de su admisión (deduplicación y "
+        "encadenamiento en el secuenciador), no antes de su procesamiento"
+    )
+
+    Webhook_workers_utilizacion = prometheus_client.Gauge(
+        "Webhook_workers_utilizacion",
+        "Fracción de workers del webhook ocupados admitiendo eventos (0 a 1). Llega a 1 cuando el secuenciador aplica "
+        "backpressure; la utilización del procesamiento es Estrategia_utilizacion",
+        multiprocess_mode="liveall"
+    )
+
+    Webhook_eventos_rechazados = prometheus_client.Counter(
+        "Webhook_eventos_rechazados",
+        "Cantidad de eventos del webhook rechazados con 503 porque la cola estaba llena"
+    )
+
+    Outbox_mensajes_pendientes = prometheus_client.Gauge(
+        "Outbox_mensajes_pendientes",
+        "Cantidad de mensajes en el outbox pendientes de envío",
+        multiprocess_mode="livemax"
+    )
+
+    Outbox_mensajes_procesados = prometheus_client.Counter(
+        "Outbox_mensajes_procesados",
+        "Intentos de envío desde el outbox por resultado (sent, retry, failed)",
+        ["resultado"]
+    )
+
+    Whatsapp_tasa_envio = prometheus_client.Gauge(
+        "Whatsapp_tasa_envio",
+        "Tasa de envío actual (mensajes por segundo) del limitador adaptativo por número de WhatsApp",
+        ["phone_number_id"],
+        multiprocess_mode="livesum"
+    )
+
+    Whatsapp_respuestas_throttling = prometheus_client.Counter(
+        "Whatsapp_respuestas_throttling",
+        "Cantidad de respuestas de throttling (429 o error 130429) recibidas de Meta por número de WhatsApp",
+        ["phone_number_id"]
+    )
+
+    Whatsapp_espera_limite_segundos = prometheus_client.Histogram(
+        "Whatsapp_espera_limite_segundos",
+        "Tiempo que un envío esperó un token del limitador de tasa"
+    )
+
+    Suscriptor_latencia_segundos = prometheus_client.Histogram(
+        "Suscriptor_latencia_segundos",
+        "Latencia de cada intento de notificación a un suscriptor (por id de registro)",
+        ["suscriptor"]
+    )
+
+    Suscriptor_entregas = prometheus_client.Counter(
+        "Suscriptor_entregas",
+        "Notificaciones a suscriptores por id de registro y resultado (success, rejected, error, circuit_open)",
+        ["suscriptor", "resultado"]
+    )
+
+    Suscriptor_circuito_abierto = prometheus_client.Gauge(
+        "Suscriptor_circuito_abierto",
+        "Indica si el circuit breaker de un suscriptor (por id de registro) está abierto (1) o cerrado (0)",
+        ["suscriptor"],
+        multiprocess_mode="livemax"
+    )
+
+    Dedup_consultas = prometheus_client.Counter(
+        "Dedup_consultas",
+        "Consultas a la caché de deduplicación del webhook por resultado (hit = duplicado descartado, miss = nuevo)",
+        ["resultado"]
+    )
+
+    Media_url_cache_consultas = prometheus_client.Counter(
+        "Media_url_cache_consultas",
+        "Consultas de URLs de medios por resultado (hit = desde caché, coalesced = unida a una solicitud en vuelo, miss = llamada a Graph API)",
+        ["resultado"]
+    )
+
+    Media_url_llamadas_ahorradas = prometheus_client.Counter(
+        "Media_url_llamadas_ahorradas",
+        "Llamadas a Graph API evitadas por la caché de URLs de medios y la agrupación de solicitudes concurrentes"
+    )
+
+    Logs_descartados = prometheus_client.Counter(
+        "Logs_descartados",
+        "Registros de log descartados porque la cola del logging asíncrono estaba llena"
+    )
+
+    Http_latencia_segundos = prometheus_client.Histogram(
+        "Http_latencia_segundos",
+        "Duración de las solicitudes HTTP atendidas por la API, por método, plantilla de ruta y código de estado",
+        ["method", "route", "status_code"],
+        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    )
+
+    Dependencia_latencia_segundos = prometheus_client.Histogram(
+        "Dependencia_latencia_segundos",
+        "Latencia de las llamadas a servicios externos por dependencia, operación y resultado",
+        ["dependency", "operation", "resultado"],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    )
+
+    Dependencia_respuesta_bytes = prometheus_client.Histogram(
+        "Dependencia_respuesta_bytes",
+        "Tamaño en bytes de las respuestas de servicios externos por dependencia y operación",
+        ["dependency", "operation"],
+        buckets=tuple(256 * 4 ** exponent for exponent in range(11))
+    )
+
+    Dependencia_llamadas_en_curso = prometheus_client.Gauge(
+        "Dependencia_llamadas_en_curso",
+        "Llamadas a servicios externos en curso por dependencia y operación",
+        ["dependency", "operation"],
+        multiprocess_mode="livesum"
+    )
+
+    Medios_bytes_escritos = prometheus_client.Counter(
+        "Medios_bytes_escritos",
+        "Bytes de medios escritos en el directorio de medios"
+    )
+
+
+    Estrategia_latencia_segundos = prometheus_client.Histogram(
+        "Estrategia_latencia_segundos",
+        "Duración del procesamiento de cada elemento del webhook por estrategia y resultado (su conteo es el throughput)",
+        ["strategy", "resultado"],
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    )
+
+    Estrategia_cola_espera_segundos = prometheus_client.Histogram(
+        "Estrategia_cola_espera_segundos",
+        "Tiempo que un elemento del webhook espera en la cola de su estrategia antes de ser procesado",
+        ["strategy"]
+    )
+
+    Estrategia_cola_profundidad = prometheus_client.Gauge(
+        "Estrategia_cola_profundidad",
+        "Cantidad de elementos esperando en la cola de cada estrategia",
+        ["strategy"],
+        multiprocess_mode="livesum"
+    )
+
+    Estrategia_en_curso = prometheus_client.Gauge(
+        "Estrategia_en_curso",
+        "Cantidad de elementos que cada estrategia está procesando",
+        ["strategy"],
+        multiprocess_mode="livesum"
+    )
+
+    Estrategia_utilizacion = prometheus_client.Gauge(
+        "Estrategia_utilizacion",
+        "Fracción de los workers de cada estrategia ocupados procesando elementos del webhook (0 a 1)",
+        ["strategy"],
+        multiprocess_mode="liveall"
+    )
+
+    Conversaciones_tareas_pendientes = prometheus_client.Gauge(
+        "Conversaciones_tareas_pendientes",
+        "Cantidad de elementos del webhook pendientes en el secuenciador por conversación (en espera o en proceso)",
+        multiprocess_mode="livesum"
+    )
+
+    Conversaciones_activas = prometheus_client.Gauge(
+        "Conversaciones_activas",
+        "Cantidad de conversaciones con elementos pendientes en el secuenciador",
+        multiprocess_mode="livesum"
+    )
+
+    Conversaciones_cola_espera_segundos = prometheus_client.Histogram(
+        "Conversaciones_cola_espera_segundos",
+        "Tiempo que un elemento del webhook espera a que terminen los elementos anteriores de su conversación"
+    )
+
+    Postproceso_cola_profundidad = prometheus_client.Gauge(
+        "Postproceso_cola_profundidad",
+        "Cantidad de medios esperando en la cola de post-procesamiento",
+        multiprocess_mode="livesum"
+    )
+
+    Postproceso_cola_espera_segundos = prometheus_client.Histogram(
+        "Postproceso_cola_espera_segundos",
+        "Tiempo que un medio espera en la cola antes de enviarse al pool de procesos"
+    )
+
+    Postproceso_etapa_segundos = prometheus_client.Histogram(
+        "Postproceso_etapa_segundos",
+        "Duración de cada etapa de post-procesamiento de medios por tipo de medio, etapa y resultado",
+        ["media_type", "stage", "resultado"],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    )
+
+    Postproceso_descartados = prometheus_client.Counter(
+        "Postproceso_descartados",
+        "Cantidad de medios que no se post-procesaron porque la cola estaba llena"
+    )
+
+    Descargas_espera_segundos = prometheus_client.Histogram(
+        "Descargas_espera_segundos",
+        "Tiempo que una descarga de medio espera un cupo del planificador, por clase de tamaño (small, large)",
+        ["clase"],
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    )
+
+    Descargas_en_curso = prometheus_client.Gauge(
+        "Descargas_en_curso",
+        "Descargas de medios en curso por clase de tamaño",
+        ["clase"],
+        multiprocess_mode="livesum"
+    )
+
+    Descargas_en_espera = prometheus_client.Gauge(
+        "Descargas_en_espera",
+        "Descargas de medios esperando un cupo por clase de tamaño",
+        ["clase"],
+        multiprocess_mode="livesum"
+    )
+
+    Descargas_bytes_en_curso = prometheus_client.Gauge(
+        "Descargas_bytes_en_curso",
+        "Suma de los tamaños esperados de las descargas de medios en curso",
+        multiprocess_mode="livesum"
+    )
+
+    Twitter_limite_restante = prometheus_client.Gauge(
+        "Twitter_limite_restante",
+        "Llamadas restantes en la ventana de límite de Twitter por endpoint (x-rate-limit-remaining)",
+        ["endpoint"],
+        multiprocess_mode="livemin"
+    )
+
+    Twitter_espera_limite_segundos = prometheus_client.Histogram(
+        "Twitter_espera_limite_segundos",
+        "Tiempo que una llamada a Twitter esperó a que se reiniciara la ventana de límite",
+        ["endpoint"]
+    )
+
+_gauge_functions: List[Tuple[prometheus_client.Gauge, Callable[[], float]]] = []
+
+
+def set_gauge_function(gauge: prometheus_client.Gauge, function: Callable[[], float]):
+    """
+    Equivalente a `gauge.set_function(function)` compatible con el modo multiproceso.
+
+    En modo multiproceso /metrics solo lee los archivos de cada worker, por lo que un gauge calculado al momento del
+    scrape no se exportaría; en su lugar el valor se copia periódicamente con `refresh_gauge_functions`.
+    """
+    if MULTIPROCESS:
+        _gauge_functions.append((gauge, function))
+    else:
+        gauge.set_function(function)
+
+
+def remove_label_series(metric, *labelvalues: str):
+    """
+    Elimina la serie de `metric` con las etiquetas indicadas, si existe.
+
+    En modo multiproceso prometheus_client no permite eliminar series: los valores ya escritos en los archivos del
+    worker se siguen exportando hasta que el proceso termina.
+    """
+    if MULTIPROCESS:
+        return
+    try:
+        metric.remove(*labelvalues)
+    except KeyError:
+        pass
+
+
+def refresh_gauge_functions():
+    """
+    Actualiza los gauges registrados con `set_gauge_function` (solo tiene efecto en modo multiproceso).
+    """
+    for gauge, function in _gauge_functions:
+        gauge.set(function())
+
+
+async def refresh_gauge_functions_periodically(interval: float):
+    """
+    Ejecuta `refresh_gauge_functions` cada `interval` segundos hasta ser cancelada.
+    """
+    while True:
+        refresh_gauge_functions()
+        await asyncio.sleep(interval)
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus
+
+
+class DedupCache:
+    """
+    Caché de deduplicación para los webhooks que Meta reenvía tras un timeout.
+
+    Combina un LRU en memoria con TTL y, opcionalmente (Config.DEDUP_PERSISTENT), una segunda capa en SQLite
+    compartida por todos los workers. Un acierto en memoria descarta el elemento sin ninguna E/S; un fallo en memoria
+    se resuelve contra SQLite con `INSERT OR IGNORE`, de modo que solo un worker "gana" cada id aunque la misma
+    entrega llegue a procesos distintos.
+
+    Métodos:
+        - filter_new: Recibe una lista de claves y retorna cuáles se ven por primera vez, marcándolas como vistas.
+        - forget: Desmarca claves cuyo procesamiento falló, para que un reenvío de Meta no se descarte.
+    """
+
+    def __init__(self, ttl: float = Config.DEDUP_TTL, max_entries: int = Config.DEDUP_MAX_ENTRIES,
+                 persistent: bool = Config.DEDUP_PERSISTENT, path: str = Config.DEDUP_DB_PATH):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self.path = path
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._purged_at = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _seen_in_memory(self, key: str, now: float) -> bool:
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < now:
+            del self._entries[key]
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def _remember(self, key: str, now: float):
+        self._entries[key] = now + self.ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _claim_persistent(self, keys: List[str], now: float) -> List[bool]:
+        # Retorna, para cada clave, si este proceso es el primero en verla dentro del TTL.
+        with self._lock:
+            connection = self._connect()
+            claimed = []
+            for key in keys:
+                cursor = connection.execute(
+                    "INSERT INTO seen (key, expires_at) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at WHERE seen.expires_at < ?",
+                    (key, now + self.ttl, now),
+                )
+                claimed.append(cursor.rowcount > 0)
+            if now - self._purged_at > self.ttl:
+                connection.execute("DELETE FROM seen WHERE expires_at < ?", (now,))
+                self._purged_at = now
+            connection.commit()
+        return claimed
+
+    async def filter_new(self, keys: List[str]) -> List[bool]:
+        """
+        Indica cuáles claves se ven por primera vez y las marca como vistas.
+
+        Args:
+            keys (List[str]): Claves de los elementos del webhook (ids de mensajes y pares id/estado).
+
+        Returns:
+            List[bool]: Para cada clave, True si es nueva; False si es un duplicado dentro del TTL.
+        """
+        now = time.time()
+        result = [False] * len(keys)
+        misses = []
+        for position, key in enumerate(keys):
+            if self._seen_in_memory(key, now):
+                CustomMetricsPrometheus.Dedup_consultas.labels("hit").inc()
+            else:
+                misses.append(position)
+
+        if misses and self.persistent:
+            claimed = await asyncio.to_thread(self._claim_persistent, [keys[position] for position in misses], now)
+        else:
+            claimed = [True] * len(misses)
+
+        for position, is_new in zip(misses, claimed):
+            key = keys[position]
+            # Una clave repetida dentro del mismo lote solo cuenta como nueva la primera vez.
+            if is_new and not self._seen_in_memory(key, now):
+                result[position] = True
+                CustomMetricsPrometheus.Dedup_consultas.labels("miss").inc()
+            else:
+                CustomMetricsPrometheus.Dedup_consultas.labels("hit").inc()
+            self._remember(key, now)
+        return result
+
+
+    def _forget_persistent(self, keys: List[str]):
+        with self._lock:
+            connection = self._connect()
+            connection.executemany("DELETE FROM seen WHERE key = ?", [(key,) for key in keys])
+            connection.commit()
+
+    async def forget(self, keys: List[str]):
+        """
+        Desmarca claves marcadas por `filter_new`. Se usa cuando el evento falló y se respondió con error: Meta lo
+        reenviará y el reenvío debe procesarse en lugar de descartarse como duplicado.
+        """
+        for key in keys:
+            self._entries.pop(key, None)
+        if keys and self.persistent:
+            await asyncio.to_thread(self._forget_persistent, keys)
+
+
+# Instancia compartida por toda la aplicación.
+dedup_cache = DedupCache()
@@ -0,0 +1,61 @@
+import time
+from typing import Optional
+
+import httpx
+
+from custom_metrics import CustomMetricsPrometheus
+
+
+class DependencyCall:
+    """
+    Context manager que mide una llamada a un servicio externo (Graph API, Mailjet, Twitter, suscriptores).
+
+    Mientras la llamada está en curso incrementa Dependencia_llamadas_en_curso; al terminar registra la latencia en
+    Dependencia_latencia_segundos con el resultado ("success" o "error") y, si se conoce, el tamaño de la respuesta en
+    Dependencia_respuesta_bytes. Funciona tanto en código síncrono como dentro de corrutinas.
+
+    Métodos:
+        - record_response: Registra el tamaño de una respuesta httpx y la marca como error si el estado es >= 400.
+    """
+
+    def __init__(self, dependency: str, operation: str):
+        self.dependency = dependency
+        self.operation = operation
+        self.response_size: Optional[int] = None
+        self.failed = False
+        self._start = 0.0
+
+    def record_response(self, response: httpx.Response):
+        try:
+            self.response_size = len(response.content)
+        except httpx.ResponseNotRead:
+            # Respuesta en streaming aún no leída: se usa el tamaño declarado, si lo hay.
+            content_length = response.headers.get("Content-Length")
+            self.response_size = int(content_length) if content_length and content_length.isdigit() else None
+        self.failed = response.status_code >= 400
+
+    def __enter__(self) -> "DependencyCall":
+        CustomMetricsPrometheus.Dependencia_llamadas_en_curso.labels(self.dependency, self.operation).inc()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self._start
+        CustomMetricsPrometheus.Dependencia_llamadas_en_curso.labels(self.dependency, self.operation).dec()
+        result = "error" if exc_type is not None or self.failed else "success"
+        CustomMetricsPrometheus.Dependencia_latencia_segundos.labels(self.dependency, self.operation, result).observe(elapsed)
+        if self.response_size is not None:
+            CustomMetricsPrometheus.Dependencia_respuesta_bytes.labels(self.dependency, self.operation).observe(self.response_size)
+        return False
+
+
+def track_dependency(dependency: str, operation: str) -> DependencyCall:
+    """
+    Retorna un context manager que mide la llamada `operation` al servicio externo `dependency`.
+
+    Ejemplo:
+        with track_dependency("graph_api", "send_message") as call:
+            response = await client.post(...)
+            call.record_response(response)
+    """
+    return DependencyCall(dependency, operation)
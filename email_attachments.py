@@ -0,0 +1,157 @@
+import base64
+import json
+import mimetypes
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiofiles
+from fastapi import UploadFile
+
+from config import Config
+from media_store import media_store
+
+# Tamaño de lectura: múltiplo de 3 para que cada bloque se codifique en base64 sin relleno intermedio.
+READ_CHUNK_SIZE = 3 * 16 * 1024
+
+
+class AttachmentNotFound(LookupError):
+    """El medio referenciado como adjunto no existe en el almacén de medios."""
+
+
+@dataclass
+class FileAttachment:
+    """
+    Adjunto cuyo contenido se lee por bloques al enviar el correo, en lugar de cargarse completo en memoria.
+
+    Atributos:
+        filename (str): Nombre del archivo en el correo.
+        content_type (str): Tipo MIME del archivo.
+        size (int): Tamaño del contenido en bytes, necesario para calcular el Content-Length de la solicitud.
+        open_chunks (Callable): Retorna un iterador asíncrono con el contenido del archivo.
+    """
+    filename: str
+    content_type: str
+    size: int
+    open_chunks: Callable[[], AsyncIterator[bytes]]
+
+
+def base64_length(size: int) -> int:
+    return 4 * ((size + 2) // 3)
+
+
+async def encode_base64(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Codifica en base64 un contenido recibido por bloques, conservando el resto de cada bloque que no completa un
+    grupo de 3 bytes para el siguiente.
+    """
+    remainder = b""
+    async for chunk in chunks:
+        data = remainder + chunk
+        cut = len(data) - len(data) % 3
+        remainder = data[cut:]
+        if cut:
+            yield base64.b64encode(data[:cut])
+    if remainder:
+        yield base64.b64encode(remainder)
+
+
+def file_attachment(path: str, filename: Optional[str] = None, content_type: Optional[str] = None) -> FileAttachment:
+    """
+    Crea un adjunto que lee el archivo `path` del disco por bloques.
+    """
+    async def open_chunks() -> AsyncIterator[bytes]:
+        async with aiofiles.open(path, 'rb') as file:
+            while chunk := await file.read(READ_CHUNK_SIZE):
+                yield chunk
+
+    filename = filename or os.path.basename(path)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return FileAttachment(filename, content_type, os.path.getsize(path), open_chunks)
+
+
+def upload_attachment(upload: UploadFile) -> FileAttachment:
+    """
+    Crea un adjunto a partir de un archivo recibido en una solicitud multipart. Starlette ya lo guardó en un archivo
+    temporal (en disco si supera 1 MB), que aquí se relee por bloques.
+    """
+    async def open_chunks() -> AsyncIterator[bytes]:
+        await upload.seek(0)
+        while chunk := await upload.read(READ_CHUNK_SIZE):
+            yield chunk
+
+    upload.file.seek(0, os.SEEK_END)
+    size = upload.file.tell()
+    filename = upload.filename or "attachment"
+    content_type = upload.content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return FileAttachment(filename, content_type, size, open_chunks)
+
+
+async def resolve_media_attachment(media_id: Optional[str] = None, sha256: Optional[str] = None,
+                                   filename: Optional[str] = None, content_type: Optional[str] = None) -> FileAttachment:
+    """
+    Crea un adjunto a partir de un medio ya almacenado en Config.MEDIA_DIR, buscándolo por media_id o por hash.
+
+    Raises:
+        AttachmentNotFound: Si el medio no está en el índice o el archivo ya no existe.
+    """
+    path = await media_store.lookup(media_id=media_id, sha256=sha256)
+    if path is None or not os.path.realpath(path).startswith(os.path.realpath(Config.MEDIA_DIR) + os.sep):
+        raise AttachmentNotFound(f"No se encontró el medio {media_id or sha256}")
+    return file_attachment(path, filename, content_type)
+
+
+class StreamingJSONPayload:
+    """
+    Payload JSON en el que el contenido base64 de los adjuntos se genera mientras se envía la solicitud.
+
+    `attachment_entry` retorna la entrada de adjunto de Mailjet con un marcador en `Base64Content`. Al serializar el
+    payload, el JSON se corta en cada marcador y el contenido de cada archivo se codifica por bloques entre los
+    fragmentos, de modo que un adjunto de 10 MB nunca está completo en memoria ni se copia varias veces. Como el
+    tamaño en base64 se conoce de antemano, la solicitud se envía con Content-Length.
+
+    Métodos:
+        - attachment_entry: Registra un adjunto y retorna su entrada para la lista "Attachments" del mensaje.
+        - encode: Serializa el payload y retorna su tamaño total y un iterador asíncrono con sus bytes.
+    """
+
+    def __init__(self):
+        self._marker = uuid.uuid4().hex
+        self._attachments: Dict[str, FileAttachment] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._attachments)
+
+    def attachment_entry(self, attachment: FileAttachment) -> dict:
+        key = f"{self._marker}:{len(self._attachments)}"
+        self._attachments[key] = attachment
+        return {"ContentType": attachment.content_type, "Filename": attachment.filename, "Base64Content": key}
+
+    def encode(self, payload: dict) -> Tuple[int, AsyncIterator[bytes]]:
+        serialized = json.dumps(payload, separators=(",", ":")).encode()
+        # Fragmentos del JSON alternados con las claves de los adjuntos: [json, clave, json, clave, ..., json]
+        pieces = re.split(b"(" + re.escape(self._marker.encode()) + rb":\d+)", serialized)
+        length = sum(
+            base64_length(self._attachments[piece.decode()].size) if index % 2 else len(piece)
+            for index, piece in enumerate(pieces)
+        )
+
+        async def content() -> AsyncIterator[bytes]:
+            for index, piece in enumerate(pieces):
+                if index % 2:
+                    async for encoded in encode_base64(self._attachments[piece.decode()].open_chunks()):
+                        yield encoded
+                else:
+                    yield piece
+
+        return length, content()
+
+
+def attach_files(message: dict, attachments: List[FileAttachment], payload: StreamingJSONPayload):
+    """
+    Agrega a un mensaje de Mailjet los adjuntos que se enviarán en streaming a través de `payload`.
+    """
+    if attachments:
+        message.setdefault("Attachments", []).extend(payload.attachment_entry(attachment) for attachment in attachments)
@@ -0,0 +1,55 @@
+"""
+Configuración de gunicorn para ejecutar la API con varios workers de uvicorn.
+
+Uso:
+    gunicorn -c gunicorn.conf.py main:app
+
+Cada worker es un proceso independiente, así que las métricas de Prometheus se escriben en archivos dentro de
+PROMETHEUS_MULTIPROC_DIR y el endpoint /metrics (Instrumentator) las agrega con MultiProcessCollector, sin importar
+qué worker atienda el scrape. Los archivos de un run anterior se eliminan al iniciar y los de workers muertos se
+marcan con `mark_process_dead` para que sus gauges "live*" dejen de sumarse.
+
+El estado en memoria de cada worker no se comparte, así que la cantidad de workers se exporta en API_WORKERS: el
+limitador de tasa de WhatsApp usa 1/N de la tasa configurada en cada worker, la deduplicación usa siempre la capa
+SQLite compartida y los logs se escriben solo en stdout (que gunicorn recoge) en lugar de rotar un mismo archivo
+desde varios procesos.
+"""
+import glob
+import os
+
+# Debe definirse antes de que los workers importen prometheus_client (los workers se crean después de leer este archivo).
+multiproc_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def default_workers() -> int:
+    # Respeta la afinidad de CPU del proceso (por ejemplo, en contenedores con cpuset) cuando está disponible.
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+worker_class = "uvicorn.workers.UvicornWorker"
+# Los workers son asíncronos: uno por núcleo basta para usar toda la CPU.
+workers = int(os.getenv("WEB_CONCURRENCY", str(default_workers())))
+# Los workers heredan esta variable: Config.API_WORKERS reparte entre ellos los límites que de otro modo serían por
+# proceso (tasa de envío por PHONE_NUMBER_ID), activa la deduplicación compartida y evita que todos roten el mismo
+# archivo de log.
+os.environ["API_WORKERS"] = str(workers)
+# Tiempo para que cada worker drene la cola del webhook y el outbox en el lifespan antes de ser terminado.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+
+def on_starting(server):
+    os.makedirs(multiproc_dir, exist_ok=True)
+    # Solo se eliminan los archivos de métricas; el directorio podría estar compartido.
+    for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,251 @@
+import asyncio
+import ipaddress
+import socket
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpcore
+import httpx
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus, set_gauge_function
+from logger import logger
+
+
+def parse_host_timeouts(raw: str) -> Dict[str, float]:
+    """
+    Convierte la variable de entorno HTTP_HOST_TIMEOUTS ("host=segundos,host=segundos") en un diccionario.
+
+    Args:
+        raw (str): Cadena con pares host=segundos separados por comas.
+
+    Returns:
+        Dict[str, float]: Timeout en segundos para cada host configurado.
+    """
+    timeouts = {}
+    for item in raw.split(','):
+        if '=' not in item:
+            continue
+        host, seconds = item.split('=', 1)
+        try:
+            timeouts[host.strip().lower()] = float(seconds)
+        except ValueError:
+            logger.warning(f"Timeout inválido para el host '{host.strip()}': {seconds}")
+    return timeouts
+
+
+async def resolve_public_addresses(host: str, port: int) -> List[str]:
+    """
+    Resuelve un host y verifica que todas sus direcciones sean públicas.
+
+    Args:
+        host (str): El nombre del host o una dirección IP.
+        port (int): El puerto de destino.
+
+    Returns:
+        List[str]: Las direcciones resueltas, en el orden de getaddrinfo.
+
+    Raises:
+        ValueError: Si el host no se puede resolver o alguna dirección es privada, de loopback, link-local o reservada.
+    """
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError(f"No se pudo resolver {host}")
+    resolved = []
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"{host} resuelve a una dirección no pública ({address})")
+        if str(address) not in resolved:
+            resolved.append(str(address))
+    return resolved
+
+
+class PublicAddressBackend(httpcore.AsyncNetworkBackend):
+    """
+    Backend de red de httpcore que solo abre conexiones hacia direcciones públicas.
+
+    El host se resuelve y se valida en cada conexión nueva, y la conexión se abre contra la dirección ya validada sin
+    volver a resolver el nombre: un host que cambia su registro DNS después de la validación (DNS rebinding) no
+    alcanza la red interna. El nombre original se sigue usando en el encabezado Host y en el SNI de TLS.
+
+    Con Config.SUBSCRIBER_ALLOW_PRIVATE_URLS activo (solo para desarrollo) las conexiones no se validan.
+    """
+
+    def __init__(self, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self._backend = backend or httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None, local_address: Optional[str] = None,
+                          socket_options=None) -> httpcore.AsyncNetworkStream:
+        if Config.SUBSCRIBER_ALLOW_PRIVATE_URLS:
+            return await self._backend.connect_tcp(host, port, timeout, local_address, socket_options)
+        try:
+            addresses = await asyncio.wait_for(resolve_public_addresses(host, port), timeout)
+        except asyncio.TimeoutError:
+            raise httpcore.ConnectTimeout(f"Tiempo agotado al resolver {host}")
+        except ValueError as e:
+            raise httpcore.ConnectError(str(e))
+        error = httpcore.ConnectError(f"{host} no tiene direcciones")
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except httpcore.ConnectError as e:
+                error = e
+        raise error
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None):
+        raise httpcore.ConnectError("Las conexiones por socket Unix no están permitidas")
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class HTTPClientManager:
+    """
+    Administra un único `httpx.AsyncClient` durante toda la vida de la aplicación.
+
+    Reutilizar el mismo cliente permite mantener un pool de conexiones abiertas (keep-alive) hacia Graph API,
+    los servidores de medios y los suscriptores, evitando pagar una resolución DNS y un handshake TCP/TLS nuevo
+    en cada solicitud saliente. El cliente se abre y se cierra a través del lifespan de FastAPI (ver main.py).
+
+    Las notificaciones a suscriptores usan un cliente aparte (`subscriber_client`): sus URLs las registra un tercero,
+    así que cada conexión valida la dirección resuelta con `PublicAddressBackend` y no se usan proxies del entorno.
+
+    Métodos:
+        - start: Crea el cliente con los límites del pool configurados en `Config`.
+        - close: Cierra el cliente y libera todas las conexiones del pool.
+        - request: Realiza una solicitud HTTP aplicando el timeout configurado para el host de destino.
+        - stream: Igual que request, pero retorna un context manager para leer la respuesta por bloques.
+        - pool_stats: Retorna la cantidad de conexiones activas, ociosas y solicitudes en espera.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._subscriber_client: Optional[httpx.AsyncClient] = None
+        self._host_timeouts = parse_host_timeouts(Config.HTTP_HOST_TIMEOUTS)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Retorna el cliente compartido. Si aún no fue iniciado (por ejemplo, fuera del lifespan), se crea en ese momento.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    @property
+    def subscriber_client(self) -> httpx.AsyncClient:
+        """
+        Retorna el cliente para notificar a suscriptores, que solo se conecta a direcciones públicas.
+        """
+        if self._subscriber_client is None or self._subscriber_client.is_closed:
+            self._subscriber_client = self._build_subscriber_client()
+        return self._subscriber_client
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=Config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+        )
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(Config.HTTP_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT)
+
+    def _build_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(limits=self._limits(), timeout=self._timeout(), http2=Config.HTTP2)
+
+    def _build_subscriber_client(self) -> httpx.AsyncClient:
+        transport = httpx.AsyncHTTPTransport(limits=self._limits(), http2=Config.HTTP2, trust_env=False)
+        # httpx no expone el backend de red del pool de httpcore; se reemplaza tras crearlo.
+        transport._pool._network_backend = PublicAddressBackend()
+        return httpx.AsyncClient(transport=transport, timeout=self._timeout(), trust_env=False)
+
+    async def start(self):
+        """
+        Crea el cliente compartido y registra las estadísticas del pool en las métricas de Prometheus.
+        """
+        self._client = self._build_client()
+        for state in ("active", "idle", "waiting"):
+            set_gauge_function(
+                CustomMetricsPrometheus.Conexiones_pool_http.labels(state), lambda state=state: self.pool_stats()[state]
+            )
+        logger.info(
+            f"Cliente HTTP compartido iniciado (max_connections={Config.HTTP_MAX_CONNECTIONS}, "
+            f"keepalive={Config.HTTP_MAX_KEEPALIVE_CONNECTIONS}, http2={Config.HTTP2})"
+        )
+
+    async def close(self):
+        """
+        Cierra el cliente compartido y el de suscriptores, si existen.
+        """
+        if self._subscriber_client is not None:
+            await self._subscriber_client.aclose()
+            self._subscriber_client = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("Cliente HTTP compartido cerrado")
+
+    def timeout_for(self, url: str) -> Optional[float]:
+        """
+        Retorna el timeout configurado para el host de la URL, o None si se debe usar el timeout por defecto.
+        """
+        host = (urlsplit(url).hostname or '').lower()
+        return self._host_timeouts.get(host)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Realiza una solicitud HTTP usando el pool compartido.
+
+        Args:
+            method (str): El método HTTP a utilizar (por ejemplo, 'GET', 'POST').
+            url (str): La URL a la que se hace la solicitud.
+            **kwargs: Argumentos adicionales para `httpx.AsyncClient.request`, como 'headers', 'json', etc.
+
+        Returns:
+            httpx.Response: La respuesta de la solicitud.
+        """
+        self._apply_host_timeout(url, kwargs)
+        return await self.client.request(method, url, **kwargs)
+
+    def stream(self, method: str, url: str, **kwargs):
+        """
+        Abre una solicitud en modo streaming usando el pool compartido, para leer la respuesta sin cargarla en memoria.
+
+        Returns:
+            Un context manager asíncrono que entrega un `httpx.Response` cuyo cuerpo aún no ha sido leído.
+        """
+        self._apply_host_timeout(url, kwargs)
+        return self.client.stream(method, url, **kwargs)
+
+    def _apply_host_timeout(self, url: str, kwargs: dict):
+        if 'timeout' not in kwargs:
+            host_timeout = self.timeout_for(url)
+            if host_timeout is not None:
+                kwargs['timeout'] = host_timeout
+
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Calcula el estado del pool de conexiones subyacente de httpcore.
+
+        Returns:
+            Dict[str, int]: Conexiones activas ('active'), ociosas ('idle') y solicitudes esperando una conexión ('waiting').
+        """
+        stats = {"active": 0, "idle": 0, "waiting": 0}
+        if self._client is None:
+            return stats
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        if pool is None:
+            return stats
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        stats["idle"] = idle
+        stats["active"] = len(connections) - idle
+        stats["waiting"] = sum(1 for pending in list(getattr(pool, "_requests", [])) if getattr(pending, "connection", None) is None)
+        return stats
+
+
+# Instancia compartida por toda la aplicación.
+http_client_manager = HTTPClientManager()
@@ -1,18 +1,97 @@
+import atexit
 import logging  # Impopip instarta el módulo logging para configurar el registro de logs
+import logging.handlers
+import queue
+import random
 import sys
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import orjson
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus
+
+# Atributos estándar de un LogRecord; el resto proviene del parámetro `extra` y se incluye en la salida JSON.
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formatea cada registro como una línea JSON con la hora, el nivel, el logger, el mensaje y los campos `extra`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que descarta el registro si la cola está llena en lugar de bloquear o imprimir un error:
+    un disco lento nunca debe frenar el event loop.
+    """
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            CustomMetricsPrometheus.Logs_descartados.inc()
+
+
+def payload_sampled() -> bool:
+    """
+    Indica si se debe registrar un log de alto volumen (por ejemplo, el cuerpo completo de un webhook), según
+    Config.LOG_PAYLOAD_SAMPLE_RATE. Se consulta antes de formatear el mensaje para no pagar ese costo cuando se descarta.
+    """
+    rate = Config.LOG_PAYLOAD_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
 
 # Configura el sistema de logging para la aplicación
 logger = logging.getLogger()
-formatter = logging.Formatter(
-    fmt="%(asctime)s - %(levelname)s - %(message)s"
-    )
+if Config.LOG_FORMAT == "json":
+    formatter = JSONFormatter()
+else:
+    formatter = logging.Formatter(
+        fmt="%(asctime)s - %(levelname)s - %(message)s"
+        )
 
 stream_handler = logging.StreamHandler(sys.stdout)
-file_handler = logging.FileHandler("app.log")
+stream_handler.setFormatter(formatter)
 
 #Manejadores para los logs
-stream_handler.setFormatter(formatter)
-file_handler.setFormatter(formatter)
+handlers: List[logging.Handler] = [stream_handler]
+# RotatingFileHandler no es seguro entre procesos: con varios workers de gunicorn todos rotarían el mismo archivo,
+# así que en ese caso solo se escribe en stdout.
+if Config.LOG_FILE and Config.API_WORKERS == 1:
+    # Rotación por tamaño: el archivo de log no crece sin límite.
+    file_handler = logging.handlers.RotatingFileHandler(
+        Config.LOG_FILE, maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(formatter)
+    handlers.append(file_handler)
+
+listener: Optional[logging.handlers.QueueListener] = None
 
-logger.handlers = [stream_handler, file_handler]
-logger.setLevel(logging.INFO)
\ No newline at end of file
+if Config.LOG_ASYNC:
+    # Los registros se encolan en el hilo que llama y un hilo aparte los escribe en consola y disco.
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Al terminar el proceso se vacía la cola antes de salir.
+    atexit.register(listener.stop)
+    logger.handlers = [DroppingQueueHandler(log_queue)]
+else:
+    logger.handlers = handlers
+logger.setLevel(logging.INFO)
@@ -1,3 +1,6 @@
+import asyncio
+import functools
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI, Request
 # Asegúrate de ajustar el importe de router según la estructura de tu proyecto
 from routes import router as api_router  # Importa el router de la aplicación desde el módulo de rutas
@@ -5,18 +8,55 @@ from dotenv import load_dotenv  # Importa la función para cargar variables de e
 from prometheus_fastapi_instrumentator import Instrumentator
 import os  # Importa el módulo os para trabajar con variables de entorno y otras funcionalidades del sistema operativo
 from logger import logger
-from middleware import log_middleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from middleware import TimingMiddleware
+from http_client import http_client_manager
+from webhook_queue import webhook_worker_pool
+from routes import process_webhook_event, post_whatsapp_message, strategy_dispatcher
+from outbox import outbox
+from media_postprocess import media_postprocessor
+from conversation_sequencer import conversation_sequencer
+from twitter_client import twitter_client
+from config import Config
+from custom_metrics import MULTIPROCESS, refresh_gauge_functions_periodically
+from subscriptions import router as subscriptions_router, subscription_registry
 
 # Carga las variables de entorno desde el archivo .env
 # Esto es útil para mantener configuraciones sensibles o específicas del entorno fuera del código fuente
 load_dotenv()
 print("tes2t")
 print("tes3t")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Recursos compartidos durante toda la vida de la aplicación, como el pool de conexiones HTTP salientes.
+    await http_client_manager.start()
+    await subscription_registry.load()
+    # Los workers del webhook solo admiten cada evento (deduplicación y encadenamiento en el secuenciador de
+    # conversaciones); el procesamiento sigue en segundo plano y se mide con las métricas del secuenciador y de las
+    # estrategias.
+    await webhook_worker_pool.start(functools.partial(process_webhook_event, wait=False))
+    if Config.OUTBOX_ENABLED:
+        await outbox.start(post_whatsapp_message)
+    # Con varios workers, los gauges calculados se copian periódicamente a los archivos de métricas del proceso.
+    gauge_refresher = asyncio.create_task(refresh_gauge_functions_periodically(Config.METRICS_REFRESH_INTERVAL)) if MULTIPROCESS else None
+    yield
+    if gauge_refresher:
+        gauge_refresher.cancel()
+        with suppress(asyncio.CancelledError):
+            await gauge_refresher
+    await outbox.stop()
+    await webhook_worker_pool.stop()
+    # Las tareas por conversación esperan a las estrategias, así que se detienen antes que ellas.
+    await conversation_sequencer.stop()
+    await strategy_dispatcher.stop()
+    await media_postprocessor.stop()
+    await twitter_client.close()
+    await http_client_manager.close()
+
 # Crea una instancia de la aplicación FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-app.add_middleware(BaseHTTPMiddleware, dispatch = log_middleware)
+app.add_middleware(TimingMiddleware)
 logger.info(f"#################################Inicializando API...#################################")
 logger.info(f"#################################Inicializando API...#################################")
 logger.info(f"#################################Inicializando API...#################################")
@@ -26,5 +66,6 @@ logger.info(f"#################################Inicializando API...#############
 # Incluye el router de la API en la aplicación
 # Esto registra todas las rutas y operaciones definidas en el router con la aplicación FastAPI
 app.include_router(api_router)
+app.include_router(subscriptions_router)
 
 Instrumentator().instrument(app).expose(app)
\ No newline at end of file
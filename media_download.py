@@ -0,0 +1,143 @@
+import base64
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+import aiofiles
+
+from config import Config
+from http_client import http_client_manager
+
+
+class MediaDownloadError(Exception):
+    """
+    Error base para las descargas de medios en modo streaming.
+    """
+
+
+class MediaTooLargeError(MediaDownloadError):
+    """
+    El medio supera el tamaño máximo permitido (Config.MEDIA_MAX_BYTES).
+    """
+
+
+class MediaIntegrityError(MediaDownloadError):
+    """
+    El hash SHA-256 del contenido descargado no coincide con el recibido en el webhook.
+    """
+
+
+def sha256_matches(digest, expected: str) -> bool:
+    """
+    Compara un digest SHA-256 con el valor recibido en el webhook.
+
+    WhatsApp puede enviar el hash en hexadecimal o codificado en base64, por lo que se aceptan ambos formatos.
+
+    Args:
+        digest: Objeto hashlib con el contenido ya procesado.
+        expected (str): Hash esperado, en hexadecimal o base64.
+
+    Returns:
+        bool: True si el hash coincide en alguno de los formatos.
+    """
+    expected = expected.strip()
+    raw = digest.digest()
+    return expected.lower() == raw.hex() or expected in (
+        base64.b64encode(raw).decode(),
+        base64.urlsafe_b64encode(raw).decode(),
+    )
+
+
+async def write_verified(file_path: str, content: bytes, expected_sha256: Optional[str] = None) -> int:
+    """
+    Escribe un medio ya descargado en memoria a través de un archivo temporal que se renombra de forma atómica a
+    `file_path`, de modo que una descarga concurrente del mismo hash nunca deja un archivo a medio escribir.
+
+    Args:
+        file_path (str): Ruta final donde quedará el medio.
+        content (bytes): Contenido del medio.
+        expected_sha256 (Optional[str]): Hash esperado del contenido; si se omite no se verifica.
+
+    Returns:
+        int: Cantidad de bytes escritos.
+
+    Raises:
+        MediaIntegrityError: Si el hash no coincide; en ese caso no se escribe nada.
+    """
+    digest = hashlib.sha256(content)
+    if expected_sha256 and not sha256_matches(digest, expected_sha256):
+        raise MediaIntegrityError(f"SHA-256 no coincide: esperado {expected_sha256}, obtenido {digest.hexdigest()}")
+
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    os.close(fd)
+    try:
+        async with aiofiles.open(temp_path, 'wb') as file:
+            await file.write(content)
+        os.replace(temp_path, file_path)
+        return len(content)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+async def stream_download(media_url: str, file_path: str, headers: dict, expected_sha256: Optional[str] = None,
+                          max_bytes: Optional[int] = None) -> int:
+    """
+    Descarga un medio por bloques hacia un archivo temporal, calculando su SHA-256 a medida que llegan los datos.
+
+    El contenido nunca se mantiene completo en memoria: cada bloque de Config.MEDIA_CHUNK_SIZE bytes se escribe
+    en un archivo temporal dentro del mismo directorio de destino. Al terminar, si el hash coincide con el esperado,
+    el archivo temporal se renombra de forma atómica a `file_path`. Ante cualquier error el temporal se elimina.
+
+    Args:
+        media_url (str): La URL desde donde se descargará el medio.
+        file_path (str): Ruta final donde quedará el medio.
+        headers (dict): Encabezados de la solicitud, incluyendo la autorización.
+        expected_sha256 (Optional[str]): Hash esperado del contenido; si se omite no se verifica.
+        max_bytes (Optional[int]): Tamaño máximo permitido. Por defecto Config.MEDIA_MAX_BYTES.
+
+    Returns:
+        int: Cantidad de bytes escritos.
+
+    Raises:
+        MediaTooLargeError: Si el medio supera el tamaño máximo.
+        MediaIntegrityError: Si el hash no coincide.
+        httpx.HTTPError: Si la solicitud falla.
+    """
+    max_bytes = max_bytes or Config.MEDIA_MAX_BYTES
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    os.close(fd)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with http_client_manager.stream("GET", media_url, headers=headers) as response:
+            response.raise_for_status()
+            # Si el servidor informa el tamaño, se rechaza el medio antes de descargar el primer byte.
+            declared_size = int(response.headers.get('Content-Length') or 0)
+            if declared_size > max_bytes:
+                raise MediaTooLargeError(f"El medio declara {declared_size} bytes (máximo {max_bytes})")
+
+            async with aiofiles.open(temp_path, 'wb') as file:
+                async for chunk in response.aiter_bytes(Config.MEDIA_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise MediaTooLargeError(f"El medio supera el máximo de {max_bytes} bytes")
+                    digest.update(chunk)
+                    await file.write(chunk)
+
+        if expected_sha256 and not sha256_matches(digest, expected_sha256):
+            raise MediaIntegrityError(f"SHA-256 no coincide: esperado {expected_sha256}, obtenido {digest.hexdigest()}")
+
+        os.replace(temp_path, file_path)
+        return size
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
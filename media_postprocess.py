@@ -0,0 +1,128 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus, set_gauge_function
+from logger import logger
+from media_stages import DEFAULT_STAGES, Stage, metadata_path, run_stages
+
+
+class MediaPostProcessor:
+    """
+    Post-procesamiento de los medios ya guardados (miniaturas, duración de audios, metadatos de videos) en un pool
+    de procesos, fuera del event loop y del threadpool por defecto.
+
+    Los medios se encolan en una cola acotada (Config.MEDIA_POSTPROCESS_QUEUE_SIZE) que consume un feeder por
+    proceso del pool, de modo que el pool nunca tiene más trabajos pendientes que procesos. Si la cola está llena el
+    medio no se post-procesa (se registra en Postproceso_descartados) en lugar de retrasar el webhook. Las etapas de
+    cada tipo de medio están en `stages` (por defecto `media_stages.DEFAULT_STAGES`) y sus resultados se guardan en
+    `<medio>.meta.json`, junto al medio.
+
+    Métodos:
+        - register_stage: Agrega una etapa para un tipo de medio.
+        - submit: Encola un medio sin bloquear; retorna False si no se encoló.
+        - stop: Espera a que la cola se vacíe (con un timeout) y cierra el pool de procesos.
+    """
+
+    def __init__(self, workers: int = Config.MEDIA_POSTPROCESS_WORKERS, queue_size: int = Config.MEDIA_POSTPROCESS_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.stages: Dict[str, List[Stage]] = {media_type: list(stages) for media_type, stages in DEFAULT_STAGES.items()}
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._gauges_registered = False
+
+    def register_stage(self, media_type: str, name: str, stage: Callable[[str], dict]):
+        """
+        Agrega una etapa para un tipo de medio. `stage` debe ser una función de nivel de módulo (se envía al proceso
+        hijo por referencia) que recibe la ruta del medio y retorna un diccionario serializable en JSON.
+        """
+        self.stages.setdefault(media_type, []).append((name, stage))
+
+    def submit(self, path: str, media_type: str) -> bool:
+        """
+        Encola un medio guardado para post-procesarlo.
+
+        Returns:
+            bool: True si fue encolado; False si está deshabilitado, no hay etapas para su tipo, ya fue procesado
+                  (por ejemplo, un medio deduplicado) o la cola está llena.
+        """
+        stages = self.stages.get(media_type)
+        if not Config.MEDIA_POSTPROCESS_ENABLED or not stages or os.path.exists(metadata_path(path)):
+            return False
+        if not self._tasks:
+            self._start()
+        try:
+            self._queue.put_nowait((time.perf_counter(), path, media_type, stages))
+            return True
+        except asyncio.QueueFull:
+            CustomMetricsPrometheus.Postproceso_descartados.inc()
+            logger.warning(f"Cola de post-procesamiento llena; se omite {path}")
+            return False
+
+    def _start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = self._create_executor()
+        self._tasks = [asyncio.create_task(self._feeder()) for _ in range(self.workers)]
+        if not self._gauges_registered:
+            set_gauge_function(CustomMetricsPrometheus.Postproceso_cola_profundidad, lambda: self._queue.qsize() if self._queue else 0)
+            self._gauges_registered = True
+        logger.info(f"Post-procesamiento de medios iniciado (workers={self.workers}, queue_size={self.queue_size})")
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # "spawn": los procesos hijos no heredan los hilos ni el event loop del worker (fork los copiaría a medias).
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def stop(self, timeout: float = Config.WEBHOOK_DRAIN_TIMEOUT):
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Se detiene el post-procesamiento con {self._queue.qsize()} medios pendientes")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self._executor.shutdown, wait=True, cancel_futures=True)
+        self._executor = None
+        logger.info("Post-procesamiento de medios detenido")
+
+    async def _feeder(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            enqueued_at, path, media_type, stages = await self._queue.get()
+            CustomMetricsPrometheus.Postproceso_cola_espera_segundos.observe(time.perf_counter() - enqueued_at)
+            executor = self._executor
+            try:
+                outcome = await loop.run_in_executor(executor, run_stages, path, stages)
+            except BrokenProcessPool as e:
+                # Un proceso hijo murió (por ejemplo, por falta de memoria con un archivo malformado) y el pool ya no
+                # acepta trabajos: se reemplaza (una sola vez, aunque varios feeders lo detecten) para no perder los
+                # medios siguientes.
+                logger.error(f"Error al post-procesar {path}: {e}")
+                if self._executor is executor:
+                    logger.warning("Se reinicia el pool de procesos de post-procesamiento")
+                    self._executor = self._create_executor()
+                    executor.shutdown(wait=False)
+            except Exception as e:
+                logger.error(f"Error al post-procesar {path}: {e}")
+            else:
+                for stage, seconds in outcome["timings"].items():
+                    result = "error" if stage in outcome["errors"] else "success"
+                    CustomMetricsPrometheus.Postproceso_etapa_segundos.labels(media_type, stage, result).observe(seconds)
+                for stage, error in outcome["errors"].items():
+                    logger.warning(f"La etapa '{stage}' falló para {path}: {error}")
+                logger.info(f"Medio post-procesado: {outcome['metadata_path']}")
+            finally:
+                self._queue.task_done()
+
+
+# Instancia compartida por toda la aplicación.
+media_postprocessor = MediaPostProcessor()
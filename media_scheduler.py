@@ -0,0 +1,152 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus, set_gauge_function
+
+KB = 1024
+MB = 1024 * KB
+
+# Tamaño esperado de un medio según su tipo, usado antes de conocer el Content-Length. WhatsApp comprime las imágenes
+# y las notas de voz, mientras que los videos y documentos pueden pesar decenas de megabytes.
+EXPECTED_SIZES: Dict[str, int] = {
+    "audio": 200 * KB,
+    "image": 300 * KB,
+    "sticker": 100 * KB,
+    "document": 2 * MB,
+    "video": 16 * MB,
+}
+
+# Ajustes por subtipo MIME cuando difiere mucho del valor del tipo (por ejemplo, música frente a notas de voz).
+MIME_EXPECTED_SIZES: Dict[Tuple[str, str], int] = {
+    ("audio", "mpeg"): 4 * MB,
+    ("audio", "mp4"): 4 * MB,
+    ("image", "gif"): 2 * MB,
+    ("video", "3gpp"): 4 * MB,
+    ("document", "pdf"): 1 * MB,
+    ("document", "zip"): 20 * MB,
+}
+
+DEFAULT_EXPECTED_SIZE = 1 * MB
+
+# Menor valor, mayor prioridad: las notas de voz e imágenes son las que el usuario espera ver de inmediato.
+PRIORITIES: Dict[str, int] = {"audio": 0, "image": 1, "sticker": 1, "document": 2, "video": 3}
+
+
+def expected_size(media_type: str, mime_type: Optional[str]) -> int:
+    """
+    Estima el tamaño de un medio a partir de su tipo y de su tipo MIME ("audio/ogg; codecs=opus" u "ogg").
+    """
+    subtype = (mime_type or "").split(";")[0].strip().split("/")[-1].lower()
+    return MIME_EXPECTED_SIZES.get((media_type, subtype), EXPECTED_SIZES.get(media_type, DEFAULT_EXPECTED_SIZE))
+
+
+class _Waiter:
+    __slots__ = ("size", "future")
+
+    def __init__(self, size: int, future: asyncio.Future):
+        self.size = size
+        self.future = future
+
+
+class DownloadScheduler:
+    """
+    Planificador de descargas de medios por prioridad y tamaño esperado.
+
+    Cada descarga se clasifica como "small" o "large" según su tamaño esperado (Config.MEDIA_LARGE_THRESHOLD) y
+    espera un cupo de su clase: las descargas grandes tienen un límite de concurrencia propio
+    (Config.MEDIA_LARGE_DOWNLOADS), así que un video de 60 MB nunca ocupa los cupos de las imágenes y notas de voz
+    (Config.MEDIA_SMALL_DOWNLOADS). Además, la suma de los tamaños esperados de las descargas en curso no supera
+    Config.MEDIA_INFLIGHT_BYTES (una descarga mayor que el límite se admite solo cuando no hay otras en curso).
+
+    Dentro de cada clase los cupos se asignan por prioridad del tipo de medio (PRIORITIES), luego por tamaño esperado
+    y luego por orden de llegada.
+
+    Métodos:
+        - slot: Context manager asíncrono que espera un cupo para descargar un medio y lo libera al salir.
+    """
+
+    def __init__(self, small_limit: int = Config.MEDIA_SMALL_DOWNLOADS, large_limit: int = Config.MEDIA_LARGE_DOWNLOADS,
+                 max_inflight_bytes: int = Config.MEDIA_INFLIGHT_BYTES, large_threshold: int = Config.MEDIA_LARGE_THRESHOLD):
+        self.limits = {"small": max(1, small_limit), "large": max(1, large_limit)}
+        self.max_inflight_bytes = max_inflight_bytes
+        self.large_threshold = large_threshold
+        self._waiting: Dict[str, List[Tuple[int, int, int, _Waiter]]] = {"small": [], "large": []}
+        self._active = {"small": 0, "large": 0}
+        self._inflight_bytes = 0
+        self._sequence = itertools.count()
+        for size_class in self.limits:
+            set_gauge_function(CustomMetricsPrometheus.Descargas_en_curso.labels(size_class),
+                               lambda size_class=size_class: self._active[size_class])
+            set_gauge_function(CustomMetricsPrometheus.Descargas_en_espera.labels(size_class),
+                               lambda size_class=size_class: len(self._waiting[size_class]))
+        set_gauge_function(CustomMetricsPrometheus.Descargas_bytes_en_curso, lambda: self._inflight_bytes)
+
+    def size_class(self, size: int) -> str:
+        return "large" if size >= self.large_threshold else "small"
+
+    @asynccontextmanager
+    async def slot(self, media_type: str, mime_type: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Espera un cupo para descargar un medio del tipo indicado y lo libera al salir del bloque.
+
+        Ejemplo:
+            async with download_scheduler.slot("video", "video/mp4"):
+                media_url = await get_media_url(media_id)
+                file_path = await save_media(media_url, ...)
+        """
+        size = expected_size(media_type, mime_type)
+        size_class = self.size_class(size)
+        waiter = _Waiter(size, asyncio.get_running_loop().create_future())
+        priority = PRIORITIES.get(media_type, len(PRIORITIES))
+        heapq.heappush(self._waiting[size_class], (priority, size, next(self._sequence), waiter))
+        started = time.perf_counter()
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # El cupo se asignó justo antes de la cancelación: se devuelve.
+                self._release(size_class, size)
+            else:
+                self._waiting[size_class] = [entry for entry in self._waiting[size_class] if entry[3] is not waiter]
+                heapq.heapify(self._waiting[size_class])
+            raise
+        CustomMetricsPrometheus.Descargas_espera_segundos.labels(size_class).observe(time.perf_counter() - started)
+        try:
+            yield size_class
+        finally:
+            self._release(size_class, size)
+
+    def _release(self, size_class: str, size: int):
+        self._active[size_class] -= 1
+        self._inflight_bytes -= size
+        self._dispatch()
+
+    def _fits(self, size: int) -> bool:
+        return self._inflight_bytes == 0 or self._inflight_bytes + size <= self.max_inflight_bytes
+
+    def _dispatch(self):
+        # Las clases se revisan por separado: una descarga grande sin cupo no bloquea a las pequeñas que esperan.
+        progressed = True
+        while progressed:
+            progressed = False
+            for size_class, waiting in self._waiting.items():
+                if not waiting or self._active[size_class] >= self.limits[size_class]:
+                    continue
+                waiter = waiting[0][3]
+                if not self._fits(waiter.size):
+                    continue
+                heapq.heappop(waiting)
+                self._active[size_class] += 1
+                self._inflight_bytes += waiter.size
+                waiter.future.set_result(None)
+                progressed = True
+
+
+# Instancia compartida por toda la aplicación.
+download_scheduler = DownloadScheduler()
@@ -0,0 +1,123 @@
+"""
+Etapas de post-procesamiento de medios (miniaturas, duración de audios, metadatos de videos).
+
+Se ejecutan en los procesos de `media_postprocessor` (media_postprocess.py). Por eso este módulo solo importa la
+biblioteca estándar y cada etapa importa la dependencia que necesita: un proceso hijo no carga la configuración, el
+logger ni las métricas de la aplicación.
+
+Una etapa es una función de nivel de módulo (para poder enviarse a otro proceso) que recibe la ruta del medio y
+retorna un diccionario serializable en JSON.
+"""
+import json
+import os
+import shutil
+import subprocess
+import time
+from typing import Callable, Dict, List, Tuple
+
+THUMBNAIL_SIZE = (320, 320)
+FFPROBE_TIMEOUT = 60
+
+Stage = Tuple[str, Callable[[str], dict]]
+
+
+def thumbnail_path(path: str) -> str:
+    return f"{os.path.splitext(path)[0]}.thumb.jpg"
+
+
+def metadata_path(path: str) -> str:
+    return f"{os.path.splitext(path)[0]}.meta.json"
+
+
+def image_thumbnail(path: str) -> dict:
+    """
+    Genera una miniatura JPEG de a lo sumo THUMBNAIL_SIZE junto a la imagen y retorna sus dimensiones originales.
+    """
+    from PIL import Image
+
+    with Image.open(path) as image:
+        width, height, image_format = image.width, image.height, image.format
+        image.thumbnail(THUMBNAIL_SIZE)
+        image.convert("RGB").save(thumbnail_path(path), "JPEG", quality=80)
+    return {"width": width, "height": height, "format": image_format, "thumbnail": os.path.basename(thumbnail_path(path))}
+
+
+def audio_metadata(path: str) -> dict:
+    """
+    Retorna la duración y los parámetros de codificación de un audio (incluye las notas de voz Ogg/Opus).
+    """
+    import mutagen
+
+    audio = mutagen.File(path)
+    if audio is None:
+        raise ValueError("Formato de audio no reconocido")
+    info = audio.info
+    return {
+        "duration": round(info.length, 3),
+        "bitrate": getattr(info, "bitrate", None),
+        "sample_rate": getattr(info, "sample_rate", None),
+        "channels": getattr(info, "channels", None),
+        "format": type(audio).__name__,
+    }
+
+
+def video_metadata(path: str) -> dict:
+    """
+    Retorna el contenedor, la duración y los streams de un video usando ffprobe.
+    """
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe is None:
+        raise FileNotFoundError("ffprobe no está instalado")
+    output = subprocess.run(
+        [ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        capture_output=True, check=True, timeout=FFPROBE_TIMEOUT,
+    ).stdout
+    probe = json.loads(output)
+    streams = probe.get("streams", [])
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), {})
+    audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), {})
+    container = probe.get("format", {})
+    return {
+        "container": container.get("format_name"),
+        "duration": float(container["duration"]) if "duration" in container else None,
+        "bitrate": int(container["bit_rate"]) if "bit_rate" in container else None,
+        "video_codec": video.get("codec_name"),
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "frame_rate": video.get("avg_frame_rate"),
+        "audio_codec": audio.get("codec_name"),
+    }
+
+
+# Etapas que se ejecutan por defecto para cada tipo de medio.
+DEFAULT_STAGES: Dict[str, List[Stage]] = {
+    "image": [("thumbnail", image_thumbnail)],
+    "audio": [("audio_metadata", audio_metadata)],
+    "video": [("video_metadata", video_metadata)],
+}
+
+
+def run_stages(path: str, stages: List[Stage]) -> dict:
+    """
+    Ejecuta las etapas sobre el medio y guarda sus resultados en `<medio>.meta.json`, junto al medio.
+
+    Un fallo en una etapa se registra en "errors" y no impide las siguientes.
+
+    Returns:
+        dict: Ruta del archivo de metadatos, segundos que tomó cada etapa y errores por etapa.
+    """
+    results, errors, timings = {}, {}, {}
+    for name, stage in stages:
+        start = time.perf_counter()
+        try:
+            results[name] = stage(path)
+        except Exception as e:
+            errors[name] = f"{type(e).__name__}: {e}"
+        timings[name] = time.perf_counter() - start
+
+    target = metadata_path(path)
+    temporary = f"{target}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump({"file": os.path.basename(path), "results": results, "errors": errors}, file)
+    os.replace(temporary, target)
+    return {"metadata_path": target, "timings": timings, "errors": errors}
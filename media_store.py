@@ -0,0 +1,160 @@
+import asyncio
+import base64
+import binascii
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import Config
+from logger import logger
+
+
+def normalize_sha256(sha256: Optional[str]) -> Optional[str]:
+    """
+    Normaliza el hash SHA-256 recibido en el webhook a hexadecimal en minúsculas.
+
+    WhatsApp puede enviar el hash en hexadecimal o en base64; ambos se convierten a la misma clave.
+
+    Args:
+        sha256 (Optional[str]): Hash en hexadecimal o base64.
+
+    Returns:
+        Optional[str]: El hash en hexadecimal, o None si el valor no es un SHA-256 válido.
+    """
+    if not sha256:
+        return None
+    value = sha256.strip()
+    if len(value) == 64:
+        try:
+            bytes.fromhex(value)
+            return value.lower()
+        except ValueError:
+            pass
+    try:
+        raw = base64.b64decode(value.replace('-', '+').replace('_', '/'), validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return raw.hex() if len(raw) == 32 else None
+
+
+class MediaStore:
+    """
+    Almacén de medios direccionado por contenido, con un índice en disco (SQLite) media_id -> sha256 -> ruta.
+
+    Los clientes reenvían las mismas imágenes y documentos una y otra vez. Cada reenvío llega con un media_id nuevo
+    pero con el mismo `Media.sha256`, por lo que los archivos se guardan como `./media/<tipo>/<sha256>.<extensión>`
+    y el índice permite saber, antes de consultar Graph API, si el contenido ya fue descargado.
+
+    El índice usa SQLite en modo WAL para poder compartirse entre varios workers de uvicorn. Las consultas se
+    ejecutan en un hilo (`asyncio.to_thread`) para no bloquear el event loop con el fsync de cada escritura.
+
+    Métodos:
+        - path_for: Genera la ruta direccionada por contenido para un hash.
+        - lookup: Busca un medio ya almacenado por media_id o por hash.
+        - register: Registra la relación media_id -> hash -> ruta.
+    """
+
+    def __init__(self, base_dir: str = Config.MEDIA_DIR, index_path: str = Config.MEDIA_INDEX_PATH):
+        self.base_dir = base_dir
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.index_path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, media_type TEXT, mime_type TEXT, created_at REAL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS media ("
+                "media_id TEXT PRIMARY KEY, sha256 TEXT NOT NULL, filename TEXT, created_at REAL)"
+            )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def path_for(self, media_type: str, sha256: str, extension: str) -> str:
+        """
+        Genera la ruta direccionada por contenido de un medio.
+
+        Args:
+            media_type (str): El tipo de medio (por ejemplo, 'image', 'video').
+            sha256 (str): Hash del contenido, en hexadecimal o base64.
+            extension (str): La extensión del archivo basada en su MIME type.
+
+        Returns:
+            str: Ruta del archivo dentro de `./media/<tipo>/`.
+        """
+        return os.path.join(self.base_dir, media_type, f"{normalize_sha256(sha256)}.{extension}")
+
+    def _lookup(self, media_id: Optional[str], sha256: Optional[str]) -> Optional[str]:
+        with self._lock:
+            connection = self._connect()
+            row = None
+            if sha256:
+                row = connection.execute("SELECT path FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is None and media_id:
+                row = connection.execute(
+                    "SELECT blobs.path FROM media JOIN blobs ON media.sha256 = blobs.sha256 WHERE media.media_id = ?",
+                    (media_id,),
+                ).fetchone()
+        if row and os.path.exists(row[0]):
+            return row[0]
+        return None
+
+    def _register(self, media_id: str, sha256: str, path: str, media_type: str, mime_type: Optional[str], filename: Optional[str]):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT INTO blobs (sha256, path, media_type, mime_type, created_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET path = excluded.path",
+                (sha256, path, media_type, mime_type, now),
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO media (media_id, sha256, filename, created_at) VALUES (?, ?, ?, ?)",
+                (media_id, sha256, filename, now),
+            )
+            connection.commit()
+
+    async def lookup(self, media_id: Optional[str] = None, sha256: Optional[str] = None) -> Optional[str]:
+        """
+        Busca un medio ya almacenado, primero por hash y luego por media_id.
+
+        Args:
+            media_id (Optional[str]): Identificador del medio en WhatsApp.
+            sha256 (Optional[str]): Hash del contenido, en hexadecimal o base64.
+
+        Returns:
+            Optional[str]: La ruta del archivo si existe en el índice y en disco; None en caso contrario.
+        """
+        return await asyncio.to_thread(self._lookup, media_id, normalize_sha256(sha256))
+
+    async def register(self, media_id: str, sha256: str, path: str, media_type: str,
+                       mime_type: Optional[str] = None, filename: Optional[str] = None):
+        """
+        Registra en el índice la relación media_id -> hash -> ruta.
+
+        Args:
+            media_id (str): Identificador del medio en WhatsApp.
+            sha256 (str): Hash del contenido, en hexadecimal o base64.
+            path (str): Ruta del archivo almacenado.
+            media_type (str): El tipo de medio.
+            mime_type (Optional[str]): Tipo MIME del medio.
+            filename (Optional[str]): Nombre de archivo original, si el mensaje lo incluye (documentos).
+        """
+        normalized = normalize_sha256(sha256)
+        if normalized is None:
+            logger.warning(f"Hash inválido para media_id {media_id}; no se registra en el índice")
+            return
+        await asyncio.to_thread(self._register, media_id, normalized, path, media_type, mime_type, filename)
+
+
+# Instancia compartida por toda la aplicación.
+media_store = MediaStore()
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus
+
+
+class SingleFlightTTLCache:
+    """
+    Caché con TTL que además agrupa las consultas concurrentes por la misma clave en una sola solicitud en vuelo.
+
+    La URL de descarga (lookaside) que retorna Graph API para un media_id sigue siendo válida varios minutos, pero los
+    reintentos de estado y los webhooks duplicados la piden muchas veces, a menudo al mismo tiempo. Con esta caché,
+    la primera consulta llama a Graph API y todas las que llegan mientras tanto esperan el mismo resultado; las
+    siguientes se responden desde memoria hasta que vence el TTL. Los resultados None (errores) no se guardan.
+
+    Métodos:
+        - get: Retorna el valor de la clave, cargándolo con `loader` si no está en caché.
+        - invalidate: Descarta el valor guardado de una clave, por ejemplo cuando la URL ya no sirve para descargar.
+    """
+
+    def __init__(self, ttl: float = Config.MEDIA_URL_CACHE_TTL, max_entries: int = Config.MEDIA_URL_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, key: str, loader: Callable[[str], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        Retorna el valor asociado a `key`.
+
+        Args:
+            key (str): La clave, por ejemplo el media_id.
+            loader (Callable): Corrutina que obtiene el valor cuando no está en caché.
+
+        Returns:
+            Optional[str]: El valor en caché o el obtenido por `loader`.
+        """
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    CustomMetricsPrometheus.Media_url_cache_consultas.labels("hit").inc()
+                    CustomMetricsPrometheus.Media_url_llamadas_ahorradas.inc()
+                    return value
+                del self._entries[key]
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                return await self._load(key, loader)
+            CustomMetricsPrometheus.Media_url_cache_consultas.labels("coalesced").inc()
+            # asyncio.wait no cancela la solicitud compartida si quien espera es cancelado.
+            await asyncio.wait([in_flight])
+            if not in_flight.cancelled():
+                CustomMetricsPrometheus.Media_url_llamadas_ahorradas.inc()
+                return in_flight.result()
+            # Quien hacía la solicitud fue cancelado: su cancelación no se propaga a los demás, que la reintentan.
+
+    def invalidate(self, key: str):
+        """
+        Descarta el valor en caché de `key`; la siguiente consulta vuelve a llamar a `loader`.
+
+        Args:
+            key (str): La clave a descartar.
+        """
+        self._entries.pop(key, None)
+
+    async def _load(self, key: str, loader: Callable[[str], Awaitable[Optional[str]]]) -> Optional[str]:
+        CustomMetricsPrometheus.Media_url_cache_consultas.labels("miss").inc()
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await loader(key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita el aviso de "excepción nunca recuperada" cuando no hay otros esperando.
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if value is not None:
+                self._store(key, value)
+            return value
+        finally:
+            del self._in_flight[key]
+
+    def _store(self, key: str, value: str):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Instancia compartida por toda la aplicación.
+media_url_cache = SingleFlightTTLCache()
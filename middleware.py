@@ -1,9 +1,16 @@
 from fastapi import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from custom_metrics import CustomMetricsPrometheus
 from logger import logger
 import time
 import routes
 
+
 async def log_middleware(request: Request, call_next):
+    """
+    Middleware anterior basado en BaseHTTPMiddleware. Se conserva como referencia para el benchmark
+    (benchmarks/bench_middleware.py); la aplicación usa TimingMiddleware.
+    """
     #Se crea un timer para poder logear cuánto tarda cada request que se le hace a la API en ser completado
     start = time.time()
     #Esperamos que la API reciba el response de el request que se haga
@@ -11,7 +18,7 @@ async def log_middleware(request: Request, call_next):
 
     #Restamos el tiempo que ha transcurrido para obtener cuánto ha pa pasado desde que se inició el request
     process_time = time.time() - start
-    
+
     #Formulamos un diccionario de datos para logs. Incluimos los parámetros que queremos que se vean en el log
     log_dict = {
         'url': request.url.path,
@@ -20,4 +27,53 @@ async def log_middleware(request: Request, call_next):
     }
     #Logueamos en base al diccionario. Añadimos el parametro "extra" = log_dict para que cada parámetro del diccionario también se trate como una variable individual
     logger.info(log_dict, extra=log_dict)
-    return response
\ No newline at end of file
+    return response
+
+
+class TimingMiddleware:
+    """
+    Middleware ASGI puro que mide la duración de cada solicitud HTTP con un reloj monotónico (perf_counter_ns).
+
+    A diferencia de BaseHTTPMiddleware no crea un task group ni vuelve a empaquetar el cuerpo de la respuesta, por lo
+    que no agrega latencia por solicitud ni interfiere con las respuestas en streaming. La duración se mide hasta que
+    se envía el último bloque de la respuesta y se registra en el histograma Http_latencia_segundos, etiquetado por la
+    plantilla de la ruta (por ejemplo "/outbox/{outbox_id}") en lugar del path real, para acotar la cardinalidad.
+    Además se mantiene la línea de log estructurada de log_middleware.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter_ns()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            process_time = (time.perf_counter_ns() - start) / 1e9
+            # El router de FastAPI deja la ruta resuelta en el scope; las solicitudes sin ruta comparten una etiqueta.
+            route = scope.get("route")
+            route_template = getattr(route, "path", None) or "unmatched"
+            CustomMetricsPrometheus.Http_latencia_segundos.labels(
+                scope["method"], route_template, str(status_code)
+            ).observe(process_time)
+
+            log_dict = {
+                'url': scope["path"],
+                'route': route_template,
+                'method': scope["method"],
+                'status_code': status_code,
+                'process_time': process_time
+            }
+            logger.info(log_dict, extra=log_dict)
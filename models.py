@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, model_validator
 from typing import List, Optional, Dict, Any
 
 # ****************************************
@@ -175,6 +175,23 @@ class SendMessageTemplateRequest(BaseModel):
     type: str = "template"
     template: Template
 
+class TemplateRecipient(BaseModel):
+    """
+    Destinatario de un envío masivo de template. `parameters` contiene una lista de parámetros por cada componente
+    del template, en el mismo orden; si se omite (o un elemento es null) se usan los parámetros del template.
+    """
+    to: str
+    parameters: Optional[List[Optional[List[Parameter]]]] = None
+
+class BulkTemplateMessageRequest(BaseModel):
+    """
+    Solicitud para enviar un mismo template a muchos destinatarios, cada uno con sus propios parámetros.
+    """
+    messaging_product: str = "whatsapp"
+    recipient_type: str = "individual"
+    template: Template
+    recipients: List[TemplateRecipient]
+
 # ****************************************
 # *                                      *
 # *                                      *
@@ -194,6 +211,22 @@ class EmailAttachment(BaseModel):
     Filename: str
     Base64Content: str
 
+class EmailMediaAttachment(BaseModel):
+    """
+    Adjunto que referencia un medio ya almacenado en ./media, por su media_id de WhatsApp o por su hash SHA-256.
+    El archivo se lee del disco y se codifica en base64 por bloques al enviar el correo.
+    """
+    media_id: Optional[str] = None
+    sha256: Optional[str] = None
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_reference(self):
+        if not self.media_id and not self.sha256:
+            raise ValueError("Se requiere media_id o sha256")
+        return self
+
 class EmailSchema(BaseModel):
     from_email: EmailStr
     from_name: str
@@ -204,6 +237,7 @@ class EmailSchema(BaseModel):
     text_part: str
     html_part: str
     attachments: Optional[List[EmailAttachment]] = []
+    media_attachments: Optional[List[EmailMediaAttachment]] = []
 
 # ****************************************
 # *                                      *
@@ -217,7 +251,9 @@ class EmailSchema(BaseModel):
 
 class WebhookRegistrationRequest(BaseModel):
     url: str
-    events: list[str]  # Lista de eventos a los que el cliente desea suscribirse
+    # Lista de eventos a los que el cliente desea suscribirse: "messages", "messages.<tipo>" (ej. "messages.image"),
+    # "statuses", "statuses.<estado>" (ej. "statuses.delivered") o "*" para todos. Una lista vacía equivale a "*".
+    events: list[str]
 
 
 # ****************************************
@@ -0,0 +1,306 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus
+from logger import logger
+from rate_limiter import RateLimitExceeded
+
+# Resultado de un envío: id, intentos, error (None si se envió), si es reintentable y, para un límite local, los
+# segundos hasta el próximo intento.
+SendResult = Tuple[int, int, Optional[str], bool, Optional[float]]
+
+
+class Outbox:
+    """
+    Bandeja de salida persistente (SQLite en modo WAL) para los mensajes salientes de WhatsApp.
+
+    `send_message` y `send_template_message` pueden escribir aquí el payload y responder "accepted" de inmediato,
+    de modo que una ráfaga de clientes no se traduzca en una ráfaga contra Meta y que un reinicio no pierda los
+    mensajes en curso. Un worker de envío drena la bandeja con concurrencia controlada y reintentos con backoff.
+
+    Las escrituras se agrupan: cada llamada a `enqueue` se acumula durante unos milisegundos
+    (Config.OUTBOX_BATCH_WINDOW) y se confirma junto con las demás en una sola transacción, lo que permite sostener
+    miles de envíos encolados por segundo en una sola instancia.
+
+    El worker reclama solo tantos mensajes como envíos libres tiene (Config.OUTBOX_CONCURRENCY) y registra cada
+    resultado apenas termina, de modo que un envío lento no retiene a los demás. Cada proceso marca sus reclamos con
+    su propio id y los renueva periódicamente: solo los reclamos de un worker caído (sin renovar durante
+    Config.OUTBOX_CLAIM_TIMEOUT) vuelven a enviarse desde otro proceso.
+
+    Métodos:
+        - start: Abre la base de datos e inicia el escritor por lotes y el worker de envío.
+        - stop: Confirma las escrituras pendientes y detiene los workers.
+        - enqueue: Persiste un payload y retorna su id en la bandeja.
+        - get: Retorna el estado de un mensaje de la bandeja.
+    """
+
+    def __init__(self, path: str = Config.OUTBOX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pending_writes: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sender: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None
+        self._tasks: List[asyncio.Task] = []
+        # Identifica los reclamos de este proceso frente a los de otros workers que comparten la base de datos.
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, claimed_at REAL, "
+                "last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(outbox)")}
+            if "claimed_by" not in columns:
+                connection.execute("ALTER TABLE outbox ADD COLUMN claimed_by TEXT")
+            connection.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, next_attempt_at)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    async def start(self, sender: Callable[[Dict[str, Any]], Awaitable[Any]]):
+        """
+        Inicia el escritor por lotes y el worker de envío.
+
+        Args:
+            sender (Callable): Corrutina que envía un payload a Graph API y lanza una excepción si falla.
+        """
+        self._sender = sender
+        self._pending_writes = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self._connect)
+        self._tasks = [asyncio.create_task(self._writer()), asyncio.create_task(self._send_loop())]
+        logger.info(f"Outbox iniciado en {self.path} (concurrency={Config.OUTBOX_CONCURRENCY})")
+
+    async def stop(self):
+        """
+        Espera a que las escrituras pendientes se confirmen y detiene los workers.
+        """
+        if not self._tasks:
+            return
+        await self._pending_writes.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Outbox detenido")
+
+    async def enqueue(self, payload: Union[Dict[str, Any], bytes]) -> int:
+        """
+        Persiste un payload en la bandeja. La llamada retorna cuando la transacción del lote fue confirmada.
+
+        Args:
+            payload (Union[Dict[str, Any], bytes]): El cuerpo JSON que se enviará a `/messages`, como diccionario o
+                                                    ya serializado.
+
+        Returns:
+            int: El id del mensaje en la bandeja.
+        """
+        serialized = payload.decode() if isinstance(payload, bytes) else json.dumps(payload)
+        future = asyncio.get_running_loop().create_future()
+        await self._pending_writes.put((serialized, future))
+        return await future
+
+    async def get(self, outbox_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Retorna el estado de un mensaje de la bandeja, o None si no existe.
+        """
+        row = await asyncio.to_thread(self._fetch, outbox_id)
+        if row is None:
+            return None
+        return {"id": row[0], "status": row[1], "attempts": row[2], "last_error": row[3]}
+
+    def _fetch(self, outbox_id: int) -> Optional[Tuple]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT id, status, attempts, last_error FROM outbox WHERE id = ?", (outbox_id,)
+            ).fetchone()
+
+    def _insert_batch(self, payloads: List[str]) -> List[int]:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            cursor = connection.cursor()
+            ids = []
+            for payload in payloads:
+                cursor.execute(
+                    "INSERT INTO outbox (payload, status, next_attempt_at, created_at, updated_at) "
+                    "VALUES (?, 'pending', ?, ?, ?)",
+                    (payload, now, now, now),
+                )
+                ids.append(cursor.lastrowid)
+            connection.commit()
+        return ids
+
+    async def _writer(self):
+        # Agrupa las escrituras que llegan dentro de la ventana configurada en una sola transacción.
+        while True:
+            batch = [await self._pending_writes.get()]
+            deadline = time.monotonic() + Config.OUTBOX_BATCH_WINDOW
+            while len(batch) < Config.OUTBOX_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._pending_writes.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                ids = await asyncio.to_thread(self._insert_batch, [payload for payload, _ in batch])
+                for (_, future), outbox_id in zip(batch, ids):
+                    if not future.done():
+                        future.set_result(outbox_id)
+                self._wakeup.set()
+            except Exception as e:
+                logger.error(f"Error al persistir un lote de {len(batch)} mensajes en el outbox: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._pending_writes.task_done()
+
+    def _claim(self, limit: int) -> List[Tuple[int, str, int]]:
+        # Reclama los mensajes listos para enviar. Los mensajes "sending" cuyo reclamo no se renovó (por ejemplo, por
+        # la caída de un worker) vuelven a ser elegibles.
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            rows = connection.execute(
+                "UPDATE outbox SET status = 'sending', claimed_at = ?, claimed_by = ?, updated_at = ? WHERE id IN ("
+                "SELECT id FROM outbox WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                "OR (status = 'sending' AND claimed_at < ?) ORDER BY id LIMIT ?) "
+                "RETURNING id, payload, attempts",
+                (now, self._owner, now, now, now - Config.OUTBOX_CLAIM_TIMEOUT, limit),
+            ).fetchall()
+            pending = connection.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+            connection.commit()
+        CustomMetricsPrometheus.Outbox_mensajes_pendientes.set(pending)
+        return rows
+
+    def _renew_claims(self, ids: List[int]):
+        # Mantiene vigentes los reclamos de los envíos en curso de este proceso para que otro worker no los reclame.
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "UPDATE outbox SET claimed_at = ? WHERE id = ? AND status = 'sending' AND claimed_by = ?",
+                [(now, outbox_id, self._owner) for outbox_id in ids],
+            )
+            connection.commit()
+
+    def _complete(self, results: List[SendResult]):
+        # Registra en una sola transacción los resultados de los envíos que terminaron. Solo se actualizan los
+        # mensajes que siguen reclamados por este proceso.
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            for outbox_id, attempts, error, retryable, retry_after in results:
+                if error is None:
+                    connection.execute(
+                        "UPDATE outbox SET status = 'sent', attempts = ?, last_error = NULL, updated_at = ? "
+                        "WHERE id = ? AND claimed_by = ?",
+                        (attempts, now, outbox_id, self._owner),
+                    )
+                elif retry_after is not None or (retryable and attempts < Config.OUTBOX_MAX_ATTEMPTS):
+                    if retry_after is not None:
+                        # Límite de tasa local: se reprograma sin consumir un intento.
+                        delay = retry_after
+                    else:
+                        delay = min(Config.OUTBOX_RETRY_BASE_DELAY * 2 ** (attempts - 1), 300) * random.uniform(0.5, 1.5)
+                    connection.execute(
+                        "UPDATE outbox SET status = 'pending', attempts = ?, last_error = ?, next_attempt_at = ?, "
+                        "updated_at = ? WHERE id = ? AND claimed_by = ?",
+                        (attempts, error, now + delay, now, outbox_id, self._owner),
+                    )
+                else:
+                    connection.execute(
+                        "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, updated_at = ? "
+                        "WHERE id = ? AND claimed_by = ?",
+                        (attempts, error, now, outbox_id, self._owner),
+                    )
+            connection.commit()
+
+    async def _send_one(self, outbox_id: int, payload: str, attempts: int) -> SendResult:
+        try:
+            await self._sender(json.loads(payload))
+            CustomMetricsPrometheus.Outbox_mensajes_procesados.labels("sent").inc()
+            return outbox_id, attempts + 1, None, False, None
+        except RateLimitExceeded as e:
+            # El limitador local no dio turno: el mensaje no llegó a enviarse.
+            CustomMetricsPrometheus.Outbox_mensajes_procesados.labels("retry").inc()
+            return outbox_id, attempts, str(e), True, e.retry_after
+        except httpx.HTTPStatusError as e:
+            code = e.response.status_code
+            # Los errores 4xx (salvo 429) no se corrigen reintentando.
+            retryable = code == 429 or code >= 500
+            CustomMetricsPrometheus.Outbox_mensajes_procesados.labels("retry" if retryable else "failed").inc()
+            return outbox_id, attempts + 1, f"HTTP {code}: {e.response.text[:500]}", retryable, None
+        except Exception as e:
+            CustomMetricsPrometheus.Outbox_mensajes_procesados.labels("retry").inc()
+            return outbox_id, attempts + 1, str(e) or type(e).__name__, True, None
+
+    async def _send_loop(self):
+        in_flight: Dict[asyncio.Task, int] = {}
+        renewed_at = time.monotonic()
+        try:
+            while True:
+                try:
+                    # Se limpia antes de reclamar para no perder un lote que llegue mientras se reclama.
+                    self._wakeup.clear()
+                    # Se reclaman solo los mensajes que caben en los envíos libres.
+                    free = Config.OUTBOX_CONCURRENCY - len(in_flight)
+                    rows = await asyncio.to_thread(self._claim, free) if free > 0 else []
+                    in_flight.update((asyncio.create_task(self._send_one(*row)), row[0]) for row in rows)
+
+                    # Se despierta cuando termina algún envío, cuando llega un lote nuevo (si hay envíos libres) o
+                    # en el siguiente sondeo (para los reintentos programados y la renovación de los reclamos).
+                    waiters = set(in_flight)
+                    wakeup = asyncio.create_task(self._wakeup.wait()) if len(in_flight) < Config.OUTBOX_CONCURRENCY else None
+                    if wakeup is not None:
+                        waiters.add(wakeup)
+                    try:
+                        done, _ = await asyncio.wait(waiters, timeout=Config.OUTBOX_POLL_INTERVAL,
+                                                     return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        if wakeup is not None:
+                            wakeup.cancel()
+                    finished = [task for task in done if task in in_flight]
+                    for task in finished:
+                        del in_flight[task]
+                    if finished:
+                        await asyncio.to_thread(self._complete, [task.result() for task in finished])
+                    if in_flight and time.monotonic() - renewed_at > Config.OUTBOX_CLAIM_TIMEOUT / 4:
+                        await asyncio.to_thread(self._renew_claims, list(in_flight.values()))
+                        renewed_at = time.monotonic()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error en el worker de envío del outbox: {e}")
+                    await asyncio.sleep(Config.OUTBOX_POLL_INTERVAL)
+        finally:
+            # Los envíos cancelados quedan reclamados y se reintentan cuando su reclamo expira.
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+
+# Instancia compartida por toda la aplicación.
+outbox = Outbox()
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus
+from logger import logger
+
+
+# Tasa mínima, en mensajes por segundo, que admite el limitador: con tasa 0 la espera por un token sería infinita.
+MIN_RATE = 0.01
+
+
+class RateLimitExceeded(Exception):
+    """
+    La solicitud esperó más de lo permitido por un token del limitador.
+
+    Atributos:
+        retry_after (float): Segundos sugeridos antes de reintentar.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Límite de envío alcanzado, reintente en {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket con tasa adaptativa para un número de WhatsApp (PHONE_NUMBER_ID).
+
+    Cada envío consume un token; los tokens se recargan a `rate` por segundo hasta `burst`. Cuando Meta responde
+    con throttling (429 o error 130429) la tasa se reduce a la mitad y el bucket se bloquea durante el `Retry-After`
+    indicado; cada envío exitoso la vuelve a subir de forma aditiva hasta el máximo configurado. Así se opera cerca
+    del límite del tier sin provocar cascadas de throttling.
+
+    Las solicitudes que no encuentran token esperan en orden de llegada hasta `max_wait` segundos antes de fallar
+    con `RateLimitExceeded`. Las tasas se acotan a MIN_RATE, de modo que una configuración en 0 (o repartida entre
+    muchos workers) no deja el bucket sin recarga.
+    """
+
+    def __init__(self, key: str, rate: float, burst: float, min_rate: float, max_wait: float):
+        self.key = key
+        self.min_rate = max(MIN_RATE, min_rate)
+        self.max_rate = max(self.min_rate, rate)
+        self.rate = self.max_rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        CustomMetricsPrometheus.Whatsapp_tasa_envio.labels(key).set(self.rate)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        """
+        Espera hasta obtener un token.
+
+        Raises:
+            RateLimitExceeded: Si el token no puede obtenerse dentro de `max_wait` segundos.
+        """
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        # El lock mantiene a los que esperan en orden de llegada.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(self._blocked_until - now, 0.0)
+                if wait == 0.0 and self._tokens >= 1:
+                    self._tokens -= 1
+                    CustomMetricsPrometheus.Whatsapp_espera_limite_segundos.observe(now - started)
+                    return
+                if wait == 0.0:
+                    wait = (1 - self._tokens) / self.rate
+                if now + wait > deadline:
+                    raise RateLimitExceeded(retry_after=max(wait, self._blocked_until - now))
+                await asyncio.sleep(wait)
+
+    def on_success(self):
+        """
+        Aumenta la tasa de forma aditiva tras un envío exitoso.
+        """
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.01)
+            CustomMetricsPrometheus.Whatsapp_tasa_envio.labels(self.key).set(self.rate)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """
+        Reduce la tasa a la mitad y bloquea el bucket tras una respuesta de throttling.
+
+        Args:
+            retry_after (Optional[float]): Segundos indicados por el encabezado `Retry-After`, si existe.
+        """
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = 0
+        pause = retry_after if retry_after is not None else 1 / self.rate
+        self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+        CustomMetricsPrometheus.Whatsapp_tasa_envio.labels(self.key).set(self.rate)
+        CustomMetricsPrometheus.Whatsapp_respuestas_throttling.labels(self.key).inc()
+        logger.warning(f"Throttling de Meta para {self.key}: tasa reducida a {self.rate:.1f}/s, pausa de {pause:.1f}s")
+
+
+class PhoneNumberRateLimiter:
+    """
+    Mantiene un `AdaptiveTokenBucket` por cada PHONE_NUMBER_ID, ya que Meta aplica los límites por número.
+
+    Los buckets viven en la memoria de cada proceso: con Config.API_WORKERS workers cada uno usa 1/N de la tasa y la
+    ráfaga configuradas, de modo que la tasa total hacia Graph API por número no supere Config.WHATSAPP_RATE_LIMIT.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[str, AdaptiveTokenBucket] = {}
+
+    def bucket(self, phone_number_id: str) -> AdaptiveTokenBucket:
+        if phone_number_id not in self._buckets:
+            self._buckets[phone_number_id] = AdaptiveTokenBucket(
+                phone_number_id,
+                rate=Config.WHATSAPP_RATE_LIMIT / Config.API_WORKERS,
+                burst=max(1.0, Config.WHATSAPP_RATE_LIMIT_BURST / Config.API_WORKERS),
+                min_rate=Config.WHATSAPP_RATE_LIMIT_MIN / Config.API_WORKERS,
+                max_wait=Config.WHATSAPP_RATE_LIMIT_MAX_WAIT,
+            )
+        return self._buckets[phone_number_id]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Convierte el encabezado `Retry-After` (en segundos) a float, o None si no existe o no es numérico.
+    """
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# Instancia compartida por toda la aplicación.
+whatsapp_rate_limiter = PhoneNumberRateLimiter()
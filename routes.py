@@ -2,20 +2,33 @@ import os
 import requests
 import asyncio
 import tweepy
-import aiofiles
-from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import JSONResponse
-from models import SendMessageRequest, IncomingMessage, SendMessageTemplateRequest, Component, EmailSchema, EmailRecipient, TweetRequest, TwitterDMRequest
+from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile, status
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from models import SendMessageRequest, IncomingMessage, SendMessageTemplateRequest, BulkTemplateMessageRequest, Component, EmailSchema, EmailRecipient, TweetRequest, TwitterDMRequest
 from config import Config
 from custom_metrics import CustomMetricsPrometheus
-from logger import logger
+from logger import logger, payload_sampled
 import httpx
 from httpx import HTTPError, AsyncClient, HTTPStatusError, ConnectTimeout
-from typing import Optional
+from typing import Any, List, Optional, Tuple, Union
 from fastapi import Body
 from subscriptions import send_event_notification
-from mailjet_rest import Client
-import mailjet_rest
+from http_client import http_client_manager
+from media_download import stream_download, write_verified, MediaDownloadError
+from media_store import media_store, normalize_sha256
+from media_scheduler import download_scheduler
+from webhook_queue import webhook_worker_pool
+from outbox import outbox
+from rate_limiter import whatsapp_rate_limiter, RateLimitExceeded, parse_retry_after
+from bulk import bounded_map, flatten, iter_chunks, parse_bulk_body, stream_ndjson
+from template_payloads import CompiledTemplate
+from dedup import dedup_cache
+from conversation_sequencer import conversation_sequencer
+from strategies import MediaProcessingStrategy, MessageProcessingStrategy, StatusUpdateProcessingStrategy, StrategyDispatcher
+from media_url_cache import media_url_cache
+from twitter_client import twitter_client
+from dependency_metrics import track_dependency
+from email_attachments import AttachmentNotFound, FileAttachment, StreamingJSONPayload, attach_files, resolve_media_attachment, upload_attachment
 from pydantic import ValidationError
 import prometheus_client
 import time
@@ -26,26 +39,30 @@ class AsyncHTTPClient:
     """
     Clase encargada de manejar las solicitudes HTTP de forma asíncrona. Es útil para realizar operaciones de red
     que no bloqueen la ejecución del programa principal mientras se esperan las respuestas de las solicitudes.
+    Todas las solicitudes comparten el pool de conexiones de `http_client_manager`.
 
     Métodos:
         - request: Permite realizar solicitudes HTTP de cualquier tipo (GET, POST, etc.) de manera asíncrona.
     """
     @staticmethod
-    async def request(method: str, url: str, **kwargs) -> httpx.Response:
+    async def request(method: str, url: str, operation: str = "request", dependency: str = "graph_api", **kwargs) -> httpx.Response:
         """
         Realiza una solicitud HTTP asíncrona usando los parámetros especificados.
 
         Args:
             method (str): El método HTTP a utilizar (por ejemplo, 'GET', 'POST').
             url (str): La URL a la que se hace la solicitud.
+            operation (str): Nombre de la operación para las métricas de dependencias (por ejemplo, 'send_message').
+            dependency (str): Servicio externo al que se llama, para las métricas de dependencias.
             **kwargs: Argumentos adicionales que se pueden pasar a la solicitud, como 'headers', 'json', etc.
 
         Returns:
             httpx.Response: Objeto de respuesta que incluye el estado de la solicitud, los datos de la respuesta, etc.
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.request(method, url, **kwargs)
-            return response
+        with track_dependency(dependency, operation) as call:
+            response = await http_client_manager.request(method, url, **kwargs)
+            call.record_response(response)
+        return response
 
 
 def get_headers() -> dict:
@@ -77,10 +94,106 @@ def get_media_file_path(media_type: str, media_id: str, extension: str, filename
         str: La ruta completa del archivo donde se guardará el medio, incluyendo el directorio base, el tipo de medio,
         y el nombre del archivo (ya sea proporcionado o generado).
     """
-    file_path = f"./media/{media_type}/{filename or f'{media_id}.{extension}'}"  # Ruta dinámica basada en los parámetros
+    file_path = f"{Config.MEDIA_DIR}/{media_type}/{filename or f'{media_id}.{extension}'}"  # Ruta dinámica basada en los parámetros
     return file_path
 
 
+def build_text_payload(message_request: SendMessageRequest) -> dict:
+    """
+    Construye el cuerpo JSON de un mensaje de texto para el endpoint `/messages` de Graph API.
+    """
+    return {
+        "messaging_product": "whatsapp",
+        "to": message_request.recipient_number,
+        "type": "text",
+        "text": {"body": message_request.message}
+    }
+
+
+def build_template_payload(request: SendMessageTemplateRequest) -> dict:
+    """
+    Construye el cuerpo JSON de un mensaje basado en template para el endpoint `/messages` de Graph API.
+    """
+    return {
+        "messaging_product": request.messaging_product,
+        "recipient_type": request.recipient_type,
+        "to": request.to,
+        "type": request.type,
+        "template": {
+            "name": request.template.name,
+            "language": request.template.language,
+            "components": [
+                {
+                    "type": component.type,
+                    "parameters": [param.model_dump(exclude_none=True) for param in component.parameters]
+                } for component in request.template.components
+            ]
+        },
+    }
+
+
+# Códigos de error de Graph API que indican throttling aunque el estado HTTP no sea 429.
+THROTTLING_ERROR_CODES = {4, 80007, 130429, 131056}
+
+
+def is_throttling_response(response: httpx.Response) -> bool:
+    """
+    Indica si una respuesta de Graph API corresponde a un rechazo por límite de tasa.
+    """
+    if response.status_code == 429:
+        return True
+    if response.status_code < 400:
+        return False
+    try:
+        body = response.json()
+        # El cuerpo de error puede no ser un objeto JSON (una lista, un texto o un "error" que no es un objeto).
+        return isinstance(body, dict) and body.get("error", {}).get("code") in THROTTLING_ERROR_CODES
+    except (ValueError, AttributeError):
+        return False
+
+
+async def post_whatsapp_message(payload: Union[dict, bytes], phone_number_id: Optional[str] = None) -> httpx.Response:
+    """
+    Envía un payload al endpoint `/messages` de Graph API. Es el único punto de salida de los mensajes de WhatsApp,
+    usado tanto por los endpoints de envío como por el worker del outbox.
+
+    Cada envío pasa antes por el token bucket del número (`whatsapp_rate_limiter`). Si Meta responde con throttling,
+    el limitador reduce su tasa, respeta el `Retry-After` y el envío se reintenta hasta
+    `Config.WHATSAPP_RATE_LIMIT_RETRIES` veces en lugar de fallar de inmediato.
+
+    Args:
+        payload (Union[dict, bytes]): El cuerpo JSON del mensaje, como diccionario o ya serializado (por ejemplo, por
+                                      `CompiledTemplate.render`).
+        phone_number_id (Optional[str]): Número de WhatsApp emisor. Por defecto Config.PHONE_NUMBER_ID.
+
+    Returns:
+        httpx.Response: La respuesta exitosa de Graph API.
+
+    Raises:
+        httpx.HTTPStatusError: Si Graph API responde con un estado de error.
+        RateLimitExceeded: Si no se obtuvo turno de envío dentro de `Config.WHATSAPP_RATE_LIMIT_MAX_WAIT`.
+    """
+    phone_number_id = phone_number_id or Config.PHONE_NUMBER_ID
+    bucket = whatsapp_rate_limiter.bucket(phone_number_id)
+    body = {"content": payload} if isinstance(payload, bytes) else {"json": payload}
+    for attempt in range(Config.WHATSAPP_RATE_LIMIT_RETRIES + 1):
+        await bucket.acquire()
+        response = await AsyncHTTPClient.request(
+            "POST",
+            url=f"{Config.GRAPH_API_BASE_URL}/{Config.VERSION}/{phone_number_id}/messages",
+            operation="send_message",
+            headers=get_headers(),
+            **body,
+        )
+        if not is_throttling_response(response):
+            break
+        bucket.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+    response.raise_for_status()  # Asegura manejar respuestas HTTP no exitosas adecuadamente.
+    bucket.on_success()
+    CustomMetricsPrometheus.Cantidad_mensajes_whatsapp_enviados.inc(1)
+    return response
+
+
 @router.post("/send-message")
 async def send_message(message_request: SendMessageRequest):
     """
@@ -97,7 +210,8 @@ async def send_message(message_request: SendMessageRequest):
                                                y el cuerpo del mensaje.
 
     Returns: 
-        dict: Un diccionario que indica el éxito del envío del mensaje, incluyendo un mensaje de estado.
+        dict: Un diccionario que indica el éxito del envío del mensaje, incluyendo un mensaje de estado. Con
+              `Config.OUTBOX_ENABLED` se responde 202 con el id del mensaje en el outbox (ver GET /outbox/{outbox_id}).
 
     El proceso comienza registrando la intención de enviar un mensaje, seguido por la preparación y envío de la
     solicitud POST a la API de WhatsApp. Se manejan las respuestas de la API para confirmar el éxito del envío
@@ -105,36 +219,121 @@ async def send_message(message_request: SendMessageRequest):
     """
     # Registro inicial para indicar el comienzo del proceso de envío.
     logger.info(f"Sending message to recipient_number: {message_request.recipient_number}")
-    
+    payload = build_text_payload(message_request)
+
     try:
-        response = None
+        if Config.OUTBOX_ENABLED:
+            # El mensaje queda persistido en el outbox y el worker de envío lo entrega a Graph API.
+            outbox_id = await outbox.enqueue(payload)
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content={"status": "accepted", "outbox_id": outbox_id})
+
         # Envío de la solicitud POST a la API de WhatsApp.
-        response = await AsyncHTTPClient.request(
-            "POST",
-            url=f"https://graph.facebook.com/{Config.VERSION}/{Config.PHONE_NUMBER_ID}/messages",
-            headers=get_headers(),
-            json={
-                "messaging_product": "whatsapp", 
-                "to": message_request.recipient_number, 
-                "type": "text", 
-                "text": {"body": message_request.message}
-            },
-        )
-        response.raise_for_status()  # Asegura manejar respuestas HTTP no exitosas adecuadamente.
-        CustomMetricsPrometheus.Cantidad_mensajes_whatsapp_enviados.inc(1)
+        await post_whatsapp_message(payload)
 
         # Registro de éxito al enviar el mensaje.
         logger.info("Message sent successfully")
         return {"status": "success", "message": f"Message sent to {message_request.recipient_number}."}
-    except HTTPError as http_err:
+    except HTTPStatusError as http_err:
         # Captura y manejo de errores relacionados con la solicitud HTTP.
-        logger.error(f"Failed to send message {response.text} with status code: {http_err.response.status_code}")
-        raise HTTPException(status_code=http_err.response.status_code, detail=response.text)
+        logger.error(f"Failed to send message {http_err.response.text} with status code: {http_err.response.status_code}")
+        raise HTTPException(status_code=http_err.response.status_code, detail=http_err.response.text)
+    except RateLimitExceeded as limit_err:
+        logger.warning(f"Rate limit reached while sending to {message_request.recipient_number}: {limit_err}")
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(limit_err),
+                            headers={"Retry-After": str(int(limit_err.retry_after) + 1)})
     except Exception as err:
         # Manejo de cualquier otro tipo de error no capturado específicamente.
         logger.error(f"An unexpected error occurred while sending the message: {err}")
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
 
+
+
+def whatsapp_message_id(response: httpx.Response) -> Optional[str]:
+    """
+    Extrae el id (wamid) del mensaje creado a partir de la respuesta de Graph API.
+    """
+    try:
+        return response.json()["messages"][0]["id"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+async def deliver_bulk_payload(index: int, recipient: str, payload) -> dict:
+    """
+    Envía (o encola en el outbox) un mensaje de un envío masivo y retorna su resultado individual. Nunca lanza
+    excepciones: cualquier error queda reflejado en el resultado del destinatario.
+    """
+    result = {"index": index, "recipient_number": recipient}
+    try:
+        if Config.OUTBOX_ENABLED:
+            result.update(status="accepted", outbox_id=await outbox.enqueue(payload))
+        else:
+            response = await post_whatsapp_message(payload)
+            result.update(status="success", message_id=whatsapp_message_id(response))
+    except HTTPStatusError as http_err:
+        result.update(status="error", status_code=http_err.response.status_code, detail=http_err.response.text)
+    except RateLimitExceeded as limit_err:
+        result.update(status="error", status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(limit_err))
+    except Exception as err:
+        logger.error(f"Unexpected error in bulk send to {recipient}: {err}")
+        result.update(status="error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred")
+    return result
+
+
+async def send_bulk_text_item(index: int, item) -> dict:
+    """
+    Valida un elemento de `/send-message/bulk` (línea NDJSON u objeto) y lo envía.
+    """
+    try:
+        if isinstance(item, bytes):
+            message_request = SendMessageRequest.model_validate_json(item)
+        else:
+            message_request = SendMessageRequest.model_validate(item)
+    except ValidationError as val_err:
+        return {"index": index, "status": "error", "status_code": status.HTTP_422_UNPROCESSABLE_ENTITY,
+                "detail": val_err.errors(include_url=False, include_context=False, include_input=False)}
+    return await deliver_bulk_payload(index, message_request.recipient_number, build_text_payload(message_request))
+
+
+def bulk_concurrency(requested: Optional[int], limit: int = Config.BULK_SEND_CONCURRENCY) -> int:
+    """
+    Retorna la concurrencia a usar en un envío masivo, acotada por `limit` (por defecto Config.BULK_SEND_CONCURRENCY).
+    """
+    if not requested or requested < 1:
+        return limit
+    return min(requested, limit)
+
+
+@router.post("/send-message/bulk", summary="Enviar un mensaje de texto a muchos destinatarios")
+async def send_message_bulk(request: Request, concurrency: Optional[int] = None):
+    """
+    Envía mensajes de texto a muchos destinatarios en una sola solicitud HTTP.
+
+    El cuerpo puede ser NDJSON (`Content-Type: application/x-ndjson`, un `SendMessageRequest` por línea), un arreglo
+    JSON de `SendMessageRequest` o un objeto `{"messages": [...]}`. Cada elemento se valida de forma individual y
+    se envía a través del mismo camino que `/send-message` (limitador por número y outbox, si está activo), con a lo
+    sumo `concurrency` envíos simultáneos (acotado por Config.BULK_SEND_CONCURRENCY).
+
+    El cuerpo de la solicitud se recibe completo antes de responder, pero se recorre de forma perezosa: solo hay
+    tantos elementos validados en memoria como envíos en curso.
+
+    Returns:
+        StreamingResponse: Un resultado NDJSON por destinatario, en el orden en que terminan los envíos. Cada línea
+                           incluye el índice del elemento, el estado ('success', 'accepted' o 'error') y el id del
+                           mensaje o el detalle del error.
+    """
+    body = await request.body()
+    try:
+        items = parse_bulk_body(body, request.headers.get("content-type", ""), "messages")
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(err))
+
+    logger.info(f"Starting bulk text send ({len(body)} bytes, concurrency={bulk_concurrency(concurrency)})")
+    results = bounded_map(items, send_bulk_text_item, bulk_concurrency(concurrency))
+    return StreamingResponse(stream_ndjson(results), media_type="application/x-ndjson")
+
     
 @router.post("/send-template-message", response_model=dict, status_code=status.HTTP_200_OK, summary="Enviar mensaje basado en template", description="Este endpoint permite enviar un mensaje basado en template a través de WhatsApp.")
 async def send_template_message(request: SendMessageTemplateRequest = Body(..., example={
@@ -170,41 +369,87 @@ async def send_template_message(request: SendMessageTemplateRequest = Body(...,
     - **template**: Datos del template del mensaje.
 
     Returns:
-        dict: Un diccionario que indica el éxito del envío del mensaje, incluyendo un mensaje de estado.
+        dict: Un diccionario que indica el éxito del envío del mensaje, incluyendo un mensaje de estado. Con
+              `Config.OUTBOX_ENABLED` se responde 202 con el id del mensaje en el outbox.
     """
+    payload = build_template_payload(request)
     try:
-        async with AsyncClient() as client:
-            response = await client.post(
-                url=f"https://graph.facebook.com/{Config.VERSION}/{Config.PHONE_NUMBER_ID}/messages",
-                headers=get_headers(),
-                json={
-                    "messaging_product": request.messaging_product,
-                    "recipient_type": request.recipient_type,
-                    "to": request.to,
-                    "type": request.type,
-                    "template": {
-                        "name": request.template.name,
-                        "language": request.template.language,
-                        "components": [
-                            {
-                                "type": component.type,
-                                "parameters": [param.model_dump(exclude_none=True) for param in component.parameters]
-                            } for component in request.template.components
-                        ]
-                    },
-                },
-            )
-            response.raise_for_status()
-            return {"success": True, "message": "Mensaje enviado con éxito."}
+        if Config.OUTBOX_ENABLED:
+            outbox_id = await outbox.enqueue(payload)
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content={"status": "accepted", "outbox_id": outbox_id})
+
+        await post_whatsapp_message(payload)
+        return {"success": True, "message": "Mensaje enviado con éxito."}
     except HTTPStatusError as http_exc:
         # Error específico de respuestas HTTP no exitosas
         detail = f"HTTP error: status {http_exc.response.status_code}"
         raise HTTPException(status_code=http_exc.response.status_code, detail=detail)
+    except RateLimitExceeded as limit_exc:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(limit_exc),
+                            headers={"Retry-After": str(int(limit_exc.retry_after) + 1)})
     except Exception as exc:
         # Para cualquier otro tipo de error no capturado específicamente
         detail = "Error inesperado al enviar el mensaje."
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail)
+
+
+@router.post("/send-template-message/bulk", summary="Enviar un template a muchos destinatarios")
+async def send_template_message_bulk(request: BulkTemplateMessageRequest, concurrency: Optional[int] = None):
+    """
+    Envía un mismo template a muchos destinatarios, cada uno con sus propios valores de parámetros.
+
+    La parte estática del payload se serializa una sola vez (`CompiledTemplate`) y para cada destinatario solo se
+    empalman su número y sus parámetros. Los envíos se ejecutan de forma concurrente, con a lo sumo `concurrency`
+    envíos simultáneos (acotado por Config.BULK_SEND_CONCURRENCY), y pasan por el limitador por número y el outbox
+    igual que `/send-template-message`.
+
+    Returns:
+        StreamingResponse: Un resultado NDJSON por destinatario, en el orden en que terminan los envíos.
+    """
+    compiled = CompiledTemplate(request.template, request.messaging_product, request.recipient_type)
+
+    async def send_recipient(index: int, recipient) -> dict:
+        try:
+            payload = compiled.render(recipient.to, recipient.parameters)
+        except ValueError as err:
+            return {"index": index, "recipient_number": recipient.to, "status": "error",
+                    "status_code": status.HTTP_422_UNPROCESSABLE_ENTITY, "detail": str(err)}
+        return await deliver_bulk_payload(index, recipient.to, payload)
+
+    logger.info(f"Starting bulk template send '{request.template.name}' to {len(request.recipients)} recipients")
+    results = bounded_map(request.recipients, send_recipient, bulk_concurrency(concurrency))
+    return StreamingResponse(stream_ndjson(results), media_type="application/x-ndjson")
+
+@router.get("/outbox/{outbox_id}")
+async def get_outbox_message(outbox_id: int):
+    """
+    Consulta el estado de un mensaje aceptado en el outbox (pending, sending, sent o failed).
+    """
+    message = await outbox.get(outbox_id)
+    if message is None:
+        raise HTTPException(status_code=404, detail="Mensaje no encontrado en el outbox")
+    return message
+
+
 async def get_media_url(media_id: str) -> Optional[str]:
+    """
+    Obtiene la URL de descarga de un medio, reutilizándola desde la caché mientras no expire.
+
+    Las consultas concurrentes por el mismo media_id (por ejemplo, webhooks reenviados o varios mensajes que
+    comparten un medio) se agrupan en una sola llamada a Graph API. Los errores no se guardan en la caché.
+
+    Args:
+        media_id (str): El identificador único del medio para el cual se desea obtener la URL.
+
+    Returns:
+        Optional[str]: La URL del medio si se encuentra y se recupera con éxito; None en caso contrario.
+    """
+    return await media_url_cache.get(media_id, fetch_media_url)
+
+
+async def fetch_media_url(media_id: str) -> Optional[str]:
     """
     Obtiene la URL de descarga de un medio específico utilizando su identificador único (media_id).
     
@@ -227,11 +472,13 @@ async def get_media_url(media_id: str) -> Optional[str]:
     # Registro del intento de recuperación de la URL del medio.
     logger.info(f"Fetching media URL for media_id: {media_id}")
     
+    response = None
     try:
         # Realización de la solicitud HTTP GET a la API de Facebook Graph.
         response = await AsyncHTTPClient.request(
             "GET",
-            f"https://graph.facebook.com/v18.0/{media_id}",  # La URL y versión de la API pueden variar.
+            f"{Config.GRAPH_API_BASE_URL}/{Config.VERSION}/{media_id}",  # La URL y versión de la API pueden variar.
+            operation="get_media_url",
             headers=get_headers()  # Obtención de las cabeceras necesarias para la solicitud, como tokens de autenticación.
         )
         response.raise_for_status()  # Asegura lanzar una excepción para respuestas HTTP no exitosas.
@@ -242,11 +489,12 @@ async def get_media_url(media_id: str) -> Optional[str]:
         return media_url
     except Exception as e:
         # Manejo de errores durante la recuperación de la URL, incluyendo errores de red y respuestas HTTP no exitosas.
-        logger.error(f"Failed to obtain media URL, status code: {response.status_code}, error: {e}")
+        status_code = response.status_code if response is not None else None
+        logger.error(f"Failed to obtain media URL, status code: {status_code}, error: {e}")
         return None
 
 
-async def save_media(media_url: str, media_type: str, media_id: str, mime_type: str, filename: Optional[str] = None) -> Optional[str]:
+async def save_media(media_url: str, media_type: str, media_id: str, mime_type: str, filename: Optional[str] = None, sha256: Optional[str] = None) -> Optional[str]:
     """p
     Descarga y guarda un medio (como imágenes, videos, etc.) localmente usando su URL.
     
@@ -263,13 +511,16 @@ async def save_media(media_url: str, media_type: str, media_id: str, mime_type:
                          su tipo MIME real.
         filename (Optional[str]): Un nombre de archivo opcional para el medio. Si se omite, se generará uno basado
                                    en el media_id y el tipo MIME.
+        sha256 (Optional[str]): Hash SHA-256 recibido en el webhook (`Media.sha256`). Se verifica contra el
+                                contenido descargado antes de mover el archivo a su ruta final.
 
     Returns:
         Optional[str]: La ruta al archivo donde se guardó el medio en caso de éxito; None en caso contrario.
 
     El método primero verifica la validez de la URL del medio. Luego, procede a la descarga y guarda el archivo
-    en un directorio específico basado en su tipo. Se emplea manejo de excepciones para capturar y registrar
-    cualquier error que pueda ocurrir durante el proceso.
+    en un directorio específico basado en su tipo. Con `Config.MEDIA_STREAM_DOWNLOADS` activo, el medio se escribe
+    por bloques en un archivo temporal (ver `media_download.stream_download`) en lugar de cargarse en memoria.
+    Se emplea manejo de excepciones para capturar y registrar cualquier error que pueda ocurrir durante el proceso.
     """
     # Registro de inicio de la operación de guardado.
     logger.info(f"Saving media, media_id: {media_id}, media_type: {media_type}")
@@ -283,23 +534,46 @@ async def save_media(media_url: str, media_type: str, media_id: str, mime_type:
     clean_mime_type = mime_type.split(';')[0]
     extension = clean_mime_type.split('/')[-1]
     
-    # Generación de la ruta del archivo donde se guardará el medio.
-    file_path = get_media_file_path(media_type, media_id, extension, filename)
+    # Generación de la ruta del archivo donde se guardará el medio. Con el almacén direccionado por contenido,
+    # el archivo se nombra por su hash para que los reenvíos del mismo contenido apunten al mismo archivo.
+    if Config.MEDIA_CONTENT_ADDRESSED and normalize_sha256(sha256):
+        file_path = media_store.path_for(media_type, sha256, extension)
+    else:
+        file_path = get_media_file_path(media_type, media_id, extension, filename)
 
+    if Config.MEDIA_STREAM_DOWNLOADS:
+        try:
+            with track_dependency("graph_api", "download_media") as call:
+                size = await stream_download(media_url, file_path, get_headers(), expected_sha256=sha256)
+                call.response_size = size
+            CustomMetricsPrometheus.Medios_bytes_escritos.inc(size)
+            logger.info(f"Media downloaded and saved at: {file_path} ({size} bytes)")
+            return file_path
+        except MediaDownloadError as e:
+            logger.error(f"Media rejected for media_id: {media_id}, error: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Failed to download media for media_id: {media_id}, error: {e}")
+            return None
+
+    response = None
     try:
         # Realización de la solicitud HTTP para descargar el medio.
-        response = await AsyncHTTPClient.request("GET", media_url, headers=get_headers())
+        response = await AsyncHTTPClient.request("GET", media_url, operation="download_media", headers=get_headers())
         response.raise_for_status()  # Asegura manejar respuestas HTTP no exitosas.
-        
-        # Creación del directorio si no existe y apertura del archivo para escribir el contenido del medio.
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        async with aiofiles.open(file_path, 'wb') as file:
-            await file.write(response.content)
+
+        # Igual que en modo streaming, el hash se verifica y el archivo se escribe en un temporal que se renombra de
+        # forma atómica: una descarga truncada o ajena nunca queda guardada bajo el hash del webhook.
+        size = await write_verified(file_path, response.content, expected_sha256=sha256)
+        CustomMetricsPrometheus.Medios_bytes_escritos.inc(size)
         logger.info(f"Media downloaded and saved at: {file_path}")
         return file_path
+    except MediaDownloadError as e:
+        logger.error(f"Media rejected for media_id: {media_id}, error: {e}")
+        return None
     except Exception as e:
         # Registro de cualquier error ocurrido durante la descarga o el guardado del medio.
-        logger.error(f"Failed to download media for media_id: {media_id}, status code: {response.status_code}, error: {e}")
+        logger.error(f"Failed to download media for media_id: {media_id}, status code: {response.status_code if response is not None else None}, error: {e}")
         return None
 
 # Las demás funciones permanecen sin cambios significativos en su lógica interna.
@@ -307,7 +581,7 @@ async def save_media(media_url: str, media_type: str, media_id: str, mime_type:
 
 # Esta refactorización centraliza el manejo de solicitudes HTTP y la generación de rutas de archivos,
 # siguiendo las sugerencias de mejoras generales y específicas.
-async def handle_media_message(media_id: str, media_type: str, mime_type: str, filename: Optional[str] = None, caption: Optional[str] = None):
+async def handle_media_message(media_id: str, media_type: str, mime_type: str, filename: Optional[str] = None, caption: Optional[str] = None, sha256: Optional[str] = None):
     """
     Maneja de manera asíncrona el procesamiento de un mensaje de medios, como imágenes o videos. Esta función es
     responsable de obtener la URL del medio basada en su ID, y luego proceder a guardar el medio localmente en el
@@ -324,25 +598,50 @@ async def handle_media_message(media_id: str, media_type: str, mime_type: str, f
                                   puede generar un nombre basado en el media_id o cualquier otra lógica definida.
         caption (Optional[str]): Subtítulo o descripción asociada con el medio. Este podría ser utilizado para
                                  almacenamiento adicional o metadatos.
+        sha256 (Optional[str]): Hash SHA-256 del medio recibido en el webhook, usado para verificar la descarga.
 
-    Esta función intenta primero obtener la URL del medio y, si tiene éxito, procede a guardar el medio localmente.
+    Returns:
+        Optional[str]: La ruta del medio almacenado, o None si no pudo obtenerse.
+
+    Si el hash del medio ya está en el almacén direccionado por contenido (`media_store`), no se consulta Graph API
+    ni se descarga nada: solo se asocia el nuevo media_id al archivo existente. En caso contrario, la función espera
+    un cupo de `download_scheduler` (las notas de voz e imágenes antes que los videos), obtiene la URL del medio y,
+    si tiene éxito, procede a guardar el medio localmente.
     Se registra cada paso del proceso, facilitando el seguimiento y la depuración.
     """
     try:
         # Registro de inicio del procesamiento para seguimiento y depuración.
         logger.info(f"Processing media message: {media_id}")
 
-        # Obtención de la URL del medio basado en su ID. Es necesario manejar fallos en este punto
-        # ya que podría indicar problemas de conectividad o IDs incorrectos.
-        media_url = await get_media_url(media_id)
-        if media_url:
+        content_addressed = Config.MEDIA_CONTENT_ADDRESSED and normalize_sha256(sha256) is not None
+        if content_addressed:
+            # Los reenvíos del mismo contenido llegan con otro media_id pero con el mismo hash.
+            stored_path = await media_store.lookup(media_id, sha256)
+            if stored_path:
+                await media_store.register(media_id, sha256, stored_path, media_type, mime_type, filename)
+                CustomMetricsPrometheus.Medios_deduplicados.inc()
+                logger.info(f"Media {media_id} already stored at {stored_path}; skipping download")
+                return stored_path
+
+        # La descarga espera un cupo del planificador según el tipo y el tamaño esperado del medio. La URL se obtiene
+        # ya dentro del cupo para que no expire mientras la descarga espera.
+        async with download_scheduler.slot(media_type, mime_type):
+            # Obtención de la URL del medio basado en su ID. Es necesario manejar fallos en este punto
+            # ya que podría indicar problemas de conectividad o IDs incorrectos.
+            media_url = await get_media_url(media_id)
             # Si la URL se obtiene con éxito, proceder a guardar el medio localmente.
-            file_path = await save_media(media_url, media_type, media_id, mime_type, filename)
+            file_path = await save_media(media_url, media_type, media_id, mime_type, filename, sha256) if media_url else None
+        if media_url:
             if file_path:
                 # Confirmación del guardado exitoso del medio para registro y seguimiento.
                 logger.info(f"Media saved successfully at {file_path}")
-                # Este es un buen lugar para realizar operaciones adicionales, como actualizaciones en base de datos.
+                if content_addressed:
+                    await media_store.register(media_id, sha256, file_path, media_type, mime_type, filename)
+                return file_path
             else:
+                # La URL en caché puede haber vencido o apuntar a un medio inaccesible: se descarta para que el
+                # siguiente intento la pida de nuevo a Graph API en lugar de reutilizarla hasta que venza el TTL.
+                media_url_cache.invalidate(media_id)
                 # Manejo y registro de errores en caso de fallo al guardar el medio.
                 logger.error(f"Failed to save media for media_id: {media_id}. The file_path was not obtained.")
         else:
@@ -355,55 +654,153 @@ async def handle_media_message(media_id: str, media_type: str, mime_type: str, f
 
 
 
-async def process_message(message):
+# Tabla de despacho del webhook: (campo del cambio, tipo de elemento) -> estrategia. Cada tipo de medio tiene su propia
+# cola y su propio límite de concurrencia (Config.STRATEGY_CONCURRENCY), de modo que una ráfaga de videos no retrasa
+# el procesamiento de textos, imágenes ni actualizaciones de estado.
+strategy_dispatcher = StrategyDispatcher({
+    ("messages", "text"): MessageProcessingStrategy("text"),
+    ("messages", "image"): MediaProcessingStrategy("image", handle_media_message),
+    ("messages", "audio"): MediaProcessingStrategy("audio", handle_media_message),
+    ("messages", "video"): MediaProcessingStrategy("video", handle_media_message),
+    ("messages", "document"): MediaProcessingStrategy("document", handle_media_message),
+    ("messages", "status"): StatusUpdateProcessingStrategy("status"),
+})
+
+
+def dedup_keys(request: IncomingMessage) -> List[str]:
     """
-    Procesa de manera asíncrona un mensaje individual recibido a través del webhook.
-    Esta función está diseñada para manejar diferentes tipos de mensajes, enfocándose específicamente en mensajes
-    que contienen medios, como imágenes, videos, etc., extrayendo información relevante e iniciando pasos de
-    procesamiento adicionales.
+    Claves de deduplicación de los elementos del evento: `Message.id` para los mensajes y el par id/estado para las
+    actualizaciones de estado, en el orden en que aparecen.
+    """
+    keys = []
+    for entry in request.entry:
+        for change in entry.changes:
+            keys.extend(f"message:{message.id}" for message in change.value.messages or [])
+            keys.extend(f"status:{update.id}:{update.status}" for update in change.value.statuses or [])
+    return keys
+
+
+async def drop_duplicate_items(request: IncomingMessage) -> Tuple[bool, bool]:
+    """
+    Elimina del evento los mensajes (por `Message.id`) y las actualizaciones de estado (por el par id/estado) que
+    ya fueron procesados, usando `dedup_cache`.
 
     Args:
-        message: Un objeto que representa el mensaje recibido. Se espera que este objeto tenga varios atributos
-                 dependiendo de su tipo (por ejemplo, texto, imagen, video), incluyendo, pero no limitado a, un ID
-                 para medios, tipo MIME, nombre de archivo y subtítulo.
+        request (IncomingMessage): El evento recibido; se modifica en el lugar.
 
-    La función emplea programación defensiva inicializando variables de antemano para evitar errores de referencia.
-    También maneja excepciones de manera elegante para asegurar que un mensaje fallido no interrumpa el flujo de
-    procesamiento general.
+    Returns:
+        Tuple[bool, bool]: Si quedó algún elemento nuevo, y si se eliminó algún duplicado.
     """
+    values = [change.value for entry in request.entry for change in entry.changes]
+    keys = dedup_keys(request)
+    if not keys:
+        return True, False
+
+    is_new = iter(await dedup_cache.filter_new(keys))
+    changed = False
+    for value in values:
+        if value.messages:
+            messages = [message for message in value.messages if next(is_new)]
+            changed |= len(messages) != len(value.messages)
+            value.messages = messages or None
+        if value.statuses:
+            statuses = [update for update in value.statuses if next(is_new)]
+            changed |= len(statuses) != len(value.statuses)
+            value.statuses = statuses or None
+    has_new = any(value.messages or value.statuses for value in values)
+    return has_new, changed
+
+
+async def process_webhook_event(request: IncomingMessage, raw_body: Optional[bytes] = None, wait: bool = True):
+    """
+    Procesa un evento completo del webhook: los mensajes (incluyendo la descarga de medios), las actualizaciones de
+    estado y la notificación a los suscriptores.
+
+    Se invoca directamente desde `receive_message`, o desde los workers de `webhook_worker_pool` cuando el webhook
+    opera en modo ack-first (`Config.WEBHOOK_ACK_FIRST`).
+
+    Args:
+        request (IncomingMessage): El evento recibido y ya validado.
+        raw_body (Optional[bytes]): El cuerpo original de la solicitud. Se reutiliza para el log y para la
+                                    notificación a suscriptores en lugar de volver a serializar el modelo.
+        wait (bool): Si es False, retorna apenas los elementos fueron encolados en sus estrategias y la espera y la
+                     notificación continúan en segundo plano (`strategy_dispatcher.run_in_background`). Así un worker
+                     del webhook no queda retenido por una descarga lenta.
+    """
+    start = time.time()  # Iniciar timer para registro de tiempo de procesamiento
+
+    # Meta reenvía los webhooks tras un timeout: los mensajes y estados ya vistos se descartan antes de cualquier E/S.
+    if Config.DEDUP_ENABLED:
+        has_new, changed = await drop_duplicate_items(request)
+        if not has_new:
+            logger.info("Evento duplicado descartado: todos sus mensajes y estados ya fueron procesados")
+            return
+        if changed:
+            # El cuerpo original incluye elementos duplicados; se notifica solo lo nuevo.
+            raw_body = None
+
     try:
-        # Inicializar variables para asegurar que están definidas incluso si no son establecidas por el mensaje.
-        # Esto previene errores de referencia durante las verificaciones condicionales y el procesamiento.
-        media_id = None
-        mime_type = None
-        filename = None
-        caption = None
-
-        # Verificar si el objeto mensaje tiene un atributo nombrado según su tipo (por ejemplo, 'image', 'video')
-        # y extraer información relevante si está presente.
-        if hasattr(message, message.type):
-            media_section = getattr(message, message.type)
-            media_id = getattr(media_section, 'id', None)
-            mime_type = getattr(media_section, 'mime_type', '').split("/")[-1] if hasattr(media_section, 'mime_type') else None
-            filename = getattr(media_section, 'filename', None)
-            caption = getattr(media_section, 'caption', None)
-
-        # Proceder con el procesamiento si se presenta un ID de media, indicando un mensaje de media.
-        if media_id:
-            logger.info(f"Procesando mensaje de tipo '{message.type}' con media_id '{media_id}'")
-            await handle_media_message(media_id, message.type, mime_type, filename, caption)
+        await dispatch_webhook_event(request, raw_body, wait, start)
+    except BaseException:
+        # Si el evento falla, `receive_message` responde con error y Meta lo reenvía: sus elementos se desmarcan
+        # para que el reenvío no se descarte como duplicado y el evento no se pierda.
+        if Config.DEDUP_ENABLED:
+            await asyncio.shield(dedup_cache.forget(dedup_keys(request)))
+        raise
+
+
+async def dispatch_webhook_event(request: IncomingMessage, raw_body: Optional[bytes], wait: bool, start: float):
+    """
+    Encola los elementos ya deduplicados de un evento en sus conversaciones y, si `wait` es True, espera a que
+    terminen y notifica a los suscriptores.
+    """
+    # Se registra el cuerpo tal como llegó; solo si no está disponible se serializa el modelo.
+    if raw_body is None:
+        raw_body = request.model_dump_json(by_alias=True, exclude_none=True).encode()
+    sanitize_log(raw_body, prefix="Evento recibido: ")
+
+    # Cada mensaje y cada actualización de estado se encadena tras los elementos pendientes de su conversación (el
+    # wa_id del remitente o del destinatario), que los entrega en orden a la estrategia que les corresponde según la
+    # tabla de despacho. Aquí solo se espera si se alcanzó el máximo de elementos pendientes de su tipo.
+    futures = []
+    for entry in request.entry:
+        for change in entry.changes:
+            for message in change.value.messages or []:
+                futures.append(await conversation_sequencer.submit(
+                    message.from_, strategy_dispatcher.process, change.field, message.type, message, lane=message.type))
+            for update in change.value.statuses or []:
+                futures.append(await conversation_sequencer.submit(
+                    update.recipient_id, strategy_dispatcher.process, change.field, "status", update, lane="status"))
+
+    completion = complete_webhook_event(request, raw_body, futures, start)
+    if wait:
+        await completion
+    else:
+        strategy_dispatcher.run_in_background(completion)
+
+
+async def complete_webhook_event(request: IncomingMessage, raw_body: bytes, futures: List[asyncio.Future], start: float):
+    """
+    Espera a que las estrategias terminen de procesar los elementos de un evento y notifica a los suscriptores.
+    Los errores de cada elemento ya fueron registrados por su estrategia y no impiden la notificación.
+    """
+    if futures:
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        failed = sum(isinstance(result, BaseException) for result in results)
+        if failed:
+            logger.warning(f"{failed} de {len(results)} elementos del evento fallaron")
         else:
-            # Registrar una advertencia si no se encuentra un ID de media, indicando que el mensaje puede no requerir
-            # procesamiento o no ser compatible con la lógica actual.
-            logger.warning(f"Mensaje recibido sin media_id. Tipo de mensaje: '{message.type}'")
-    except Exception as e:
-        # Registrar cualquier excepción encontrada durante el procesamiento del mensaje.
-        # Esto ayuda a identificar problemas sin detener el procesamiento de mensajes subsiguientes.
-        logger.error(f"Error al procesar mensaje: {e}")
+            logger.info("Todas las tareas procesadas con éxito.")
+
+    await send_event_notification(request, raw_body)
 
+    # Registro del evento y tiempo de procesamiento
+    process_time = time.time() - start
+    logger.info({'event': 'webhook_processed', 'duration': process_time})
 
-@router.post("/webhook", status_code=200)
-async def receive_message(request: IncomingMessage):
+
+@router.post("/webhook", status_code=200, response_class=ORJSONResponse)
+async def receive_message(http_request: Request):
     """
     Este método actúa como el punto de entrada para los mensajes entrantes a través del webhook.
     Es invocado por un sistema externo (e.g., WhatsApp Business API) cuando se reciben nuevos mensajes o eventos.
@@ -411,63 +808,54 @@ async def receive_message(request: IncomingMessage):
     La función está diseñada para ser asincrónica, lo que permite manejar múltiples mensajes de manera eficiente
     sin bloquear el servidor, mejorando así la escalabilidad de la aplicación.
 
+    Con `Config.WEBHOOK_ACK_FIRST` activo, el evento validado se encola en `webhook_worker_pool` y se responde 200
+    de inmediato, de modo que una descarga lenta no retrase la confirmación a Meta (que de lo contrario reintenta
+    y duplica las entregas). Si la cola está llena se responde 503 para aplicar backpressure.
+
+    El cuerpo se valida una sola vez directamente desde los bytes recibidos (`IncomingMessage.model_validate_json`),
+    sin pasar por un diccionario intermedio, y los bytes originales se conservan para el log y la notificación a
+    suscriptores. Las respuestas se serializan con `ORJSONResponse`.
+
     Args:
-        request (IncomingMessage): Un objeto IncomingMessage que contiene los detalles del mensaje entrante,
-                                   conforme al modelo Pydantic definido. Este objeto facilita la validación y el manejo
-                                   de los datos recibidos.
+        http_request (Request): La solicitud HTTP; su cuerpo debe ser un `IncomingMessage` en JSON.
 
     Returns:
-        JSONResponse: Una respuesta HTTP indicando el resultado del procesamiento del mensaje. Devuelve un estado
-                      de éxito junto con un mensaje correspondiente en caso de éxito, o un estado de error en caso de fallo.
+        ORJSONResponse: Una respuesta HTTP indicando el resultado del procesamiento del mensaje. Devuelve un estado
+                        de éxito junto con un mensaje correspondiente en caso de éxito, o un estado de error en caso de fallo.
     """
-    start = time.time()  # Iniciar timer para registro de tiempo de procesamiento
+    raw_body = await http_request.body()
     try:
-        # Conversión del cuerpo de la solicitud a un diccionario para facilitar el registro y la depuración.
-        # Es importante asegurar que el modelo IncomingMessage tenga un método 'dict()' para esta conversión.
-        request_data = request.model_dump()
-        sanitize_log(f"Evento recibido: {request_data}")
-
-        # Lista para acumular tareas asincrónicas correspondientes al procesamiento de cada mensaje.
-        tasks = []
-
-        # Iteración a través de cada entrada en el mensaje recibido. Cada 'entry' puede representar
-        # diferentes mensajes o eventos que necesitan ser procesados.
-        for entry in request.entry:
-            for change in entry.changes:
-                # Verificación de la presencia de mensajes en el cambio actual para procesar.
-                if change.value.messages:
-                    # Programación de una tarea asincrónica para cada mensaje encontrado.
-                    # Esto permite un procesamiento concurrente y eficiente de múltiples mensajes.
-                    for message in change.value.messages:
-                        tasks.append(process_message(message))
-                elif change.value.statuses:
-                    for statuses in change.value.statuses:
-                        logger.info(f"Actualización de estado: {statuses.status}")
-
-        # Si hay tareas programadas, se ejecutan de manera concurrente.
-        # Esto es crucial para mantener la eficiencia y la capacidad de respuesta del servicio.
-        if tasks:
-            await asyncio.gather(*tasks)
-            logger.info("Todas las tareas procesadas con éxito.")
+        request = IncomingMessage.model_validate_json(raw_body)
+    except ValidationError as val_err:
+        return ORJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            content={"detail": val_err.errors(include_url=False, include_context=False, include_input=False)})
 
-        await send_event_notification(request)
+    if Config.WEBHOOK_ACK_FIRST and webhook_worker_pool.running:
+        if not webhook_worker_pool.submit(request, raw_body):
+            logger.warning("Cola del webhook llena; se responde 503")
+            return ORJSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"status": "error", "message": "Servicio saturado, reintente más tarde"})
+        return ORJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"status": "success", "message": "Evento recibido"})
 
-        # Registro del evento y tiempo de procesamiento antes de enviar la respuesta
-        process_time = time.time() - start
-        logger.info({'event': 'webhook_processed', 'duration': process_time})
+    try:
+        await process_webhook_event(request, raw_body)
 
         # Respuesta exitosa tras el procesamiento de los mensajes.
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_200_OK,
             content={"status": "success", "message": "Evento procesado con éxito"})
     except ConnectTimeout as e:
         logger.error("Connection timeout")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_504_GATEWAY_TIMEOUT,
             content={"status": "error", "message": "Timeout de conexión"})
     except HTTPStatusError as e:
         logger.error(f"Ha ocurrido un error no manejado: {e.response.status_code}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST,
             content={"status": "error", "message": "Error, favor tomar nota de la actividad enviada y comunicarse con el supldior"})
     except Exception as e:
@@ -477,53 +865,166 @@ async def receive_message(request: IncomingMessage):
 
         # Respuesta indicando fallo en el procesamiento debido a la excepción capturada.
         # Devolver un mensaje de error específico puede ayudar en la identificación rápida del problema.
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"status": "error", "message": "Error al procesar evento"})
 
 def build_email_recipients_list(recipients):
     return [{"Email": r.email, "Name": r.name} if isinstance(r, EmailRecipient) else {"Email": r, "Name": r.split('@')[0]} for r in recipients]
 
-@router.post("/send-email")
-def send_email(email_data: EmailSchema):
+def build_email_message(email_data: EmailSchema) -> dict:
+    """
+    Construye el mensaje de la API v3.1 de Mailjet para un `EmailSchema`.
+    """
+    # Transforma cada entrada a la estructura adecuada
+    message = {
+        "From": {
+            "Email": email_data.from_email,
+            "Name": email_data.from_name
+        },
+        "To": build_email_recipients_list(email_data.to_emails),
+        "Subject": email_data.subject,
+        "TextPart": email_data.text_part,
+        "HTMLPart": email_data.html_part,
+        "CustomID": "AppGettingStartedTest"
+    }
+
+    if email_data.cc:
+        message["Cc"] = build_email_recipients_list(email_data.cc)
+
+    if email_data.bcc:
+        message["Bcc"] = build_email_recipients_list(email_data.bcc)
+
+    if email_data.attachments:
+        message["Attachments"] = [attachment.model_dump() for attachment in email_data.attachments]
+
+    return message
+
+
+async def prepare_email_message(email_data: EmailSchema, payload: StreamingJSONPayload,
+                                uploads: List[FileAttachment] = ()) -> dict:
+    """
+    Construye el mensaje de Mailjet y registra en `payload` los adjuntos que se envían en streaming: los medios
+    referenciados en `media_attachments` y los archivos subidos por multipart.
+
+    Raises:
+        AttachmentNotFound: Si alguno de los medios referenciados no está almacenado.
+    """
+    message = build_email_message(email_data)
+    media = [
+        await resolve_media_attachment(reference.media_id, reference.sha256, reference.filename, reference.content_type)
+        for reference in email_data.media_attachments or []
+    ]
+    attach_files(message, media + list(uploads), payload)
+    return message
+
+
+async def post_mailjet_send(messages: List[dict], operation: str = "send_email",
+                            payload: Optional[StreamingJSONPayload] = None) -> httpx.Response:
+    """
+    Envía uno o más mensajes en una sola solicitud a la API v3.1 de Mailjet (`POST /v3.1/send`) usando el cliente
+    HTTP compartido, sin ocupar un hilo del threadpool durante la llamada.
+
+    Args:
+        messages (List[dict]): Mensajes construidos con `build_email_message` (a lo sumo Config.MAILJET_BATCH_SIZE).
+        operation (str): Nombre de la operación para las métricas de dependencias.
+        payload (Optional[StreamingJSONPayload]): Adjuntos registrados con `prepare_email_message`; si hay alguno, el
+                                                  cuerpo se envía en streaming, codificando los archivos por bloques.
+
+    Returns:
+        httpx.Response: La respuesta de Mailjet; su campo "Messages" trae el resultado de cada mensaje en el mismo orden.
+    """
+    if payload:
+        length, content = payload.encode({"Messages": messages})
+        body = {"content": content, "headers": {"Content-Type": "application/json", "Content-Length": str(length)}}
+    else:
+        body = {"json": {"Messages": messages}}
+    return await AsyncHTTPClient.request(
+        "POST",
+        f"{Config.MAILJET_API_URL.rstrip('/')}/v3.1/send",
+        operation=operation,
+        dependency="mailjet",
+        auth=(Config.MAILJET_KEY, Config.MAILJET_SECRET),
+        **body,
+    )
+
+
+def mailjet_message_result(index: int, message: dict, outcome: Optional[dict]) -> dict:
+    """
+    Traduce el resultado que Mailjet reporta para un mensaje a un resultado individual del envío por lotes.
+    """
+    result = {"index": index, "to": [recipient["Email"] for recipient in message["To"]]}
+    if outcome is None:
+        return {**result, "status": "error", "detail": "Mailjet no reportó un resultado para este mensaje"}
+    if outcome.get("Status") == "success":
+        message_ids = [recipient.get("MessageID") for key in ("To", "Cc", "Bcc") for recipient in outcome.get(key, [])]
+        return {**result, "status": "success", "message_ids": message_ids}
+    return {**result, "status": "error", "detail": outcome.get("Errors", outcome)}
+
+
+async def send_email_chunk(chunk_index: int, chunk: List[Tuple[int, Any]]) -> List[dict]:
+    """
+    Valida los elementos de un lote de `/send-email/batch` y envía los válidos en una sola solicitud a Mailjet.
+    Nunca lanza excepciones: cualquier error queda reflejado en el resultado de cada mensaje.
+    """
+    results = []
+    pending: List[Tuple[int, dict]] = []
+    payload = StreamingJSONPayload()
+    for index, item in chunk:
+        try:
+            if isinstance(item, bytes):
+                email_data = EmailSchema.model_validate_json(item)
+            else:
+                email_data = EmailSchema.model_validate(item)
+        except ValidationError as val_err:
+            results.append({"index": index, "status": "error", "status_code": status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            "detail": val_err.errors(include_url=False, include_context=False, include_input=False)})
+            continue
+        try:
+            pending.append((index, await prepare_email_message(email_data, payload)))
+        except AttachmentNotFound as err:
+            results.append({"index": index, "status": "error", "status_code": status.HTTP_404_NOT_FOUND, "detail": str(err)})
+    if not pending:
+        return results
+
+    try:
+        response = await post_mailjet_send([message for _, message in pending], operation="send_email_batch", payload=payload)
+        outcomes = response.json().get("Messages")
+    except Exception as err:
+        logger.error(f"Fallo al enviar un lote de {len(pending)} correos: {err}")
+        return results + [{"index": index, "to": [recipient["Email"] for recipient in message["To"]], "status": "error",
+                           "status_code": status.HTTP_502_BAD_GATEWAY, "detail": str(err)} for index, message in pending]
+
+    if not isinstance(outcomes, list) or len(outcomes) != len(pending):
+        # Error de la solicitud completa (por ejemplo, credenciales inválidas): aplica a todos los mensajes del lote.
+        logger.error(f"Fallo al enviar un lote de {len(pending)} correos: {response.status_code} {response.text}")
+        return results + [{"index": index, "to": [recipient["Email"] for recipient in message["To"]], "status": "error",
+                           "status_code": response.status_code, "detail": response.text} for index, message in pending]
+    return results + [mailjet_message_result(index, message, outcome) for (index, message), outcome in zip(pending, outcomes)]
+
+
+async def deliver_email(email_data: EmailSchema, uploads: List[FileAttachment] = ()):
+    """
+    Envía un correo a través de Mailjet, con sus adjuntos en línea, los medios referenciados y los archivos subidos.
+    """
     try:
-        mailjet = Client(auth=(Config.MAILJET_KEY, Config.MAILJET_SECRET), version='v3.1')
-        # Transforma cada entrada a la estructura adecuada
-
-        message = {
-            "From": {
-                "Email": email_data.from_email,
-                "Name": email_data.from_name
-            },
-            "To": build_email_recipients_list(email_data.to_emails),
-            "Subject": email_data.subject,
-            "TextPart": email_data.text_part,
-            "HTMLPart": email_data.html_part,
-            "CustomID": "AppGettingStartedTest"
-        }
-
-        if email_data.cc:
-            message["Cc"] = build_email_recipients_list(email_data.cc)
-
-        if email_data.bcc:
-            message["Bcc"] = build_email_recipients_list(email_data.bcc)
-
-        if email_data.attachments:
-            message["Attachments"] = [attachment.model_dump() for attachment in email_data.attachments]
-
-        data = {"Messages": [message]}
-
-            
-        result = mailjet.send.create(data=data)
+        payload = StreamingJSONPayload()
+        message = await prepare_email_message(email_data, payload, uploads)
+        result = await post_mailjet_send([message], payload=payload)
         if result.status_code == 200:
             return {"message": "Email sent successfully"}
         else:
             # Log this error
-            logger.error(f"Fallo al enviar el correo: {result.json()}")
+            logger.error(f"Fallo al enviar el correo: {result.text}")
             return JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={"message": "Email failed to send", "details": result.json()}
             )
+    except AttachmentNotFound as e:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={"message": "Attachment not found", "details": str(e)}
+        )
     except Exception as e:
         # Log this error
         logger.error(f"Ha ocurrido un error no manejado: {str(e)}")
@@ -531,54 +1032,89 @@ def send_email(email_data: EmailSchema):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"message": "An unexpected error occurred", "details": str(e)}
         )  
-    
+
+
+@router.post("/send-email")
+async def send_email(email_data: EmailSchema):
+    return await deliver_email(email_data)
+
+
+@router.post("/send-email/upload", summary="Enviar un correo con archivos adjuntos subidos por multipart")
+async def send_email_upload(email: str = Form(..., description="EmailSchema serializado como JSON"),
+                            files: List[UploadFile] = File(default=[])):
+    """
+    Envía un correo cuyos adjuntos se suben como archivos en una solicitud `multipart/form-data`, en lugar de
+    incluirlos en base64 dentro del JSON. Los archivos se reciben en archivos temporales y se codifican en base64 por
+    bloques mientras se envía la solicitud a Mailjet, por lo que su contenido nunca está completo en memoria.
+
+    Args:
+        email (str): El `EmailSchema` serializado como JSON (puede incluir `media_attachments`).
+        files (List[UploadFile]): Los archivos a adjuntar.
+    """
+    try:
+        email_data = EmailSchema.model_validate_json(email)
+    except ValidationError as val_err:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=val_err.errors(include_url=False, include_context=False, include_input=False))
+    return await deliver_email(email_data, [upload_attachment(upload) for upload in files])
+
+
+@router.post("/send-email/batch", summary="Enviar muchos correos en lotes")
+async def send_email_batch(request: Request, concurrency: Optional[int] = None):
+    """
+    Envía muchos correos agrupándolos en solicitudes de hasta Config.MAILJET_BATCH_SIZE mensajes a Mailjet (el
+    máximo que acepta la API v3.1 por llamada), con a lo sumo `concurrency` lotes en vuelo (acotado por
+    Config.MAILJET_BATCH_CONCURRENCY).
+
+    El cuerpo puede ser NDJSON (`Content-Type: application/x-ndjson`, un `EmailSchema` por línea), un arreglo JSON de
+    `EmailSchema` o un objeto `{"emails": [...]}`. Cada elemento se valida de forma individual.
+
+    Returns:
+        StreamingResponse: Un resultado NDJSON por correo, a medida que terminan los lotes. Cada línea incluye el índice
+                           del elemento, los destinatarios, el estado ('success' o 'error') y los ids de mensaje de
+                           Mailjet o el detalle del error.
+    """
+    body = await request.body()
+    try:
+        items = parse_bulk_body(body, request.headers.get("content-type", ""), "emails")
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(err))
+
+    batch_concurrency = bulk_concurrency(concurrency, Config.MAILJET_BATCH_CONCURRENCY)
+    logger.info(f"Starting email batch send ({len(body)} bytes, concurrency={batch_concurrency})")
+    chunks = iter_chunks(enumerate(items), Config.MAILJET_BATCH_SIZE)
+    results = flatten(bounded_map(chunks, send_email_chunk, batch_concurrency))
+    return StreamingResponse(stream_ndjson(results), media_type="application/x-ndjson")
+
 @router.post("/send-tweet")
 async def post_tweet(tweet_request: TweetRequest):
-    client = tweepy.Client(
-        consumer_key=Config.TWITTER_CONSUMER_KEY,
-        consumer_secret=Config.TWITTER_CONSUMER_SECRET,
-        access_token=Config.TWITTER_ACCESS_TOKEN,
-        access_token_secret=Config.TWITTER_TOKEN_SECRET
-    )
     try:
-        response = client.create_tweet(text=tweet_request.text)
-        return response.data
+        return await twitter_client.create_tweet(tweet_request.text)
+    except RateLimitExceeded as limit_err:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(limit_err),
+                            headers={"Retry-After": str(int(limit_err.retry_after) + 1)})
     except tweepy.TweepyException as e:
         raise HTTPException(status_code=400, detail=f"Twitter API error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
-'''@router.post("/send-dm")
-async def send_direct_message(dm_request: TwitterDMRequest):
-    url = f"https://api.twitter.com/2/dm_conversations/with/{dm_request.participant_id}/messages"
-    payload = {
-        "message": {
-            "text": dm_request.message
-        }
-    }
-    headers = {
-        'Authorization': f'Bearer {Config.TWITTER_BEARER_TOKEN}',
-        'Content-Type': 'application/json'
-    }
 
+@router.post("/send-dm")
+async def send_direct_message(dm_request: TwitterDMRequest):
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()  # This will raise an HTTPError for bad responses (4XX or 5XX)
-    except requests.exceptions.HTTPError as http_err:
+        data = await twitter_client.send_direct_message(dm_request.participant_id, dm_request.message)
+    except RateLimitExceeded as limit_err:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(limit_err),
+                            headers={"Retry-After": str(int(limit_err.retry_after) + 1)})
+    except tweepy.HTTPException as http_err:
         # Catching HTTP errors from Twitter API and providing a detailed message
-        return {"error": "HTTP error occurred", "details": str(http_err), "response": response.json()}
-    except requests.exceptions.RequestException as req_err:
-        # Catching other requests-related errors (e.g., connection issues)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Twitter API error: {str(http_err)}")
+    except tweepy.TweepyException as req_err:
+        # Catching other Twitter client errors (e.g., connection issues)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"Request error occurred: {str(req_err)}"
         )
-    except ValidationError as val_err:
-        # Catching validation errors for the request model
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail=f"Validation error for the input data: {val_err.errors()}"
-        )
     except Exception as err:
         # Generic exception catch to handle unexpected errors
         raise HTTPException(
@@ -586,10 +1122,15 @@ async def send_direct_message(dm_request: TwitterDMRequest):
             detail=f"An unexpected error occurred: {str(err)}"
         )
 
-    return {"message": "DM sent successfully", "data": response.json()}'''
+    return {"message": "DM sent successfully", "data": data}
 
-def sanitize_log(data: str):
+def sanitize_log(data: Union[str, bytes], prefix: str = ""):
+    # Log de alto volumen: se muestrea antes de decodificar y formatear el payload.
+    if not payload_sampled():
+        return
+    if isinstance(data, bytes):
+        data = data.decode('utf-8', errors='replace')
     try:
-        logger.info(data)
+        logger.info(prefix + data)
     except UnicodeEncodeError:
-        logger.info(data.encode('utf-8', errors='replace').decode('utf-8'))
\ No newline at end of file
+        logger.info((prefix + data).encode('utf-8', errors='replace').decode('utf-8'))
\ No newline at end of file
@@ -1,81 +1,254 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any
-from models import Message  # Asegúrate de que esta importación sea correcta según tu estructura de proyecto
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus, set_gauge_function
+from logger import logger
+from media_postprocess import media_postprocessor
+from models import Message, Statuses
+
+
+def parse_strategy_limits(raw: str) -> Dict[str, int]:
+    """
+    Convierte la variable de entorno STRATEGY_CONCURRENCY ("estrategia=N,estrategia=N") en un diccionario.
+
+    Args:
+        raw (str): Cadena con pares estrategia=concurrencia separados por comas.
+
+    Returns:
+        Dict[str, int]: Máximo de elementos procesados en paralelo por cada estrategia configurada.
+    """
+    limits = {}
+    for item in raw.split(','):
+        if '=' not in item:
+            continue
+        name, value = item.split('=', 1)
+        try:
+            limits[name.strip().lower()] = max(1, int(value))
+        except ValueError:
+            logger.warning(f"Concurrencia inválida para la estrategia '{name.strip()}': {value!r}")
+    return limits
+
+
+STRATEGY_LIMITS = parse_strategy_limits(Config.STRATEGY_CONCURRENCY)
+
 
 class ProcessingStrategy(ABC):
     """
     Clase abstracta que define la interfaz para las estrategias de procesamiento.
     Las subclases deben implementar el método process.
+
+    Cada estrategia tiene su propia cola acotada y sus propios workers, de modo que un tipo de elemento lento o muy
+    frecuente (por ejemplo, videos) solo ocupa su cupo y no retrasa a los demás. La concurrencia se toma de
+    Config.STRATEGY_CONCURRENCY según el nombre de la estrategia.
+
+    Métodos:
+        - process: Procesa un elemento (lo implementa cada subclase).
+        - submit: Encola un elemento y retorna un futuro con el resultado de `process`.
+        - stop: Detiene los workers y cancela los elementos que no alcanzaron a procesarse.
     """
-    
+
+    def __init__(self, name: str, concurrency: Optional[int] = None, queue_size: int = Config.STRATEGY_QUEUE_SIZE):
+        self.name = name
+        self.concurrency = concurrency or STRATEGY_LIMITS.get(name, Config.STRATEGY_DEFAULT_CONCURRENCY)
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._busy = 0
+        self._gauges_registered = False
+
     @abstractmethod
-    async def process(self, data: Any):  # Cambiado Dict[str, Any] por Any para permitir mayor flexibilidad en los datos de entrada.
+    async def process(self, data: Any):
         """
         Método abstracto para procesar los datos de entrada.
-        
+
         Args:
             data (Any): Los datos a procesar. El tipo Any permite una mayor flexibilidad.
         """
         pass
 
+    async def submit(self, data: Any) -> asyncio.Future:
+        """
+        Encola un elemento para esta estrategia. Si la cola está llena espera a que haya espacio (backpressure).
+
+        Returns:
+            asyncio.Future: Se resuelve con el resultado de `process`, o con su excepción.
+        """
+        if not self._tasks:
+            self._start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((time.perf_counter(), data, future))
+        return future
+
+    def _start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        if not self._gauges_registered:
+            set_gauge_function(CustomMetricsPrometheus.Estrategia_cola_profundidad.labels(self.name),
+                               lambda: self._queue.qsize() if self._queue else 0)
+            set_gauge_function(CustomMetricsPrometheus.Estrategia_en_curso.labels(self.name), lambda: self._busy)
+            set_gauge_function(CustomMetricsPrometheus.Estrategia_utilizacion.labels(self.name),
+                               lambda: self._busy / self.concurrency)
+            self._gauges_registered = True
+        logger.info(f"Estrategia '{self.name}' iniciada (concurrency={self.concurrency}, queue_size={self.queue_size})")
+
+    async def stop(self):
+        if not self._tasks:
+            return
+        pending = self._queue.qsize() + self._busy
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            future.cancel()
+        if pending:
+            logger.warning(f"Estrategia '{self.name}' detenida con {pending} elementos pendientes")
+        self._busy = 0
+
+    async def _worker(self):
+        while True:
+            enqueued_at, data, future = await self._queue.get()
+            started = time.perf_counter()
+            CustomMetricsPrometheus.Estrategia_cola_espera_segundos.labels(self.name).observe(started - enqueued_at)
+            self._busy += 1
+            try:
+                result = await self.process(data)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                # Un elemento fallido no debe detener al worker; el error se entrega a quien espera el futuro.
+                logger.error(f"Error en la estrategia '{self.name}': {e}")
+                outcome = "error"
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                outcome = "success"
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._busy -= 1
+                self._queue.task_done()
+            CustomMetricsPrometheus.Estrategia_latencia_segundos.labels(self.name, outcome).observe(time.perf_counter() - started)
+
+
 class MessageProcessingStrategy(ProcessingStrategy):
     """
-    Estrategia para procesar mensajes. Implementa el método process para trabajar con modelos Pydantic de mensajes.
+    Estrategia para procesar mensajes de texto.
     """
-    
-    async def process(self, message: Message):  # Tipo de entrada específica para reflejar el modelo Pydantic.
+
+    async def process(self, message: Message):
         """
         Procesa un mensaje.
-        
+
         Args:
             message (Message): El mensaje a procesar.
         """
-        print(f"Mensaje recibido: {message.text.body if message.text else 'No body'}")
+        logger.info(f"Mensaje recibido: {message.text.body if message.text else 'No body'}")
+
 
 class MediaProcessingStrategy(ProcessingStrategy):
     """
-    Estrategia para procesar medios. Implementa el método process para manejar diferentes tipos de medios.
+    Estrategia para procesar medios (imagen, audio, video, documento). Se registra una instancia por tipo de medio
+    para que cada tipo tenga su propio límite de concurrencia.
+
+    La descarga y el almacenamiento los realiza `handler` (`handle_media_message` en routes.py), que recibe
+    media_id, tipo, subtipo MIME, nombre de archivo, subtítulo y hash del medio. El medio guardado se encola luego en
+    `media_postprocessor`.
     """
-    
-    async def process(self, message: Message):
+
+    def __init__(self, name: str, handler: Callable[..., Awaitable[Optional[str]]], **kwargs):
+        super().__init__(name, **kwargs)
+        self.handler = handler
+
+    async def process(self, message: Message) -> Optional[str]:
         """
-        Procesa un mensaje que contiene medios (imagen, voz, video).
-        
+        Procesa un mensaje que contiene medios.
+
         Args:
             message (Message): El mensaje que contiene el medio a procesar.
+
+        Returns:
+            Optional[str]: La ruta del medio almacenado, o None si no pudo obtenerse.
         """
-        # El procesamiento varía según el tipo de medio en el mensaje.
-        # Se muestra un ejemplo de cómo manejar cada tipo.
-        if message.type == 'image' and message.image:
-            media_id = message.image.id
-            print(f"Descargando imagen con media_id: {media_id}")
-            # Aquí podría ir lógica adicional para manejar la descarga y el almacenamiento del medio.
-        elif message.type == 'voice' and message.voice:
-            media_id = message.voice.id
-            print(f"Descargando voz con media_id: {media_id}")
-        elif message.type == 'video' and message.video:
-            media_id = message.video.id
-            print(f"Descargando video con media_id: {media_id}")
-        else:
-            print("Tipo de mensaje no manejado por esta estrategia.")
+        media = getattr(message, message.type, None)
+        if media is None or not media.id:
+            logger.warning(f"Mensaje recibido sin media_id. Tipo de mensaje: '{message.type}'")
+            return None
+        logger.info(f"Procesando mensaje de tipo '{message.type}' con media_id '{media.id}'")
+        file_path = await self.handler(media.id, message.type, media.mime_type.split("/")[-1],
+                                       getattr(media, 'filename', None), media.caption, media.sha256)
+        if file_path:
+            # Las miniaturas y metadatos se generan en segundo plano, en el pool de procesos.
+            media_postprocessor.submit(file_path, message.type)
+        return file_path
+
 
 class StatusUpdateProcessingStrategy(ProcessingStrategy):
     """
-    Estrategia para procesar actualizaciones de estado. Asume que las actualizaciones de estado se reciben como diccionarios.
+    Estrategia para procesar actualizaciones de estado de mensajes enviados.
     """
-    
-    async def process(self, status: Dict[str, Any]):
+
+    async def process(self, status: Statuses):
         """
         Procesa una actualización de estado.
-        
+
         Args:
-            status (Dict[str, Any]): La actualización de estado a procesar.
+            status (Statuses): La actualización de estado a procesar.
+        """
+        logger.info(f"Actualización de estado: {status.status}")
+
+
+class StrategyDispatcher:
+    """
+    Tabla de despacho del webhook: asocia cada par (campo del cambio, tipo de elemento) a una estrategia.
+
+    El tipo de elemento es `Message.type` para los mensajes y "status" para las actualizaciones de estado. Una misma
+    estrategia puede registrarse para varias claves; los elementos sin estrategia se registran en el log y se omiten.
+
+    Métodos:
+        - submit: Encola un elemento en la estrategia que le corresponde y retorna su futuro.
+        - process: Encola un elemento y espera a que su estrategia lo procese.
+        - run_in_background: Ejecuta una corrutina (por ejemplo, la finalización de un evento) que `stop` esperará.
+        - stop: Espera las corrutinas en segundo plano (con un timeout), cancela las restantes y detiene todas las estrategias.
+    """
+
+    def __init__(self, table: Dict[Tuple[str, str], ProcessingStrategy]):
+        self.table = table
+        self._background: Set[asyncio.Task] = set()
+
+    async def submit(self, field: str, kind: str, data: Any) -> Optional[asyncio.Future]:
+        strategy = self.table.get((field, kind))
+        if strategy is None:
+            logger.warning(f"Sin estrategia para el campo '{field}' y el tipo '{kind}'; se omite el elemento")
+            return None
+        return await strategy.submit(data)
+
+    async def process(self, field: str, kind: str, data: Any) -> Any:
         """
-        print(f"Actualización de estado recibida: {status.get('status')}")
-
-# Mapeo de tipos de cambio a estrategias para facilitar el manejo de diferentes tipos de datos.
-strategies = {
-    "messages": MessageProcessingStrategy(),
-    "statuses": StatusUpdateProcessingStrategy(),
-    "media": MediaProcessingStrategy(),
-}
+        Encola un elemento en su estrategia y espera el resultado (None si no hay estrategia para el elemento).
+        """
+        future = await self.submit(field, kind, data)
+        return await future if future is not None else None
+
+    def run_in_background(self, coroutine: Awaitable[Any]) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def stop(self, timeout: float = Config.WEBHOOK_DRAIN_TIMEOUT):
+        if self._background:
+            _, pending = await asyncio.wait(set(self._background), timeout=timeout)
+            if pending:
+                # Se cancelan antes de que main.py cierre los clientes HTTP que usarían para notificar.
+                logger.warning(f"Se detienen las estrategias con {len(pending)} eventos sin terminar")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        for strategy in {id(strategy): strategy for strategy in self.table.values()}.values():
+            await strategy.stop()
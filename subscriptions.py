@@ -1,45 +1,367 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException
 from models import WebhookRegistrationRequest, IncomingMessage
 import httpx
 import logging
+import asyncio
+import json
+import os
+import random
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+from http_client import http_client_manager, resolve_public_addresses
+from config import Config
+from custom_metrics import CustomMetricsPrometheus, remove_label_series
+from dependency_metrics import track_dependency
 
-app = FastAPI()
 
-# Este diccionario es solo para fines de demostración. En producción, deberías almacenar esto en una base de datos.
-webhook_subscriptions = {"https://0e6f-2001-1308-2d10-d000-6180-9312-ea7e-92ef.ngrok-free.app/webhook"}
+
+async def require_api_key(x_api_key: Optional[str] = Header(default=None)):
+    """
+    Exige la clave Config.SUBSCRIPTIONS_API_KEY en el encabezado X-API-Key. Si no está configurada, el registro de
+    suscriptores queda deshabilitado: cualquiera podría registrar una URL y recibir todos los eventos.
+    """
+    if not Config.SUBSCRIPTIONS_API_KEY:
+        raise HTTPException(status_code=503, detail="Registro de suscriptores deshabilitado")
+    if x_api_key is None or not secrets.compare_digest(x_api_key, Config.SUBSCRIPTIONS_API_KEY):
+        raise HTTPException(status_code=401, detail="API key inválida")
+
+
+router = APIRouter(dependencies=[Depends(require_api_key)])
+
+# Tipo de evento comodín: el suscriptor recibe todos los eventos.
+ALL_EVENTS = "*"
+
+
+def event_types(event: IncomingMessage) -> Set[str]:
+    """
+    Calcula los tipos de evento contenidos en un webhook, usados para filtrar a qué suscriptores se notifica.
+
+    Los tipos son "messages" y "messages.<tipo>" (por ejemplo "messages.image") por cada mensaje, y "statuses" y
+    "statuses.<estado>" (por ejemplo "statuses.delivered") por cada actualización de estado.
+    """
+    types = set()
+    for entry in event.entry:
+        for change in entry.changes:
+            for message in change.value.messages or []:
+                types.update(("messages", f"messages.{message.type}"))
+            for status_update in change.value.statuses or []:
+                types.update(("statuses", f"statuses.{status_update.status}"))
+    return types
+
+
+class SubscriptionRegistry:
+    """
+    Registro persistente de suscriptores (SQLite) con un índice invertido tipo de evento -> suscriptores.
+
+    El registro se carga al iniciar la aplicación y se comparte entre los workers de uvicorn a través de la base de
+    datos: cada worker consulta `PRAGMA data_version` como máximo cada Config.SUBSCRIPTIONS_REFRESH_INTERVAL segundos
+    y recarga el índice si otro proceso registró o eliminó un suscriptor. Así `send_event_notification` solo contacta
+    a los suscriptores que pidieron el tipo de evento recibido.
+
+    Cada suscriptor tiene un id de registro (el rowid de SQLite) que se usa como etiqueta de sus métricas en lugar de
+    la URL, que puede contener tokens y no tiene un límite de valores. Cuando un suscriptor desaparece del registro se
+    descartan su circuit breaker y sus series de métricas.
+
+    Métodos:
+        - load: Abre la base de datos y construye el índice.
+        - register: Registra (o actualiza) un suscriptor con sus tipos de evento.
+        - unregister: Elimina un suscriptor.
+        - subscribers_for: Retorna los suscriptores interesados en alguno de los tipos de evento indicados.
+        - subscriber_id: Retorna el id de registro de un suscriptor.
+    """
+
+    def __init__(self, path: str = Config.SUBSCRIPTIONS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._subscriptions: Dict[str, List[str]] = {}
+        self._ids: Dict[str, str] = {}
+        self._index: Dict[str, Set[str]] = {}
+        self._data_version: Optional[int] = None
+        self._checked_at = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS subscriptions (url TEXT PRIMARY KEY, events TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            # Suscriptores iniciales definidos por variable de entorno; reciben todos los eventos.
+            for url in filter(None, (url.strip() for url in Config.WEBHOOK_SUBSCRIBERS.split(','))):
+                connection.execute(
+                    "INSERT OR IGNORE INTO subscriptions (url, events, created_at) VALUES (?, ?, ?)",
+                    (url, json.dumps([ALL_EVENTS]), time.time()),
+                )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _reload(self) -> Dict[str, str]:
+        with self._lock:
+            connection = self._connect()
+            rows = connection.execute("SELECT rowid, url, events FROM subscriptions").fetchall()
+            self._data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        ids = {url: str(rowid) for rowid, url, _ in rows}
+        subscriptions = {url: json.loads(events) or [ALL_EVENTS] for _, url, events in rows}
+        index: Dict[str, Set[str]] = {}
+        for url, events in subscriptions.items():
+            for event in events:
+                index.setdefault(event, set()).add(url)
+        removed = {url: subscriber_id for url, subscriber_id in self._ids.items() if ids.get(url) != subscriber_id}
+        self._subscriptions, self._index, self._ids = subscriptions, index, ids
+        return removed
+
+    def _reload_if_changed(self) -> Dict[str, str]:
+        with self._lock:
+            version = self._connect().execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            return self._reload()
+        return {}
+
+    async def load(self):
+        """
+        Abre la base de datos y construye el índice en memoria.
+        """
+        await asyncio.to_thread(self._reload)
+        self._checked_at = time.monotonic()
+        logging.info(f"Registro de suscriptores cargado: {len(self._subscriptions)} suscriptores")
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._subscriptions
+
+    def subscriber_id(self, url: str) -> str:
+        """
+        Retorna el id de registro del suscriptor, usado como etiqueta de sus métricas.
+        """
+        return self._ids.get(url, "unregistered")
+
+    def _write(self, sql: str, parameters: tuple):
+        with self._lock:
+            connection = self._connect()
+            connection.execute(sql, parameters)
+            connection.commit()
+
+    async def register(self, url: str, events: Iterable[str]):
+        """
+        Registra un suscriptor. Una lista de eventos vacía equivale a suscribirse a todos ("*").
+        """
+        events = sorted(set(events)) or [ALL_EVENTS]
+        await asyncio.to_thread(
+            self._write,
+            "INSERT INTO subscriptions (url, events, created_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET events = excluded.events",
+            (url, json.dumps(events), time.time()),
+        )
+        forget_subscribers(await asyncio.to_thread(self._reload))
+
+    async def unregister(self, url: str):
+        """
+        Elimina un suscriptor del registro junto con su circuit breaker y sus series de métricas.
+        """
+        await asyncio.to_thread(self._write, "DELETE FROM subscriptions WHERE url = ?", (url,))
+        forget_subscribers(await asyncio.to_thread(self._reload))
+
+    async def subscribers_for(self, types: Iterable[str]) -> Set[str]:
+        """
+        Retorna los suscriptores interesados en alguno de los tipos de evento, más los suscritos a todos ("*").
+        """
+        if time.monotonic() - self._checked_at >= Config.SUBSCRIPTIONS_REFRESH_INTERVAL:
+            self._checked_at = time.monotonic()
+            # Los suscriptores eliminados desde otro worker se descartan aquí.
+            forget_subscribers(await asyncio.to_thread(self._reload_if_changed))
+        subscribers = set(self._index.get(ALL_EVENTS, ()))
+        for event_type in types:
+            subscribers |= self._index.get(event_type, set())
+        return subscribers
+
+
+# Instancia compartida por toda la aplicación.
+subscription_registry = SubscriptionRegistry()
+
+async def check_public_url(url: str):
+    """
+    Rechaza las URLs de suscriptor que no son http(s) o cuyo host resuelve a una dirección privada, de loopback,
+    link-local o reservada, para que el registro no sirva para hacer solicitudes a la red interna (SSRF).
+
+    Es una verificación temprana para responder con un error claro al registrar: la protección efectiva la aplica
+    `http_client_manager.subscriber_client`, que vuelve a validar la dirección resuelta en cada conexión.
+
+    Raises:
+        ValueError: Si la URL no es válida o apunta a una dirección no pública.
+    """
+    parsed = httpx.URL(url)
+    if parsed.scheme not in ("http", "https") or not parsed.host:
+        raise ValueError("La URL del webhook debe ser http o https")
+    if Config.SUBSCRIBER_ALLOW_PRIVATE_URLS:
+        return
+    await resolve_public_addresses(parsed.host, parsed.port or (443 if parsed.scheme == "https" else 80))
+
 
 # Definir validate_webhook para realizar la validación
 async def validate_webhook(url: str):
     try:
+        await check_public_url(url)
         # Simulamos una solicitud de verificación a la URL del webhook
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json={"message": "Verificación del webhook"})
-            if response.status_code != 200:
-                raise ValueError("Validación del webhook fallida")
+        response = await http_client_manager.subscriber_client.post(url, json={"message": "Verificación del webhook"})
+        if response.status_code != 200:
+            raise ValueError("Validación del webhook fallida")
     except (httpx.RequestError, ValueError) as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/register-webhook/")
+@router.post("/register-webhook/")
 async def register_webhook(request: WebhookRegistrationRequest):
     # Verificar si el webhook ya está registrado
-    if request.url in webhook_subscriptions:
+    if request.url in subscription_registry:
         raise HTTPException(status_code=400, detail="Webhook ya registrado")
     
     # Validar la URL del webhook antes de registrarla
     await validate_webhook(request.url)
     
     # Registrar el webhook después de la validación exitosa
-    webhook_subscriptions[request.url] = request.events
+    await subscription_registry.register(request.url, request.events)
     return {"message": "Webhook registrado con éxito"}
 
-async def send_event_notification(event_data: IncomingMessage):
-    # Asume que tienes una lista de URLs de webhook registradas
-    async with httpx.AsyncClient() as client:
-        for webhook_url in webhook_subscriptions:
+@router.delete("/register-webhook/")
+async def unregister_webhook(url: str):
+    if url not in subscription_registry:
+        raise HTTPException(status_code=404, detail="Webhook no registrado")
+    await subscription_registry.unregister(url)
+    return {"message": "Webhook eliminado con éxito"}
+
+class CircuitBreaker:
+    """
+    Circuit breaker por suscriptor. Tras `failure_threshold` fallos consecutivos el circuito se abre y las
+    notificaciones a ese suscriptor se omiten durante `reset_timeout` segundos. Pasado ese tiempo se deja pasar una
+    notificación de prueba (half-open): si tiene éxito el circuito se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, url: str, subscriber_id: str, failure_threshold: int = Config.SUBSCRIBER_BREAKER_THRESHOLD,
+                 reset_timeout: float = Config.SUBSCRIBER_BREAKER_RESET):
+        self.url = url
+        self.subscriber_id = subscriber_id
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self._probing and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._probing = True
+            return True
+        return False
+
+    def end_probe(self):
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        CustomMetricsPrometheus.Suscriptor_circuito_abierto.labels(self.subscriber_id).set(0)
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._probing:
+                logging.warning(f"Circuito abierto para el suscriptor {self.subscriber_id} tras {self.failures} fallos")
+            self.opened_at = time.monotonic()
+            self._probing = False
+            CustomMetricsPrometheus.Suscriptor_circuito_abierto.labels(self.subscriber_id).set(1)
+
+
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(url: str) -> CircuitBreaker:
+    if url not in circuit_breakers:
+        circuit_breakers[url] = CircuitBreaker(url, subscription_registry.subscriber_id(url))
+    return circuit_breakers[url]
+
+
+def forget_subscribers(removed: Dict[str, str]):
+    """
+    Descarta el circuit breaker y las series de métricas de los suscriptores eliminados del registro.
+
+    Args:
+        removed (Dict[str, str]): URL -> id de registro de cada suscriptor eliminado.
+    """
+    for url, subscriber_id in removed.items():
+        circuit_breakers.pop(url, None)
+        remove_label_series(CustomMetricsPrometheus.Suscriptor_circuito_abierto, subscriber_id)
+        remove_label_series(CustomMetricsPrometheus.Suscriptor_latencia_segundos, subscriber_id)
+        for result in ("success", "rejected", "error", "circuit_open"):
+            remove_label_series(CustomMetricsPrometheus.Suscriptor_entregas, subscriber_id, result)
+
+
+async def deliver_to_subscriber(webhook_url: str, body: bytes) -> bool:
+    """
+    Entrega una notificación a un suscriptor con timeout propio, reintentos con backoff exponencial y jitter, y
+    circuit breaker. Los errores 4xx (salvo 408 y 429) no se reintentan: el suscriptor respondió, pero rechazó el evento.
+
+    Returns:
+        bool: True si el suscriptor aceptó la notificación.
+    """
+    breaker = get_circuit_breaker(webhook_url)
+    subscriber_id = breaker.subscriber_id
+    if not breaker.allow():
+        CustomMetricsPrometheus.Suscriptor_entregas.labels(subscriber_id, "circuit_open").inc()
+        return False
+
+    # Con el circuito abierto, allow() solo deja pasar la notificación de prueba.
+    probe = breaker.opened_at is not None
+    try:
+        # Incluye a los suscriptores de WEBHOOK_SUBSCRIBERS: el cliente valida la dirección en cada conexión.
+        client = http_client_manager.subscriber_client
+        for attempt in range(Config.SUBSCRIBER_MAX_RETRIES + 1):
+            if attempt:
+                # Full jitter: evita que los reintentos de muchos eventos golpeen al suscriptor al mismo tiempo.
+                await asyncio.sleep(random.uniform(0, Config.SUBSCRIBER_RETRY_BASE_DELAY * 2 ** attempt))
+            start = time.perf_counter()
             try:
-                # Envía la notificación del evento a cada webhook registrado
-                logging.info(f"ESTA ES LA URL CLIENTE>>>>>>>>> {webhook_url}")
-                await client.post(webhook_url, json=event_data.model_dump())
+                with track_dependency("subscriber", "notify") as call:
+                    response = await client.post(webhook_url, content=body, headers={"Content-Type": "application/json"},
+                                                 timeout=Config.SUBSCRIBER_TIMEOUT)
+                    call.record_response(response)
+                CustomMetricsPrometheus.Suscriptor_latencia_segundos.labels(subscriber_id).observe(time.perf_counter() - start)
+                if response.status_code < 400:
+                    breaker.record_success()
+                    CustomMetricsPrometheus.Suscriptor_entregas.labels(subscriber_id, "success").inc()
+                    return True
+                if response.status_code < 500 and response.status_code not in (408, 429):
+                    breaker.record_success()
+                    CustomMetricsPrometheus.Suscriptor_entregas.labels(subscriber_id, "rejected").inc()
+                    logging.warning(f"El suscriptor {subscriber_id} rechazó la notificación con estado {response.status_code}")
+                    return False
+                error = f"estado {response.status_code}"
             except httpx.RequestError as e:
-                print(f"Error al enviar notificación a {webhook_url}: {str(e)}")
\ No newline at end of file
+                CustomMetricsPrometheus.Suscriptor_latencia_segundos.labels(subscriber_id).observe(time.perf_counter() - start)
+                error = str(e) or type(e).__name__
+            logging.warning(f"Error al enviar notificación al suscriptor {subscriber_id} (intento {attempt + 1}): {error}")
+
+        breaker.record_failure()
+        CustomMetricsPrometheus.Suscriptor_entregas.labels(subscriber_id, "error").inc()
+        return False
+    finally:
+        if probe:
+            # Si la prueba termina sin registrar un resultado (cancelación o error inesperado), se libera para que
+            # una notificación posterior pueda volver a probar en lugar de dejar el circuito abierto para siempre.
+            breaker.end_probe()
+
+
+async def send_event_notification(event_data: IncomingMessage, raw_body: Optional[bytes] = None):
+    # Se reenvía el cuerpo original del webhook; solo si no está disponible se serializa el modelo.
+    if raw_body is None:
+        raw_body = event_data.model_dump_json(by_alias=True).encode()
+    # Solo se notifica a los suscriptores que pidieron alguno de los tipos de evento presentes en el webhook.
+    subscribers = await subscription_registry.subscribers_for(event_types(event_data))
+    # Se notifica a todos ellos de forma concurrente, de modo que uno lento o caído no retrase al resto.
+    with track_dependency("subscriber", "fan_out"):
+        await asyncio.gather(*(deliver_to_subscriber(webhook_url, raw_body) for webhook_url in subscribers))
@@ -0,0 +1,93 @@
+import json
+import uuid
+from typing import List, Optional
+
+from models import Parameter, Template
+
+
+class CompiledTemplate:
+    """
+    Payload de un mensaje basado en template serializado una sola vez, listo para enviarse a muchos destinatarios.
+
+    La parte estática del payload (producto, nombre del template, idioma, tipos de componente) se serializa a JSON al
+    crear el objeto, dejando marcadores en el destinatario y en los parámetros de cada componente. `render` solo
+    empalma los valores de cada destinatario entre los fragmentos ya serializados, en lugar de reconstruir y
+    serializar el diccionario completo en cada envío.
+
+    Args:
+        template (Template): La definición del template.
+        messaging_product (str): Producto de mensajería (ej. whatsapp).
+        recipient_type (str): Tipo de destinatario (ej. individual).
+    """
+
+    def __init__(self, template: Template, messaging_product: str = "whatsapp", recipient_type: str = "individual"):
+        # Marcadores únicos para que no puedan coincidir con el contenido del template.
+        marker = uuid.uuid4().hex
+        to_marker = json.dumps(f"{marker}:to")
+        parameter_markers = [json.dumps(f"{marker}:{index}") for index in range(len(template.components))]
+
+        payload = {
+            "messaging_product": messaging_product,
+            "recipient_type": recipient_type,
+            "to": f"{marker}:to",
+            "type": "template",
+            "template": {
+                "name": template.name,
+                "language": template.language,
+                "components": [
+                    {"type": component.type, "parameters": f"{marker}:{index}"}
+                    for index, component in enumerate(template.components)
+                ],
+            },
+        }
+        serialized = json.dumps(payload, separators=(",", ":"))
+
+        # Fragmentos estáticos: parts[0] + to + parts[1] + params[0] + parts[2] + ... + parts[-1]
+        head, tail = serialized.split(to_marker)
+        self._parts = [head.encode()]
+        for parameter_marker in parameter_markers:
+            before, tail = tail.split(parameter_marker)
+            self._parts.append(before.encode())
+        self._parts.append(tail.encode())
+
+        self.component_count = len(template.components)
+        self._default_parameters = [
+            self.serialize_parameters(component.parameters or []) for component in template.components
+        ]
+
+    @staticmethod
+    def serialize_parameters(parameters: List[Parameter]) -> bytes:
+        """
+        Serializa la lista de parámetros de un componente.
+        """
+        return json.dumps([parameter.model_dump(exclude_none=True) for parameter in parameters],
+                          separators=(",", ":")).encode()
+
+    def render(self, to: str, parameters: Optional[List[List[Parameter]]] = None) -> bytes:
+        """
+        Genera el cuerpo JSON del mensaje para un destinatario.
+
+        Args:
+            to (str): Número del destinatario.
+            parameters (Optional[List[List[Parameter]]]): Parámetros de cada componente, en el mismo orden que los
+                                                          componentes del template. Si se omiten (o la lista de un
+                                                          componente es None), se usan los del template.
+
+        Returns:
+            bytes: El cuerpo JSON listo para enviarse a `/messages`.
+
+        Raises:
+            ValueError: Si se entregan parámetros para más componentes de los que tiene el template.
+        """
+        parameters = parameters or []
+        if len(parameters) > self.component_count:
+            raise ValueError(f"El template tiene {self.component_count} componentes pero se recibieron {len(parameters)} listas de parámetros")
+
+        chunks = [self._parts[0], json.dumps(to).encode()]
+        for index in range(self.component_count):
+            chunks.append(self._parts[index + 1])
+            component_parameters = parameters[index] if index < len(parameters) else None
+            chunks.append(self._default_parameters[index] if component_parameters is None
+                          else self.serialize_parameters(component_parameters))
+        chunks.append(self._parts[-1])
+        return b"".join(chunks)
@@ -0,0 +1,22 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# Los módulos de la aplicación leen Config al importarse: las rutas de archivos se redirigen a un directorio
+# temporal antes de importarlos.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_workdir = tempfile.mkdtemp(prefix="tests_")
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+for name, value in {
+    "LOG_FILE": os.path.join(_workdir, "app.log"),
+    "MEDIA_DIR": os.path.join(_workdir, "media"),
+    "MEDIA_INDEX_PATH": os.path.join(_workdir, "media", "index.db"),
+    "OUTBOX_PATH": os.path.join(_workdir, "outbox.db"),
+    "SUBSCRIPTIONS_DB_PATH": os.path.join(_workdir, "subscriptions.db"),
+    "DEDUP_DB_PATH": os.path.join(_workdir, "dedup.db"),
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,94 @@
+import asyncio
+
+from conversation_sequencer import KeyedSequencer
+
+
+def test_same_key_runs_in_order_and_other_keys_do_not_wait():
+    async def scenario():
+        sequencer = KeyedSequencer(max_pending=100)
+        events = []
+
+        async def job(name: str, delay: float):
+            events.append(("start", name))
+            await asyncio.sleep(delay)
+            events.append(("end", name))
+            return name
+
+        slow = await sequencer.submit("A", job, "A1", 0.2)
+        fast_same_key = await sequencer.submit("A", job, "A2", 0)
+        other_key = await sequencer.submit("B", job, "B1", 0)
+
+        assert await other_key == "B1"
+        # B terminó mientras A1 (la tarea lenta de otra conversación) seguía en curso y A2 esperaba su turno.
+        assert not slow.done()
+        assert ("start", "A2") not in events
+
+        assert await asyncio.gather(slow, fast_same_key) == ["A1", "A2"]
+        assert events.index(("end", "A1")) < events.index(("start", "A2"))
+        assert sequencer._tails == {}
+
+    asyncio.run(scenario())
+
+
+def test_failed_or_cancelled_task_does_not_block_its_key():
+    async def scenario():
+        sequencer = KeyedSequencer(max_pending=100)
+
+        async def fail():
+            raise ValueError("boom")
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        async def value():
+            return "ok"
+
+        failed = await sequencer.submit("A", fail)
+        hanging = await sequencer.submit("A", hang)
+        following = await sequencer.submit("A", value)
+        await asyncio.sleep(0.01)
+        hanging.cancel()
+
+        assert await following == "ok"
+        assert isinstance(failed.exception(), ValueError)
+        assert sequencer._tails == {}
+
+    asyncio.run(scenario())
+
+
+def test_max_pending_applies_backpressure():
+    async def scenario():
+        sequencer = KeyedSequencer(max_pending=1)
+        release = asyncio.Event()
+
+        first = await sequencer.submit("A", release.wait)
+        second = asyncio.create_task(sequencer.submit("B", asyncio.sleep, 0))
+        await asyncio.sleep(0.01)
+        assert not second.done()
+
+        release.set()
+        await first
+        await (await second)
+
+    asyncio.run(scenario())
+
+
+def test_full_lane_does_not_block_other_lanes():
+    async def scenario():
+        sequencer = KeyedSequencer(max_pending=2)
+        release = asyncio.Event()
+
+        videos = [await sequencer.submit(f"video-{n}", release.wait, lane="video") for n in range(2)]
+        blocked_video = asyncio.create_task(sequencer.submit("video-3", asyncio.sleep, 0, lane="video"))
+        await asyncio.sleep(0.01)
+        assert not blocked_video.done()
+
+        # Los videos agotaron su carril, pero un texto de otra conversación se encola y se procesa.
+        text = await asyncio.wait_for(sequencer.submit("texto", asyncio.sleep, 0, "ok", lane="text"), timeout=1)
+        assert await text == "ok"
+
+        release.set()
+        await asyncio.gather(*videos)
+        await (await blocked_video)
+
+    asyncio.run(scenario())
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from media_scheduler import MB, DownloadScheduler
+
+
+async def hold(scheduler: DownloadScheduler, media_type: str, mime_type: str, granted: list, release: asyncio.Event):
+    async with scheduler.slot(media_type, mime_type):
+        granted.append(media_type)
+        await release.wait()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_large_downloads_do_not_take_small_slots():
+    async def scenario():
+        scheduler = DownloadScheduler(small_limit=1, large_limit=1, max_inflight_bytes=1024 * MB, large_threshold=8 * MB)
+        granted, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(hold(scheduler, "video", "video/mp4", granted, release)) for _ in range(2)]
+        await settle()
+        tasks.append(asyncio.create_task(hold(scheduler, "image", "image/jpeg", granted, release)))
+        await settle()
+        # El segundo video espera su cupo, pero la imagen no espera detrás de él.
+        assert granted == ["video", "image"]
+        release.set()
+        await asyncio.gather(*tasks)
+        assert granted == ["video", "image", "video"]
+
+    asyncio.run(scenario())
+
+
+def test_inflight_bytes_are_capped():
+    async def scenario():
+        scheduler = DownloadScheduler(small_limit=10, large_limit=10, max_inflight_bytes=1 * MB, large_threshold=8 * MB)
+        granted, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(hold(scheduler, "document", "application/pdf", granted, release)) for _ in range(2)]
+        await settle()
+        # Cada PDF se estima en 1 MB: el segundo espera aunque queden cupos de concurrencia.
+        assert granted == ["document"]
+        assert scheduler._inflight_bytes == 1 * MB
+        release.set()
+        await asyncio.gather(*tasks)
+        assert granted == ["document", "document"]
+        assert scheduler._inflight_bytes == 0
+
+    asyncio.run(scenario())
+
+
+def test_download_larger_than_the_cap_runs_alone():
+    async def scenario():
+        scheduler = DownloadScheduler(small_limit=10, large_limit=10, max_inflight_bytes=1 * MB, large_threshold=8 * MB)
+        granted, release = [], asyncio.Event()
+        task = asyncio.create_task(hold(scheduler, "video", "video/mp4", granted, release))
+        await settle()
+        assert granted == ["video"]
+        release.set()
+        await task
+
+    asyncio.run(scenario())
+
+
+def test_waiting_downloads_are_granted_by_priority():
+    async def scenario():
+        scheduler = DownloadScheduler(small_limit=1, large_limit=1, max_inflight_bytes=1024 * MB, large_threshold=8 * MB)
+        granted, release = [], asyncio.Event()
+        first_release = asyncio.Event()
+        first = asyncio.create_task(hold(scheduler, "document", "application/pdf", granted, first_release))
+        await settle()
+        waiting = [asyncio.create_task(hold(scheduler, media_type, mime_type, granted, release))
+                   for media_type, mime_type in (("document", "application/pdf"), ("image", "image/jpeg"),
+                                                 ("audio", "audio/ogg"))]
+        await settle()
+        release.set()
+        first_release.set()
+        await asyncio.gather(first, *waiting)
+        assert granted == ["document", "audio", "image", "document"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = DownloadScheduler(small_limit=1, large_limit=1, max_inflight_bytes=1024 * MB, large_threshold=8 * MB)
+        granted, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(scheduler, "image", "image/jpeg", granted, release))
+        await settle()
+        cancelled = asyncio.create_task(hold(scheduler, "audio", "audio/ogg", granted, release))
+        later = asyncio.create_task(hold(scheduler, "image", "image/jpeg", granted, release))
+        await settle()
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert len(scheduler._waiting["small"]) == 1
+
+        release.set()
+        await asyncio.gather(first, later)
+        assert granted == ["image", "image"]
+        assert scheduler._active == {"small": 0, "large": 0}
+        assert scheduler._inflight_bytes == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_granted_just_before_cancellation_is_returned():
+    async def scenario():
+        scheduler = DownloadScheduler(small_limit=1, large_limit=1, max_inflight_bytes=1024 * MB, large_threshold=8 * MB)
+        granted, release = [], asyncio.Event()
+        first = scheduler.slot("image", "image/jpeg")
+        await first.__aenter__()
+        waiter = asyncio.create_task(hold(scheduler, "image", "image/jpeg", granted, release))
+        await settle()
+
+        # Liberar el primer cupo se lo asigna al que espera; se cancela antes de que alcance a reanudarse.
+        await first.__aexit__(None, None, None)
+        assert scheduler._active["small"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert granted == []
+        assert scheduler._active == {"small": 0, "large": 0}
+        assert scheduler._inflight_bytes == 0
+
+    asyncio.run(scenario())
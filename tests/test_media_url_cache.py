@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from media_url_cache import SingleFlightTTLCache
+
+
+def test_concurrent_gets_share_one_load():
+    async def scenario():
+        cache = SingleFlightTTLCache(ttl=60, max_entries=10)
+        calls = []
+
+        async def loader(key: str):
+            calls.append(key)
+            await asyncio.sleep(0.05)
+            return f"url-{key}"
+
+        assert await asyncio.gather(*(cache.get("m1", loader) for _ in range(5))) == ["url-m1"] * 5
+        assert await cache.get("m1", loader) == "url-m1"
+        assert calls == ["m1"]
+
+    asyncio.run(scenario())
+
+
+def test_loader_error_reaches_waiters_and_is_not_cached():
+    async def scenario():
+        cache = SingleFlightTTLCache(ttl=60, max_entries=10)
+
+        async def failing(key: str):
+            await asyncio.sleep(0.05)
+            raise RuntimeError("graph api")
+
+        results = await asyncio.gather(cache.get("m1", failing), cache.get("m1", failing), return_exceptions=True)
+        assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+        assert cache._in_flight == {}
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_the_loading_caller_does_not_cancel_waiters():
+    async def scenario():
+        cache = SingleFlightTTLCache(ttl=60, max_entries=10)
+        calls = []
+
+        async def loader(key: str):
+            calls.append(key)
+            await asyncio.sleep(0.05)
+            return f"url-{key}"
+
+        first = asyncio.create_task(cache.get("m1", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get("m1", loader))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        # El que esperaba no recibe la cancelación ajena: reintenta la carga y obtiene el valor.
+        assert await waiter == "url-m1"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert calls == ["m1", "m1"]
+
+    asyncio.run(scenario())
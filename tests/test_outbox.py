@@ -0,0 +1,120 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from config import Config
+from outbox import Outbox
+from rate_limiter import RateLimitExceeded
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(Config, "OUTBOX_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(Config, "OUTBOX_CONCURRENCY", 4)
+
+
+def http_error(code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://graph.test/messages")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(code, request=request))
+
+
+async def wait_for_status(outbox: Outbox, outbox_id: int, status: str, timeout: float = 2):
+    # Un mensaje recién encolado también está "pending": se espera a que tenga un resultado registrado.
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        message = await outbox.get(outbox_id)
+        if message["status"] == status and (status != "pending" or message["last_error"]):
+            return message
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{outbox_id} no llegó a {status}: {await outbox.get(outbox_id)}")
+
+
+def test_slow_send_does_not_hold_back_the_others(tmp_path):
+    async def scenario():
+        outbox = Outbox(str(tmp_path / "outbox.db"))
+        release = asyncio.Event()
+
+        async def sender(payload):
+            if payload["slow"]:
+                await release.wait()
+
+        await outbox.start(sender)
+        try:
+            slow = await outbox.enqueue({"slow": True})
+            fast = [await outbox.enqueue({"slow": False}) for _ in range(10)]
+            for outbox_id in fast:
+                await wait_for_status(outbox, outbox_id, "sent")
+            assert (await outbox.get(slow))["status"] == "sending"
+            release.set()
+            await wait_for_status(outbox, slow, "sent")
+        finally:
+            release.set()
+            await outbox.stop()
+
+    asyncio.run(scenario())
+
+
+def test_failures_are_retried_or_failed(tmp_path):
+    async def scenario():
+        outbox = Outbox(str(tmp_path / "outbox.db"))
+
+        async def sender(payload):
+            raise http_error(payload["code"])
+
+        await outbox.start(sender)
+        try:
+            retryable = await outbox.enqueue({"code": 500})
+            rejected = await outbox.enqueue({"code": 400})
+            message = await wait_for_status(outbox, retryable, "pending")
+            assert message["attempts"] == 1 and message["last_error"].startswith("HTTP 500")
+            message = await wait_for_status(outbox, rejected, "failed")
+            assert message["attempts"] == 1
+        finally:
+            await outbox.stop()
+
+    asyncio.run(scenario())
+
+
+def test_local_rate_limit_is_rescheduled_without_using_an_attempt(tmp_path):
+    async def scenario():
+        outbox = Outbox(str(tmp_path / "outbox.db"))
+
+        async def sender(payload):
+            raise RateLimitExceeded(30)
+
+        await outbox.start(sender)
+        try:
+            outbox_id = await outbox.enqueue({"to": "1"})
+            message = await wait_for_status(outbox, outbox_id, "pending")
+            assert message["attempts"] == 0
+            next_attempt_at = outbox._connect().execute(
+                "SELECT next_attempt_at FROM outbox WHERE id = ?", (outbox_id,)).fetchone()[0]
+            assert next_attempt_at - time.time() > 25
+        finally:
+            await outbox.stop()
+
+    asyncio.run(scenario())
+
+
+def test_only_expired_claims_are_reclaimed(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "OUTBOX_CLAIM_TIMEOUT", 10)
+    path = str(tmp_path / "outbox.db")
+    alive, crashed, other = Outbox(path), Outbox(path), Outbox(path)
+    ids = alive._insert_batch([json.dumps({"n": n}) for n in range(2)])
+    assert [row[0] for row in alive._claim(1)] == ids[:1]
+    assert [row[0] for row in crashed._claim(1)] == ids[1:]
+
+    # Pasado el timeout, el worker vivo renovó su reclamo y el caído no.
+    connection = alive._connect()
+    connection.execute("UPDATE outbox SET claimed_at = ?", (time.time() - 60,))
+    connection.commit()
+    alive._renew_claims(ids[:1])
+    assert [row[0] for row in other._claim(10)] == ids[1:]
+
+    # El resultado tardío del worker caído no pisa el del nuevo dueño.
+    crashed._complete([(ids[1], 1, "timeout", True, None)])
+    other._complete([(ids[1], 1, None, False, None)])
+    assert other._fetch(ids[1])[1] == "sent"
@@ -0,0 +1,59 @@
+import asyncio
+import hashlib
+import os
+
+import httpx
+
+import routes
+from config import Config
+from media_store import media_store
+
+CONTENT = b"contenido del medio"
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+def buffered_download(monkeypatch, content: bytes):
+    async def request(method, url, **kwargs):
+        return httpx.Response(200, content=content, request=httpx.Request(method, url))
+
+    monkeypatch.setattr(Config, "MEDIA_STREAM_DOWNLOADS", False)
+    monkeypatch.setattr(routes.AsyncHTTPClient, "request", staticmethod(request))
+
+
+def test_buffered_download_is_verified_and_stored_by_hash(monkeypatch):
+    buffered_download(monkeypatch, CONTENT)
+    path = asyncio.run(routes.save_media("https://media.test/1", "image", "m1", "image/jpeg", sha256=SHA256))
+    assert path == media_store.path_for("image", SHA256, "jpeg")
+    with open(path, "rb") as file:
+        assert file.read() == CONTENT
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith(".part")]
+
+
+def test_buffered_download_with_wrong_hash_is_rejected(monkeypatch):
+    buffered_download(monkeypatch, CONTENT[:5])
+    wrong_sha256 = hashlib.sha256(b"otro contenido").hexdigest()
+    path = asyncio.run(routes.save_media("https://media.test/2", "image", "m2", "image/jpeg", sha256=wrong_sha256))
+    assert path is None
+    assert not os.path.exists(media_store.path_for("image", wrong_sha256, "jpeg"))
+
+
+def test_failed_download_discards_the_cached_url(monkeypatch):
+    fetched = []
+
+    async def fetch_media_url(media_id):
+        fetched.append(media_id)
+        return f"https://media.test/{media_id}/{len(fetched)}"
+
+    async def save_media(media_url, *args, **kwargs):
+        return None
+
+    monkeypatch.setattr(routes, "fetch_media_url", fetch_media_url)
+    monkeypatch.setattr(routes, "save_media", save_media)
+
+    async def scenario():
+        for _ in range(2):
+            assert await routes.handle_media_message("m3", "image", "image/jpeg") is None
+
+    asyncio.run(scenario())
+    # La URL con la que falló la descarga no se reutiliza: el reintento la pide de nuevo a Graph API.
+    assert fetched == ["m3", "m3"]
@@ -0,0 +1,23 @@
+import asyncio
+
+from strategies import StrategyDispatcher
+
+
+def test_stop_cancels_background_work_after_the_timeout():
+    async def scenario():
+        dispatcher = StrategyDispatcher({})
+        finished = []
+
+        async def completion(delay: float):
+            await asyncio.sleep(delay)
+            finished.append(delay)
+
+        fast = dispatcher.run_in_background(completion(0))
+        slow = dispatcher.run_in_background(completion(10))
+        await dispatcher.stop(timeout=0.05)
+
+        # Al retornar stop ya no queda trabajo en segundo plano que pueda usar recursos cerrados después.
+        assert fast.done() and slow.cancelled()
+        assert finished == [0]
+
+    asyncio.run(scenario())
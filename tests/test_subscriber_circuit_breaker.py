@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY, generate_latest
+
+import subscriptions
+from subscriptions import CircuitBreaker, deliver_to_subscriber, get_circuit_breaker
+
+
+class _HangingClient:
+    async def post(self, *args, **kwargs):
+        await asyncio.sleep(3600)
+
+
+class _FailingClient:
+    async def post(self, *args, **kwargs):
+        raise RuntimeError("error inesperado")
+
+
+def _open_for_probe(url: str) -> CircuitBreaker:
+    breaker = get_circuit_breaker(url)
+    breaker.failures = breaker.failure_threshold
+    breaker.opened_at = 0.0
+    return breaker
+
+
+@pytest.mark.parametrize("client", [_HangingClient(), _FailingClient()])
+def test_probe_is_released_when_it_ends_without_a_result(monkeypatch, client):
+    monkeypatch.setattr(type(subscriptions.http_client_manager), "subscriber_client", property(lambda self: client))
+
+    async def scenario():
+        url = f"http://suscriptor.test/{type(client).__name__}"
+        breaker = _open_for_probe(url)
+        probe = asyncio.create_task(deliver_to_subscriber(url, b"{}"))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises((asyncio.CancelledError, RuntimeError)):
+            await probe
+        # La siguiente notificación puede volver a probar el suscriptor.
+        assert breaker.allow()
+
+    asyncio.run(scenario())
+
+
+def test_metrics_use_the_registry_id_and_are_dropped_on_unregister(monkeypatch):
+    class _OkClient:
+        async def post(self, *args, **kwargs):
+            return httpx.Response(200)
+
+    monkeypatch.setattr(type(subscriptions.http_client_manager), "subscriber_client", property(lambda self: _OkClient()))
+    registry = subscriptions.subscription_registry
+    url = "https://suscriptor.test/hook?token=secreto"
+
+    async def scenario():
+        await registry.register(url, [])
+        assert await deliver_to_subscriber(url, b"{}")
+        subscriber_id = registry.subscriber_id(url)
+        assert REGISTRY.get_sample_value("Suscriptor_entregas_total", {"suscriptor": subscriber_id, "resultado": "success"}) == 1
+        assert "secreto" not in generate_latest(REGISTRY).decode()
+
+        await registry.unregister(url)
+        assert url not in subscriptions.circuit_breakers
+        assert REGISTRY.get_sample_value("Suscriptor_entregas_total", {"suscriptor": subscriber_id, "resultado": "success"}) is None
+        assert REGISTRY.get_sample_value("Suscriptor_circuito_abierto", {"suscriptor": subscriber_id}) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+import asyncio
+import socket
+
+import httpcore
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import subscriptions
+from config import Config
+from http_client import PublicAddressBackend
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Config, "SUBSCRIPTIONS_API_KEY", "clave")
+    monkeypatch.setattr(Config, "SUBSCRIBER_ALLOW_PRIVATE_URLS", False)
+    app = FastAPI()
+    app.include_router(subscriptions.router)
+    return TestClient(app)
+
+
+def test_registration_requires_the_api_key(client, monkeypatch):
+    payload = {"url": "https://example.com/hook", "events": []}
+    assert client.post("/register-webhook/", json=payload).status_code == 401
+    assert client.post("/register-webhook/", json=payload, headers={"X-API-Key": "otra"}).status_code == 401
+    assert client.delete("/register-webhook/", params={"url": payload["url"]}).status_code == 401
+
+    monkeypatch.setattr(Config, "SUBSCRIPTIONS_API_KEY", "")
+    assert client.post("/register-webhook/", json=payload, headers={"X-API-Key": ""}).status_code == 503
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8080/hook",
+    "http://localhost/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://10.0.0.5/hook",
+    "http://[::1]/hook",
+    "file:///etc/passwd",
+])
+def test_private_targets_are_rejected_without_a_request(client, monkeypatch, url):
+    async def post(*args, **kwargs):
+        raise AssertionError("No se debe enviar la solicitud de validación")
+
+    monkeypatch.setattr(type(subscriptions.http_client_manager), "subscriber_client",
+                        property(lambda self: type("Client", (), {"post": staticmethod(post)})()))
+    response = client.post("/register-webhook/", json={"url": url, "events": []}, headers={"X-API-Key": "clave"})
+    assert response.status_code == 400
+
+
+def test_public_address_passes_the_check():
+    asyncio.run(subscriptions.check_public_url("http://93.184.216.34/hook"))
+
+
+def test_each_connection_revalidates_the_resolved_address(monkeypatch):
+    monkeypatch.setattr(Config, "SUBSCRIBER_ALLOW_PRIVATE_URLS", False)
+    # DNS rebinding: el host resuelve a una dirección pública al validarlo y a una privada en la siguiente consulta.
+    answers = iter(["93.184.216.34", "127.0.0.1"])
+    monkeypatch.setattr(socket, "getaddrinfo", lambda host, port, *args, **kwargs: [
+        (socket.AF_INET, socket.SOCK_STREAM, 6, "", (next(answers), port))])
+    connected = []
+
+    class Backend(httpcore.AsyncNetworkBackend):
+        async def connect_tcp(self, host, port, *args, **kwargs):
+            connected.append(host)
+            raise httpcore.ConnectError("sin red")
+
+    backend = PublicAddressBackend(Backend())
+
+    async def scenario():
+        with pytest.raises(httpcore.ConnectError, match="sin red"):
+            await backend.connect_tcp("rebind.test", 80)
+        with pytest.raises(httpcore.ConnectError, match="no pública"):
+            await backend.connect_tcp("rebind.test", 80)
+
+    asyncio.run(scenario())
+    # La conexión se abre contra la dirección validada, sin volver a resolver el nombre.
+    assert connected == ["93.184.216.34"]
+
+
+def test_subscriber_client_refuses_private_addresses(monkeypatch):
+    monkeypatch.setattr(Config, "SUBSCRIBER_ALLOW_PRIVATE_URLS", False)
+
+    async def scenario():
+        # Por ejemplo, un suscriptor de WEBHOOK_SUBSCRIBERS que apunta a la red interna.
+        with pytest.raises(httpx.ConnectError, match="no pública"):
+            await subscriptions.http_client_manager.subscriber_client.post("http://127.0.0.1:9/hook", content=b"{}")
+        await subscriptions.http_client_manager.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,18 @@
+import httpx
+import pytest
+
+from routes import is_throttling_response
+
+
+@pytest.mark.parametrize("status_code, content, expected", [
+    (429, b"", True),
+    (400, b'{"error": {"code": 130429}}', True),
+    (400, b'{"error": {"code": 100}}', False),
+    (200, b'{"error": {"code": 130429}}', False),
+    (500, b"no es json", False),
+    (400, b"[1, 2]", False),
+    (400, b'"texto"', False),
+    (400, b'{"error": "texto"}', False),
+])
+def test_is_throttling_response(status_code, content, expected):
+    assert is_throttling_response(httpx.Response(status_code, content=content)) is expected
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+import requests
+import tweepy
+
+from rate_limiter import RateLimitExceeded
+from twitter_client import TwitterClient, TwitterRateLimit
+
+
+def make_response(status_code: int, headers: dict) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+    response._content = b'{"data": {}}'
+    return response
+
+
+def test_only_one_call_passes_when_the_window_resets():
+    async def scenario():
+        limit = TwitterRateLimit("create_tweet", max_wait=120)
+        limit.remaining = 0
+        limit.reset_at = time.time() + 0.05
+        calls = [asyncio.create_task(limit.acquire()) for _ in range(3)]
+        await asyncio.sleep(0.2)
+        assert [call.done() for call in calls] == [True, False, False]
+
+        # La respuesta de la primera llamada trae el cupo de la nueva ventana.
+        limit.update({"x-rate-limit-remaining": "1", "x-rate-limit-reset": str(int(time.time()) + 60)})
+        await asyncio.sleep(0.01)
+        assert [call.done() for call in calls] == [True, True, False]
+        assert limit.remaining == 0
+        for call in calls[2:]:
+            call.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_refresh_is_retried_when_the_first_call_fails():
+    async def scenario():
+        limit = TwitterRateLimit("create_tweet", max_wait=5)
+        limit.remaining = 0
+        limit.reset_at = time.time()
+        first = asyncio.create_task(limit.acquire())
+        second = asyncio.create_task(limit.acquire())
+        third = asyncio.create_task(limit.acquire())
+        await asyncio.sleep(0.01)
+        assert first.done() and not second.done()
+
+        limit.release()
+        await asyncio.sleep(0.01)
+        assert second.done() and not third.done()
+        third.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_last_429_is_reported_as_rate_limit_exceeded(monkeypatch):
+    reset = int(time.time()) + 30
+
+    def create_tweet(**kwargs):
+        raise tweepy.TooManyRequests(make_response(429, {"x-rate-limit-reset": str(reset)}))
+
+    monkeypatch.setattr("twitter_client.Config.TWITTER_RATE_LIMIT_RETRIES", 0)
+
+    async def scenario():
+        client = TwitterClient(workers=1, max_wait=60)
+        try:
+            with pytest.raises(RateLimitExceeded) as raised:
+                await client._call("create_tweet", create_tweet, text="hola")
+        finally:
+            await client.close()
+        assert 25 < raised.value.retry_after <= 30
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+import asyncio
+
+import routes
+from dedup import DedupCache
+from models import IncomingMessage
+
+
+def make_event(message_id: str) -> IncomingMessage:
+    return IncomingMessage.model_validate({
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "123",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "18490000000", "phone_number_id": "123"},
+                    "contacts": [{"profile": {"name": "Cliente"}, "wa_id": "18490000000"}],
+                    "messages": [{"from": "18490000000", "id": message_id, "timestamp": "1700000000",
+                                  "type": "text", "text": {"body": "Hola"}}],
+                },
+            }],
+        }],
+    })
+
+
+def test_failed_event_is_processed_again_when_redelivered(monkeypatch):
+    monkeypatch.setattr(routes, "dedup_cache", DedupCache(persistent=False))
+    dispatched = []
+
+    async def dispatch(request, raw_body, wait, start):
+        dispatched.append(request)
+        if len(dispatched) == 1:
+            raise RuntimeError("fallo al procesar")
+
+    monkeypatch.setattr(routes, "dispatch_webhook_event", dispatch)
+
+    async def scenario():
+        try:
+            await routes.process_webhook_event(make_event("wamid.1"))
+        except RuntimeError:
+            pass
+        # El reenvío de Meta tras la respuesta 500 se procesa; un reenvío posterior al éxito se descarta.
+        await routes.process_webhook_event(make_event("wamid.1"))
+        await routes.process_webhook_event(make_event("wamid.1"))
+
+    asyncio.run(scenario())
+    assert len(dispatched) == 2
+
+
+def test_forget_removes_persistent_marks(tmp_path):
+    async def scenario():
+        cache = DedupCache(persistent=True, path=str(tmp_path / "dedup.db"))
+        assert await cache.filter_new(["a", "b"]) == [True, True]
+        await cache.forget(["a"])
+        assert await cache.filter_new(["a", "b"]) == [True, False]
+
+    asyncio.run(scenario())
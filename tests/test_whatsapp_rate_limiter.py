@@ -0,0 +1,20 @@
+import asyncio
+
+import pytest
+
+from rate_limiter import MIN_RATE, AdaptiveTokenBucket, RateLimitExceeded
+
+
+def test_zero_rates_are_raised_to_the_minimum():
+    async def scenario():
+        bucket = AdaptiveTokenBucket("zero", rate=0, burst=1, min_rate=0, max_wait=0.01)
+        assert bucket.rate == bucket.min_rate == MIN_RATE
+        await bucket.acquire()
+        # Sin tokens, la espera se calcula con la tasa mínima en lugar de dividir por cero.
+        with pytest.raises(RateLimitExceeded) as error:
+            await bucket.acquire()
+        assert error.value.retry_after == pytest.approx(1 / MIN_RATE, rel=0.01)
+        bucket.on_throttle()
+        assert bucket.rate == MIN_RATE
+
+    asyncio.run(scenario())
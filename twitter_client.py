@@ -0,0 +1,196 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import requests
+import tweepy
+from requests.adapters import HTTPAdapter
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus
+from dependency_metrics import track_dependency
+from logger import logger
+from rate_limiter import RateLimitExceeded
+
+TWITTER_API_HOST = "https://api.twitter.com"
+
+
+class _BaseURLAdapter(HTTPAdapter):
+    # tweepy fija el host de la API; este adaptador redirige las solicitudes a Config.TWITTER_API_BASE_URL
+    # (por ejemplo, al servidor simulado de benchmarks/mock_upstream.py).
+    def __init__(self, base_url: str):
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, request, **kwargs):
+        request.url = self.base_url + request.url[len(TWITTER_API_HOST):]
+        return super().send(request, **kwargs)
+
+
+class TwitterRateLimit:
+    """
+    Estado del límite de Twitter para un endpoint, según los encabezados x-rate-limit-remaining y x-rate-limit-reset.
+
+    Mientras quedan llamadas disponibles `acquire` retorna de inmediato. Cuando se agotan, las llamadas esperan en
+    orden de llegada hasta que se reinicia la ventana, en lugar de enviarse para ser rechazadas con 429; si la
+    espera supera `max_wait` segundos se lanza `RateLimitExceeded`. Al reiniciarse la ventana pasa una sola llamada
+    y las demás esperan a que su respuesta actualice `remaining` (o a que termine con `release`), de modo que la
+    cola acumulada no se envíe de golpe.
+    """
+
+    def __init__(self, endpoint: str, max_wait: float):
+        self.endpoint = endpoint
+        self.max_wait = max_wait
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self._lock = asyncio.Lock()
+        # Se conoce el cupo de la ventana actual; False tras reiniciarse la ventana hasta que llega una respuesta.
+        self._window_known = True
+        # Evento de la llamada que está consultando el cupo de una nueva ventana, si la hay.
+        self._refresh: Optional[asyncio.Event] = None
+
+    async def acquire(self):
+        async with self._lock:
+            while self._refresh is not None:
+                await self._refresh.wait()
+            if self.remaining is not None and self.remaining <= 0:
+                wait = self.reset_at - time.time()
+                if wait > self.max_wait:
+                    raise RateLimitExceeded(wait)
+                if wait > 0:
+                    logger.warning(f"Límite de Twitter agotado para {self.endpoint}; esperando {wait:.1f}s")
+                    CustomMetricsPrometheus.Twitter_espera_limite_segundos.labels(self.endpoint).observe(wait)
+                    await asyncio.sleep(wait)
+                # Nueva ventana: el cupo real se conoce con la próxima respuesta.
+                self.remaining = None
+                self._window_known = False
+            if not self._window_known:
+                # Solo pasa esta llamada; las siguientes esperan a que su respuesta actualice el cupo.
+                self._refresh = asyncio.Event()
+            elif self.remaining is not None:
+                # Reserva una llamada para que las solicitudes concurrentes no excedan el cupo restante.
+                self.remaining -= 1
+
+    def update(self, headers, throttled: bool = False):
+        remaining = headers.get("x-rate-limit-remaining")
+        reset = headers.get("x-rate-limit-reset")
+        if reset is not None and reset.isdigit():
+            self.reset_at = float(reset)
+        if throttled:
+            self.remaining = 0
+            if reset is None:
+                self.reset_at = time.time() + Config.TWITTER_RATE_LIMIT_DEFAULT_RESET
+        elif remaining is not None and remaining.isdigit():
+            self.remaining = int(remaining)
+        if self.remaining is not None:
+            self._window_known = True
+            CustomMetricsPrometheus.Twitter_limite_restante.labels(self.endpoint).set(self.remaining)
+        self.release()
+
+    def release(self):
+        """
+        Deja pasar a las llamadas que esperaban la respuesta de la llamada que consultaba el cupo. Si la respuesta no
+        trajo el cupo (por ejemplo, un error de conexión), la siguiente llamada en espera vuelve a consultarlo.
+        """
+        if self._refresh is not None:
+            self._refresh.set()
+            self._refresh = None
+
+
+class TwitterClient:
+    """
+    Cliente de Twitter compartido por toda la aplicación.
+
+    tweepy es síncrono, así que cada llamada se ejecuta en un executor propio (Config.TWITTER_WORKERS hilos) en lugar
+    de bloquear el event loop o de ocupar el threadpool por defecto. El `tweepy.Client` (y su sesión HTTP con
+    keep-alive) se crea una sola vez. Las respuestas se piden como `requests.Response` para leer los encabezados de
+    límite de Twitter y esperar, por endpoint, a que se reinicie la ventana antes de enviar.
+
+    Métodos:
+        - create_tweet: Publica un tweet.
+        - send_direct_message: Envía un mensaje directo a un usuario.
+        - close: Libera el executor y la sesión HTTP.
+    """
+
+    def __init__(self, workers: int = Config.TWITTER_WORKERS, max_wait: float = Config.TWITTER_RATE_LIMIT_MAX_WAIT):
+        self.workers = workers
+        self.max_wait = max_wait
+        self._client: Optional[tweepy.Client] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._limits: Dict[str, TwitterRateLimit] = {}
+
+    @property
+    def client(self) -> tweepy.Client:
+        if self._client is None:
+            self._client = tweepy.Client(
+                consumer_key=Config.TWITTER_CONSUMER_KEY,
+                consumer_secret=Config.TWITTER_CONSUMER_SECRET,
+                access_token=Config.TWITTER_ACCESS_TOKEN,
+                access_token_secret=Config.TWITTER_TOKEN_SECRET,
+                return_type=requests.Response,
+            )
+            if Config.TWITTER_API_BASE_URL.rstrip('/') != TWITTER_API_HOST:
+                self._client.session.mount(TWITTER_API_HOST, _BaseURLAdapter(Config.TWITTER_API_BASE_URL))
+        return self._client
+
+    def _limit(self, endpoint: str) -> TwitterRateLimit:
+        if endpoint not in self._limits:
+            self._limits[endpoint] = TwitterRateLimit(endpoint, self.max_wait)
+        return self._limits[endpoint]
+
+    async def _call(self, endpoint: str, func: Callable[..., requests.Response], **kwargs) -> dict:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="twitter")
+        limit = self._limit(endpoint)
+        loop = asyncio.get_running_loop()
+        for attempt in range(Config.TWITTER_RATE_LIMIT_RETRIES + 1):
+            await limit.acquire()
+            try:
+                with track_dependency("twitter", endpoint) as call:
+                    response = await loop.run_in_executor(self._executor, functools.partial(func, **kwargs))
+                    call.response_size = len(response.content)
+            except tweepy.TooManyRequests as e:
+                # Con el cupo en 0, el próximo intento espera en `acquire` a que se reinicie la ventana.
+                limit.update(e.response.headers, throttled=True)
+                if attempt == Config.TWITTER_RATE_LIMIT_RETRIES:
+                    # Se informa como límite alcanzado (429 con Retry-After según x-rate-limit-reset), no como error.
+                    raise RateLimitExceeded(max(0.0, limit.reset_at - time.time())) from e
+                continue
+            except tweepy.HTTPException as e:
+                limit.update(e.response.headers)
+                raise
+            except BaseException:
+                limit.release()
+                raise
+            limit.update(response.headers)
+            return response.json().get("data", {})
+
+    async def create_tweet(self, text: str) -> dict:
+        """
+        Publica un tweet y retorna el campo "data" de la respuesta (id y texto del tweet).
+        """
+        return await self._call("create_tweet", self.client.create_tweet, text=text)
+
+    async def send_direct_message(self, participant_id: str, text: str) -> dict:
+        """
+        Envía un mensaje directo a `participant_id` y retorna el campo "data" de la respuesta.
+        """
+        return await self._call("send_direct_message", self.client.create_direct_message,
+                                participant_id=participant_id, text=text)
+
+    async def close(self):
+        """
+        Detiene el executor (esperando las llamadas en curso) y cierra la sesión HTTP de tweepy.
+        """
+        if self._executor is not None:
+            await asyncio.to_thread(self._executor.shutdown, wait=True)
+            self._executor = None
+        if self._client is not None:
+            self._client.session.close()
+            self._client = None
+
+
+# Instancia compartida por toda la aplicación.
+twitter_client = TwitterClient()
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from config import Config
+from custom_metrics import CustomMetricsPrometheus, set_gauge_function
+from logger import logger
+
+
+class WebhookWorkerPool:
+    """
+    Cola en memoria acotada y un pool de workers asíncronos para procesar los eventos del webhook en segundo plano.
+
+    Permite responder 200 a Meta apenas el evento es validado y encolado, sin esperar descargas de medios ni
+    notificaciones a suscriptores. Cuando la cola está llena, `submit` retorna False para que el endpoint responda
+    503 (backpressure) en lugar de acumular eventos en memoria sin límite.
+
+    El handler del pool (`process_webhook_event(wait=False)`) solo admite el evento: lo deduplica y encadena sus
+    elementos en `conversation_sequencer`, que los procesa en las estrategias. Por eso las métricas del pool
+    (Webhook_cola_*, Webhook_workers_utilizacion) miden la admisión; el backlog y la utilización del procesamiento
+    están en Conversaciones_tareas_pendientes, Estrategia_cola_profundidad y Estrategia_utilizacion. El pool se
+    satura (y el endpoint responde 503) cuando el secuenciador aplica backpressure.
+
+    Métodos:
+        - start: Crea los workers que consumen la cola usando el handler indicado.
+        - submit: Encola un evento sin bloquear; retorna False si la cola está llena.
+        - stop: Espera a que la cola se vacíe (con un timeout) y detiene los workers.
+    """
+
+    def __init__(self, workers: int = Config.WEBHOOK_WORKERS, queue_size: int = Config.WEBHOOK_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._handler: Optional[Callable[..., Awaitable[Any]]] = None
+        self._busy = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, handler: Callable[..., Awaitable[Any]]):
+        """
+        Inicia los workers del pool.
+
+        Args:
+            handler (Callable): Corrutina que procesa cada evento encolado; recibe los argumentos pasados a `submit`.
+        """
+        self._handler = handler
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        set_gauge_function(CustomMetricsPrometheus.Webhook_cola_profundidad, lambda: self._queue.qsize() if self._queue else 0)
+        set_gauge_function(CustomMetricsPrometheus.Webhook_workers_utilizacion, lambda: self._busy / self.workers if self.workers else 0)
+        logger.info(f"Pool de workers del webhook iniciado (workers={self.workers}, queue_size={self.queue_size})")
+
+    def submit(self, *event: Any) -> bool:
+        """
+        Encola un evento para procesarlo en segundo plano.
+
+        Args:
+            *event (Any): Los argumentos con los que se invocará el handler, normalmente el `IncomingMessage` ya
+                          validado y el cuerpo original de la solicitud.
+
+        Returns:
+            bool: True si el evento fue encolado; False si la cola está llena.
+        """
+        try:
+            self._queue.put_nowait((time.perf_counter(), event))
+            return True
+        except asyncio.QueueFull:
+            CustomMetricsPrometheus.Webhook_eventos_rechazados.inc()
+            return False
+
+    async def stop(self, timeout: float = Config.WEBHOOK_DRAIN_TIMEOUT):
+        """
+        Espera a que los eventos pendientes se procesen (hasta `timeout` segundos) y cancela los workers.
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Se detiene el pool del webhook con {self._queue.qsize()} eventos pendientes")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Pool de workers del webhook detenido")
+
+    async def _worker(self, index: int):
+        while True:
+            enqueued_at, event = await self._queue.get()
+            CustomMetricsPrometheus.Webhook_cola_espera_segundos.observe(time.perf_counter() - enqueued_at)
+            self._busy += 1
+            try:
+                await self._handler(*event)
+            except Exception as e:
+                # Un evento fallido no debe detener al worker.
+                logger.error(f"Error en el worker {index} del webhook: {e}")
+            finally:
+                self._busy -= 1
+                self._queue.task_done()
+
+
+# Instancia compartida por toda la aplicación.
+webhook_worker_pool = WebhookWorkerPool()